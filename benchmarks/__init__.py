@@ -0,0 +1,3 @@
+'''
+Benchmarks of the switching tools on a synthetic scene, see `run`.
+'''
@@ -0,0 +1,275 @@
+'''
+Measures how the switching tools scale, on the synthetic scene of `standin`.
+
+    python -m benchmarks.run                  # Compare the counters against benchmarks/baselines.json
+    python -m benchmarks.run --save           # Store the counters as the new baselines, the times locally
+    python -m benchmarks.run --times          # Also compare the times against the local ones
+    python -m benchmarks.run --case apply --sweep controls --json results.json
+
+Each case is run on a sweep of each dimension in turn, the others held at `BASE`:
+
+    controls: Controls with spaces in the preset.
+    frames: Length of the animation.
+    keyDensity: Keys per frame on every channel.
+    spaces: Spaces per control.
+
+and records the best wall time of `--repeat` runs, with the `standin.Scene.counters` of timeline visits,
+key calls, key queries and context evaluations.  The counts are deterministic, so only they are committed
+and any change against the baseline is reported.  Wall times only mean something on the machine they were
+measured on, so `--save` stores them in benchmarks/times.local.json, which isn't committed, and they are
+only compared with `--times`.  A time is reported when slower than `--tolerance` times the local one and
+the local one is at least `--min-seconds`, shorter ones are mostly noise.  Exits with 1 if anything regressed.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import collections
+import json
+import os
+import sys
+from timeit import default_timer
+
+from . import standin
+
+
+BASELINES = os.path.join( os.path.dirname(os.path.abspath(__file__)), 'baselines.json' )
+
+LOCAL_TIMES = os.path.join( os.path.dirname(os.path.abspath(__file__)), 'times.local.json' )
+
+BASE = collections.OrderedDict( [('controls', 8), ('frames', 200), ('keyDensity', 0.25), ('spaces', 3)] )
+
+SWEEPS = collections.OrderedDict( [
+    ('controls', [4, 8, 16, 32]),
+    ('frames', [100, 200, 400, 800]),
+    ('keyDensity', [0.1, 0.25, 0.5, 1.0]),
+    ('spaces', [2, 3, 6, 12]),
+] )
+
+COUNTERS = ['timeline', 'keyCalls', 'keyQueries', 'contextEvaluations']
+
+
+class _Quiet(object):
+    ''' Swallows stdout, `spacePresets.apply` prints the preset. '''
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+
+    def __exit__(self, *args):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def _preset(controls):
+    '''
+    Returns the preset switching every control to its last space and every limb to fk.
+    '''
+    from fossilAnimTools import spacePresets
+
+    scene = standin.SCENE
+    preset = collections.OrderedDict( (ctrl, scene.spaceNames[-1]) for ctrl in controls )
+    for name, limb in scene.limbs.items():
+        if limb['motion'] == 'fk':
+            preset[ standin.CONTROLS[name] ] = spacePresets.ACTIVATE_KEY
+    return preset
+
+
+def applyCase(controls, timelineFree=False):
+    from fossilAnimTools import spacePresets
+
+    preset = _preset(controls)
+    return lambda: spacePresets.apply( preset, 'range', timelineFree=timelineFree )
+
+
+def applyTimelineFreeCase(controls):
+    return applyCase(controls, timelineFree=True)
+
+
+def switchRangesCase(controls):
+    ''' The range switch of `animSwitcherGui.Gui.switch`, without the window. '''
+    from fossilAnimTools import spaceSwitching
+
+    controlSpaces = [ (ctrl, standin.SCENE.spaceNames[-1]) for ctrl in controls ]
+    return lambda: spaceSwitching.switchRanges( controlSpaces, standin.SCENE.playback )
+
+
+def offsetCurvesCase(controls):
+    ''' `offsetCurves.offsetObjs` with every channel moved off its curve, over the middle of the range. '''
+    from fossilAnimTools import offsetCurves
+
+    scene = standin.SCENE
+    start, end = scene.playback
+    middle = (start + end) / 2
+    scene.setTime(middle)
+    for ctrl in controls:
+        for channel in standin.CHANNELS:
+            plug = ctrl.name() + '.' + channel
+            scene.setValue( plug, scene.value(plug) + 1.0 )
+
+    span = (middle - (end - start) / 4, middle + (end - start) / 4)
+    return lambda: offsetCurves.offsetObjs( controls, span, falloff=(10, 10, 'linear') )
+
+
+CASES = collections.OrderedDict( [
+    ('apply', applyCase),
+    ('applyTimelineFree', applyTimelineFreeCase),
+    ('switchRanges', switchRangesCase),
+    ('offsetCurves', offsetCurvesCase),
+] )
+
+
+def pointName(params):
+    return ','.join( '{}={}'.format(name, value) for name, value in params.items() )
+
+
+def measure(case, params, repeat=3):
+    '''
+    Returns the OrderedDict of the best 'seconds' of the runs and the counters of the case at the params.
+    '''
+    best = None
+    counters = None
+    for _ in range(repeat):
+        controls = standin.buildRig( **params )
+        run = CASES[case](controls)
+        standin.SCENE.counters.clear()
+
+        with _Quiet():
+            start = default_timer()
+            run()
+            seconds = default_timer() - start
+
+        best = seconds if best is None else min(best, seconds)
+        counters = standin.SCENE.counters
+
+    result = collections.OrderedDict( [('seconds', round(best, 6))] )
+    result.update( (name, counters[name]) for name in COUNTERS )
+    return result
+
+
+def points(sweeps):
+    ''' Yields the params of each point of the sweeps, each varying one dimension from `BASE`, once each. '''
+    seen = set()
+    for dimension in sweeps:
+        for value in SWEEPS[dimension]:
+            params = collections.OrderedDict(BASE)
+            params[dimension] = value
+            if pointName(params) not in seen:
+                seen.add( pointName(params) )
+                yield params
+
+
+def run(cases, sweeps, repeat=3, log=print):
+    '''
+    Returns { <case>: { <point name>: <measure> } }.
+    '''
+    results = collections.OrderedDict()
+    for case in cases:
+        results[case] = collections.OrderedDict()
+        for params in points(sweeps):
+            name = pointName(params)
+            results[case][name] = measure(case, params, repeat)
+            log( '{:<18} {:<52} {}'.format(case, name, ' '.join(
+                '{}={}'.format(key, value) for key, value in results[case][name].items())) )  # noqa e128
+    return results
+
+
+def compare(results, baselines, times=None, tolerance=1.5, minSeconds=0.05):
+    '''
+    Returns a list of messages for every count that changed from the baselines and, if `times` are given,
+    every time slower than tolerance times its local time, if that is at least `minSeconds`.  Points
+    without a baseline or local time are skipped.
+    '''
+    messages = []
+    for case, byPoint in results.items():
+        for name, result in byPoint.items():
+            baseline = baselines.get(case, {}).get(name)
+            if baseline:
+                for counter in COUNTERS:
+                    if result[counter] != baseline.get(counter):
+                        messages.append( '{} {} {}: {} (baseline {})'.format(
+                            case, name, counter, result[counter], baseline.get(counter)) )
+
+            seconds = (times or {}).get(case, {}).get(name)
+            if seconds is not None and seconds >= minSeconds and result['seconds'] > seconds * tolerance:
+                messages.append( '{} {} seconds: {:.4f} is {:.1f}x the local {:.4f}'.format(
+                    case, name, result['seconds'], result['seconds'] / seconds, seconds) )
+    return messages
+
+
+def _load(path):
+    if not os.path.exists(path):
+        return collections.OrderedDict()
+    with open(path) as fid:
+        return json.load(fid, object_pairs_hook=collections.OrderedDict)
+
+
+def _save(path, results, fields):
+    '''
+    Updates the json file at the path with the fields of the results, a single field is stored as the value.
+    '''
+    data = _load(path)
+    for case, byPoint in results.items():
+        stored = data.setdefault(case, collections.OrderedDict())
+        for name, result in byPoint.items():
+            if len(fields) == 1:
+                stored[name] = result[fields[0]]
+            else:
+                stored[name] = collections.OrderedDict( (field, result[field]) for field in fields )
+
+    with open(path, 'w') as fid:
+        json.dump(data, fid, indent=2)
+        fid.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( prog='benchmarks.run', description=__doc__.strip().splitlines()[0] )
+    parser.add_argument( '--case', action='append', choices=list(CASES), help='Cases to run (default: all)' )
+    parser.add_argument( '--sweep', action='append', choices=list(SWEEPS), help='Dimensions to sweep (default: all)' )
+    parser.add_argument( '--repeat', type=int, default=3, help='Runs per point, the best time is kept (default: 3)' )
+    parser.add_argument( '--baselines', default=BASELINES, help='Baseline counters json file' )
+    parser.add_argument( '--local-times', default=LOCAL_TIMES, help='Local wall times json file' )
+    parser.add_argument( '--save', action='store_true',
+                         help='Store the counters in the baselines file and the times in the local file' )  # noqa e127
+    parser.add_argument( '--times', action='store_true', help='Also compare the times against the local file' )
+    parser.add_argument( '--tolerance', type=float, default=1.5, help='Allowed slowdown factor (default: 1.5)' )
+    parser.add_argument( '--min-seconds', type=float, default=0.05,
+                         help='Local times shorter than this are not compared (default: 0.05)' )  # noqa e127
+    parser.add_argument( '--json', default=None, help='Also write the results to this file' )
+    args = parser.parse_args(argv)
+
+    standin.install()
+
+    results = run( args.case or list(CASES), args.sweep or list(SWEEPS), args.repeat )
+
+    if args.json:
+        with open(args.json, 'w') as fid:
+            json.dump(results, fid, indent=2)
+
+    if args.save:
+        _save( args.baselines, results, COUNTERS )
+        _save( args.local_times, results, ['seconds'] )
+        print( 'Saved {} and {}'.format(args.baselines, args.local_times) )
+        return 0
+
+    if not os.path.exists(args.baselines):
+        print( 'No baselines at {}, run with --save to create them'.format(args.baselines) )
+        return 0
+
+    times = None
+    if args.times:
+        if os.path.exists(args.local_times):
+            times = _load(args.local_times)
+        else:
+            print( 'No local times at {}, run with --save to create them'.format(args.local_times) )
+
+    messages = compare(results, _load(args.baselines), times, args.tolerance, args.min_seconds)
+    for message in messages:
+        print( 'REGRESSION ' + message )
+    print( '{} regressions'.format(len(messages)) )
+
+    return 1 if messages else 0
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
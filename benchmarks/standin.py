@@ -0,0 +1,1238 @@
+'''
+A synthetic scene standing in for the parts of Maya, pymel and pdil/fossil the tools use, so the real
+switching code runs, and can be measured, on a machine without Maya.
+
+`install()` registers stand-in `maya`, `maya.api.OpenMaya(Anim)`, `pymel.core` and `pdil` (with
+`pdil.tool.fossil`) modules, all backed by one `Scene`.  The scene is a flat set of nodes with plain
+attribute values and anim curves evaluated linearly between keys, stepped keys held.  `buildRig` fills it
+with a synthetic character:
+
+* `controls` controls, each with its own space group driven by a parentConstraint to one of `spaces`
+  space targets, selected by the control's `space` enum.
+* Every fourth control is the ik main of a two motion limb with an fk counterpart, each with two sub
+  controls, and an ik/fk switcher.
+* Every channel keyed every `1 / keyDensity` frames over `frames` frames.
+
+Switching keeps the world transform (translation and rotation, spaces only translate) and the kinematic
+switches only flip the switcher, so the numbers measure the tools, not a rig.  Units are cm and radians,
+so no unit conversions happen.
+
+The `Scene.counters` count what costs time in Maya:
+    timeline: Changes of the current time, each one evaluates the whole scene.
+    keyCalls: Commands and API calls that add, change or remove keys.
+    keyQueries: `keyframe`/`keyTangent` queries and curve evaluations.
+    contextEvaluations: `getAttr(time=)` calls.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+import collections
+import contextlib
+import math
+import os
+import sys
+import tempfile
+import types
+
+import numpy
+
+TANGENT_GLOBAL = 'auto'
+TANGENT_STEP = 'step'
+
+CHANNELS = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz']
+SCALES = ['sx', 'sy', 'sz']
+
+_LONG_NAMES = {
+    't': 'translate', 'r': 'rotate', 's': 'scale',
+    'tx': 'translateX', 'ty': 'translateY', 'tz': 'translateZ',
+    'rx': 'rotateX', 'ry': 'rotateY', 'rz': 'rotateZ',
+    'sx': 'scaleX', 'sy': 'scaleY', 'sz': 'scaleZ',
+}
+_SHORT_NAMES = { long: short for short, long in _LONG_NAMES.items() }
+
+# Vector attributes that are always zero unless set, the pivots and constraint target offsets.
+_ZERO_VECTORS = ['rotatePivot', 'rotatePivotTranslate', 'scalePivot', 'scalePivotTranslate', 'rotateAxis', 'jointOrient',
+                 'targetOffsetTranslate', 'targetOffsetRotate']
+
+
+def _short(attr):
+    return _SHORT_NAMES.get(attr, attr)
+
+
+# Matrices ----
+
+def eulerMatrix(rx, ry, rz):
+    ''' Returns the 4x4 row vector matrix of an xyz rotation in radians. '''
+    cx, sx = math.cos(rx), math.sin(rx)
+    cy, sy = math.cos(ry), math.sin(ry)
+    cz, sz = math.cos(rz), math.sin(rz)
+
+    x = numpy.array([[1, 0, 0], [0, cx, sx], [0, -sx, cx]])
+    y = numpy.array([[cy, 0, -sy], [0, 1, 0], [sy, 0, cy]])
+    z = numpy.array([[cz, sz, 0], [-sz, cz, 0], [0, 0, 1]])
+
+    m = numpy.identity(4)
+    m[:3, :3] = x.dot(y).dot(z)
+    return m
+
+
+def matrixEuler(m):
+    ''' Returns the xyz rotation in radians of a 4x4 row vector matrix, inverse of `eulerMatrix`. '''
+    r = m[:3, :3] / numpy.linalg.norm(m[:3, :3], axis=1)[:, None]
+    ry = math.asin( max(-1.0, min(1.0, -r[0, 2])) )
+    if abs(r[0, 2]) < 0.99999:
+        rx = math.atan2(r[1, 2], r[2, 2])
+        rz = math.atan2(r[0, 1], r[0, 0])
+    else:
+        rx = math.atan2(-r[2, 1], r[1, 1])
+        rz = 0.0
+    return rx, ry, rz
+
+
+def transformMatrix(t, r):
+    m = eulerMatrix(*r)
+    m[3, :3] = t
+    return m
+
+
+# Scene ----
+
+class AnimCurve(object):
+    ''' Keys of one curve, values in ui units. '''
+
+    def __init__(self, name, plug, kind):
+        self.name = name
+        self.plug = plug
+        self.kind = kind  # 'TL', 'TA' or 'TU'
+        self.times = []
+        self.values = []
+        self.outTypes = []
+
+    def index(self, time):
+        i = bisect.bisect_left(self.times, time - 1e-6)
+        if i < len(self.times) and abs(self.times[i] - time) < 1e-6:
+            return i
+        return None
+
+    def evaluate(self, time):
+        if not self.times:
+            return 0.0
+
+        i = bisect.bisect_right(self.times, time + 1e-9)
+        if i == 0:
+            return self.values[0]
+        if i == len(self.times) or self.outTypes[i - 1] == TANGENT_STEP:
+            return self.values[i - 1]
+
+        t0, t1 = self.times[i - 1], self.times[i]
+        v0, v1 = self.values[i - 1], self.values[i]
+        return v0 + (v1 - v0) * (time - t0) / (t1 - t0)
+
+    def setKey(self, time, value, outType=TANGENT_GLOBAL):
+        i = self.index(time)
+        if i is not None:
+            self.values[i] = value
+            return i
+
+        i = bisect.bisect_left(self.times, time)
+        self.times.insert(i, time)
+        self.values.insert(i, value)
+        self.outTypes.insert(i, outType)
+        return i
+
+    def remove(self, index):
+        del self.times[index]
+        del self.values[index]
+        del self.outTypes[index]
+
+
+class Node(object):
+
+    def __init__(self, scene, name, nodeType='transform', parent=None):
+        self.scene = scene
+        self.name = name
+        self.type = nodeType
+        self.parent = parent
+        self.attrs = collections.OrderedDict()
+        self.locked = set()
+        self.enums = {}  # { <attr>: [<names>] }
+
+    def hasFn(self, fn):
+        if fn == MFn.kDagNode:
+            return self.type in ('transform', 'mesh', 'parentConstraint')
+        if fn == MFn.kAnimCurve:
+            return False
+        return fn == MFn.kInvalid
+
+    def longName(self):
+        return '|'.join( node.name for node in self.ancestry() )
+
+    def ancestry(self):
+        nodes = [self]
+        while nodes[0].parent:
+            nodes.insert(0, nodes[0].parent)
+        return nodes
+
+
+class Scene(object):
+    '''
+    Nodes, curves and the current time, plus the synthetic character's rig description for fossil.
+    '''
+
+    def __init__(self):
+        self.nodes = collections.OrderedDict()
+        self.curves = collections.OrderedDict()
+        self.drivers = {}      # { <plug>: <curve name> }
+        self.constraints = {}  # { <space group>: <constraint node> }
+        self.overrides = {}    # { <plug>: <value> } set on keyed plugs until the time changes
+        self.time = 1.0
+        self.playback = (1.0, 1.0)
+        self.counters = collections.Counter()
+        self.undoEnabled = True
+
+        # Rig description, filled by `buildRig`
+        self.controls = []     # [<Control>]
+        self.mains = []        # [<main group node>]
+        self.spaceNames = []
+        self.limbs = {}        # { <main control name>: { 'motion': 'ik' or 'fk', 'subs': [], 'other': <name>, 'switcher': <plug> } }
+
+    # Nodes
+
+    def add(self, name, nodeType='transform', parent=None, attrs=None):
+        node = Node(self, name, nodeType, self.nodes[parent] if parent else None)
+        node.attrs.update( attrs or {} )
+        self.nodes[name] = node
+        return node
+
+    def node(self, name):
+        name = str(name).split('|')[-1]
+        if name not in self.nodes:
+            raise ValueError('No object matches name: {}'.format(name))
+        return self.nodes[name]
+
+    def splitPlug(self, plug):
+        name, attr = str(plug).split('.', 1)
+        return self.node(name), _short(attr)
+
+    # Values
+
+    def setTime(self, time):
+        time = float(time)
+        if time != self.time:
+            self.counters['timeline'] += 1
+            self.overrides = {}
+        self.time = time
+
+    def value(self, plug, time=None):
+        node, attr = self.splitPlug(plug)
+        if attr in ('worldMatrix[0]', 'worldMatrix', 'parentMatrix[0]', 'parentMatrix'):
+            m = self.worldMatrix(node, time) if attr.startswith('world') else self.parentMatrix(node, time)
+            return list( m.flatten() )
+        if attr == 'worldInverseMatrix[0]':
+            return list( numpy.linalg.inv(self.worldMatrix(node, time)).flatten() )
+        if attr.split('.')[-1] in _ZERO_VECTORS:
+            return [ tuple(node.attrs.get(attr, (0.0, 0.0, 0.0))) ]
+        if attr in ('t', 'r', 's'):
+            return [ tuple(self.value(node.name + '.' + attr + axis, time) for axis in 'xyz') ]
+
+        key = node.name + '.' + attr
+        if time is None and key in self.overrides:
+            return self.overrides[key]
+
+        curve = self.drivers.get(key)
+        if curve:
+            self.counters['keyQueries'] += 1
+            return self.curves[curve].evaluate(self.time if time is None else time)
+
+        if attr.startswith('w') and node.type == 'parentConstraint':
+            return self.constraintWeight(node, int(attr[1:]), time)
+
+        return node.attrs.get(attr, 1.0 if attr in SCALES else 0.0)
+
+    def setValue(self, plug, value):
+        node, attr = self.splitPlug(plug)
+        if attr in ('t', 'r', 's'):
+            for axis, val in zip('xyz', value):
+                self.setValue(node.name + '.' + attr + axis, val)
+            return
+
+        key = node.name + '.' + attr
+        if key in self.drivers:
+            self.overrides[key] = value
+        else:
+            node.attrs[attr] = value
+
+    # Transforms
+
+    def localMatrix(self, node, time=None):
+        get = lambda attr: self.value(node.name + '.' + attr, time)  # noqa e731
+        return transformMatrix( [get('tx'), get('ty'), get('tz')], [get('rx'), get('ry'), get('rz')] )
+
+    def constraintWeight(self, constraint, index, time=None):
+        ctrl = constraint.attrs['control']
+        return 1.0 if int(round(self.value(ctrl + '.space', time))) == index else 0.0
+
+    def parentMatrix(self, node, time=None):
+        if node.parent is None:
+            return numpy.identity(4)
+        return self.worldMatrix(node.parent, time)
+
+    def worldMatrix(self, node, time=None):
+        constraint = self.constraints.get(node.name)
+        if constraint:
+            targets = constraint.attrs['targets']
+            active = [target for i, target in enumerate(targets) if self.constraintWeight(constraint, i, time)]
+            return self.worldMatrix( self.node(active[0] if active else targets[0]), time )
+
+        return self.localMatrix(node, time).dot( self.parentMatrix(node, time) )
+
+    def setWorldMatrix(self, node, world):
+        local = world.dot( numpy.linalg.inv(self.parentMatrix(node)) )
+        for axis, val in zip('xyz', local[3, :3]):
+            self.setValue(node.name + '.t' + axis, float(val))
+        for axis, val in zip('xyz', matrixEuler(local)):
+            self.setValue(node.name + '.r' + axis, float(val))
+
+    # Keys
+
+    def curveOf(self, plug, create=False):
+        node, attr = self.splitPlug(plug)
+        key = node.name + '.' + attr
+        name = self.drivers.get(key)
+        if name or not create:
+            return self.curves.get(name)
+
+        kind = 'TA' if attr in ('rx', 'ry', 'rz') else 'TL' if attr in ('tx', 'ty', 'tz') else 'TU'
+        curve = AnimCurve( '{}_{}'.format(node.name, attr), key, kind )
+        self.curves[curve.name] = curve
+        self.drivers[key] = curve.name
+        return curve
+
+    def key(self, plug, time=None, value=None, insert=False):
+        ''' Keys the plug like `setKeyframe`, with its current value unless given. '''
+        time = self.time if time is None else float(time)
+        curve = self.curveOf(plug)
+        if value is None:
+            if insert and curve:
+                value = curve.evaluate(time)
+            else:
+                value = self.value(plug) if time == self.time else self.value(plug, time)
+
+        curve = curve or self.curveOf(plug, create=True)
+        outType = TANGENT_STEP if plug.endswith('.space') else TANGENT_GLOBAL
+        curve.setKey(time, float(value), outType)
+        self.overrides.pop(curve.plug, None)
+
+    def keyablePlugs(self, node):
+        return [ node.name + '.' + attr for attr in node.attrs if attr in CHANNELS + SCALES + ['space', 'ikBlend'] ]
+
+
+SCENE = Scene()
+
+
+# maya.api.OpenMaya ----
+
+class MFn(object):
+    kInvalid = 0
+    kDagNode = 1
+    kWorld = 2
+    kAnimCurve = 3
+    kNumericAttribute = 4
+    kEnumAttribute = 5
+
+    @staticmethod
+    def hasFn(fn):
+        return False
+
+
+class _CurveObject(object):
+    ''' The MObject of an anim curve. '''
+
+    def __init__(self, curve):
+        self.curve = curve
+        self.name = curve.name
+
+    def hasFn(self, fn):
+        return fn in (MFn.kAnimCurve, MFn.kInvalid)
+
+
+class MObjectHandle(object):
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def hashCode(self):
+        return hash(self.obj.name)
+
+
+class MPlug(object):
+
+    def __init__(self, node, attr):
+        self._node = node
+        self.attr = attr
+
+    def node(self):
+        return self._node
+
+    def partialName(self, useLongNames=False):
+        return _LONG_NAMES.get(self.attr, self.attr) if useLongNames else self.attr
+
+    def name(self):
+        return self._node.name + '.' + self.attr
+
+    def attribute(self):
+        return MFn  # Plain numbers, it has no attribute function sets
+
+    def asDouble(self):
+        return float( SCENE.value(self.name()) )
+
+    def asInt(self):
+        return int( SCENE.value(self.name()) )
+
+    def asBool(self):
+        return bool( SCENE.value(self.name()) )
+
+
+class MSelectionList(object):
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, name):
+        name = str(name)
+        if name in SCENE.curves:
+            self.items.append( _CurveObject(SCENE.curves[name]) )
+        elif '.' in name:
+            node, attr = SCENE.splitPlug(name)
+            self.items.append( MPlug(node, attr) )
+        else:
+            self.items.append( SCENE.node(name) )
+
+    def getDependNode(self, index):
+        item = self.items[index]
+        return item.node() if isinstance(item, MPlug) else item
+
+    def getPlug(self, index):
+        return self.items[index]
+
+
+class MFnDependencyNode(object):
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def name(self):
+        return self.obj.name
+
+
+class MFnDagNode(MFnDependencyNode):
+
+    def fullPathName(self):
+        return '|' + self.obj.longName()
+
+    def partialPathName(self):
+        return self.obj.name
+
+    def parentCount(self):
+        return 1
+
+    def parent(self, index):
+        return self.obj.parent or _World()
+
+
+class _World(object):
+    name = 'world'
+
+    def hasFn(self, fn):
+        return fn == MFn.kWorld
+
+
+class MItDependencyGraph(object):
+    ''' Upstream of a node is its constraint and the constraint's targets. '''
+    kUpstream = kDepthFirst = kNodeLevel = 0
+
+    def __init__(self, root, *args):
+        nodes = [root]
+        constraint = SCENE.constraints.get(getattr(root, 'name', None))
+        if constraint:
+            nodes += [constraint] + [SCENE.node(target) for target in constraint.attrs['targets']]
+        self._nodes = nodes
+        self._index = 0
+
+    def isDone(self):
+        return self._index >= len(self._nodes)
+
+    def currentNode(self):
+        return self._nodes[self._index]
+
+    def prune(self):
+        pass  # Nothing is upstream of the constraint targets
+
+    def next(self):
+        self._index += 1
+
+
+class MTime(object):
+    kFilm = 'film'
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = float(value)
+
+    @staticmethod
+    def uiUnit():
+        return MTime.kFilm
+
+    def asUnits(self, unit):
+        return self.value
+
+
+class MAngle(object):
+    kRadians = 'radians'
+    kDegrees = 'degrees'
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = value if unit != MAngle.kDegrees else math.radians(value)
+
+    @staticmethod
+    def uiUnit():
+        return MAngle.kRadians
+
+    def asUnits(self, unit):
+        return self.value if unit != MAngle.kDegrees else math.degrees(self.value)
+
+    def asRadians(self):
+        return self.value
+
+
+class MDistance(object):
+    kCentimeters = 'cm'
+
+    def __init__(self, value=0.0, unit=None):
+        self.value = value
+
+    @staticmethod
+    def uiUnit():
+        return MDistance.kCentimeters
+
+    def asUnits(self, unit):
+        return self.value
+
+    def asCentimeters(self):
+        return self.value
+
+
+class MMatrix(object):
+
+    def __init__(self, values=None):
+        self.m = numpy.identity(4) if values is None else numpy.asarray(list(values), dtype=float).reshape(4, 4)
+
+    def __iter__(self):
+        return iter( self.m.flatten().tolist() )
+
+    def __mul__(self, other):
+        return MMatrix( self.m.dot(other.m).flatten() )
+
+    def inverse(self):
+        return MMatrix( numpy.linalg.inv(self.m).flatten() )
+
+
+class MDGModifier(object):
+    ''' Runs the queued edits on `doIt`, undo isn't modelled. '''
+
+    def __init__(self):
+        self._queue = []
+
+    def deleteNode(self, obj):
+        self._queue.append( lambda: Cmds.delete(obj.name) )
+
+    def newPlugValueDouble(self, plug, value):
+        self._queue.append( lambda: SCENE.setValue(plug.name(), value) )
+
+    newPlugValueInt = newPlugValueBool = newPlugValueDouble
+
+    def doIt(self):
+        queue, self._queue = self._queue, []
+        for edit in queue:
+            edit()
+
+    def undoIt(self):
+        pass
+
+
+class MEulerRotation(object):
+
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+    def asMatrix(self):
+        return MMatrix( eulerMatrix(self.x, self.y, self.z).flatten() )
+
+
+class _Callbacks(object):
+    ''' Every callback registration, they are never called. '''
+
+    def __getattr__(self, name):
+        if name.startswith('add'):
+            return lambda *args, **kwargs: 0
+        if name.startswith('k'):
+            return name
+        raise AttributeError(name)
+
+
+class MMessage(object):
+
+    @staticmethod
+    def removeCallbacks(ids):
+        pass
+
+
+class MPxCommand(object):
+    pass
+
+
+class MFnPlugin(object):
+
+    def __init__(self, plugin):
+        pass
+
+    def registerCommand(self, *args):
+        pass
+
+    def deregisterCommand(self, *args):
+        pass
+
+
+# maya.api.OpenMayaAnim ----
+
+class MAnimCurveChange(object):
+
+    def undoIt(self):
+        pass
+
+    def redoIt(self):
+        pass
+
+
+class MFnAnimCurve(object):
+    kAnimCurveTA, kAnimCurveTL, kAnimCurveTU, kAnimCurveUA, kAnimCurveUL = 'TA', 'TL', 'TU', 'UA', 'UL'
+    kTangentGlobal = TANGENT_GLOBAL
+    kTangentStep = TANGENT_STEP
+
+    def __init__(self, obj=None):
+        self.curve = obj.curve if obj is not None else None
+
+    def create(self, plug, curveType=None, modifier=None):
+        SCENE.counters['keyCalls'] += 1
+        self.curve = SCENE.curveOf(plug.name(), create=True)
+        return _CurveObject(self.curve)
+
+    @property
+    def animCurveType(self):
+        return self.curve.kind
+
+    isTimeInput = True
+    isWeighted = False
+
+    @property
+    def numKeys(self):
+        return len(self.curve.times)
+
+    def name(self):
+        return self.curve.name
+
+    def evaluate(self, mtime):
+        SCENE.counters['keyQueries'] += 1
+        return self.curve.evaluate(mtime.value)
+
+    def input(self, index):
+        return MTime( self.curve.times[index] )
+
+    def value(self, index):
+        return self.curve.values[index]
+
+    def find(self, mtime):
+        return self.curve.index(mtime.value)
+
+    def setValue(self, index, value, change=None):
+        SCENE.counters['keyCalls'] += 1
+        self.curve.values[index] = value
+
+    def addKey(self, mtime, value, tangentIn=None, tangentOut=TANGENT_GLOBAL, change=None):
+        SCENE.counters['keyCalls'] += 1
+        self.curve.setKey(mtime.value, value, tangentOut)
+
+    def addKeys(self, times, values, tangentIn=None, tangentOut=TANGENT_GLOBAL, keepExisting=True, change=None):
+        SCENE.counters['keyCalls'] += 1
+        for mtime, value in zip(times, values):
+            self.curve.setKey(mtime.value, value, tangentOut)
+
+    def insertKey(self, mtime, change=None):
+        SCENE.counters['keyCalls'] += 1
+        self.curve.setKey( mtime.value, self.curve.evaluate(mtime.value) )
+
+    def remove(self, index, change=None):
+        SCENE.counters['keyCalls'] += 1
+        self.curve.remove(index)
+
+    # Tangents, only the out type is kept, for stepped keys, so `curveSnapshot` can restore curves.
+
+    def __getattr__(self, name):
+        if name.startswith('kTangent'):
+            return name[len('kTangent'):].lower()
+        raise AttributeError(name)
+
+    def setOutTangentType(self, index, tangentType, change=None):
+        SCENE.counters['keyCalls'] += 1
+        self.curve.outTypes[index] = tangentType
+
+    def setInTangentType(self, index, tangentType, change=None):
+        pass
+
+    def setTangentsLocked(self, index, locked, change=None):
+        pass
+
+    def setAngle(self, index, angle, isInTangent, change=None):
+        pass
+
+    def setWeight(self, index, weight, isInTangent, change=None):
+        pass
+
+
+class MAnimUtil(object):
+
+    @staticmethod
+    def isAnimated(plug):
+        return plug.name() in SCENE.drivers
+
+    @staticmethod
+    def findAnimation(plug):
+        return [ _CurveObject(SCENE.curves[SCENE.drivers[plug.name()]]) ]
+
+
+# maya.cmds / pymel.core ----
+
+def _names(objs):
+    if isinstance(objs, (list, tuple, set)):
+        return [str(obj) for obj in objs]
+    return [str(objs)]
+
+
+def _plugsOf(objs, attribute=None):
+    ''' The keyable plugs of nodes, or the plugs themselves. '''
+    plugs = []
+    for name in _names(objs):
+        if '.' in name:
+            node, attr = SCENE.splitPlug(name)
+            plugs += [ node.name + '.' + a for a in ([attr + axis for axis in 'xyz'] if attr in ('t', 'r', 's') else [attr]) ]
+        elif name in SCENE.curves:
+            plugs.append( SCENE.curves[name].plug )
+        else:
+            plugs += SCENE.keyablePlugs( SCENE.node(name) )
+    return plugs
+
+
+def _curvesOf(objs):
+    curves = []
+    for name in _names(objs):
+        if name in SCENE.curves:
+            curves.append( SCENE.curves[name] )
+        else:
+            curves += [ SCENE.curveOf(plug) for plug in _plugsOf(name) if SCENE.curveOf(plug) ]
+    return curves
+
+
+class Cmds(object):
+    '''
+    The commands, as functions of both `maya.cmds` and `pymel.core`.
+    '''
+
+    @staticmethod
+    def currentTime(time=None, q=False, query=False, update=True):
+        if q or query or time is None:
+            return SCENE.time
+        SCENE.setTime(time)
+        return SCENE.time
+
+    @staticmethod
+    def playbackOptions(q=False, min=False, max=False, **kwargs):
+        return SCENE.playback[0] if min else SCENE.playback[1]
+
+    @staticmethod
+    def getAttr(plug, lock=False, time=None, asString=False):
+        node, attr = SCENE.splitPlug(plug)
+        if lock:
+            return attr in node.locked
+        if asString:
+            return node.enums[attr][int(SCENE.value(plug))]
+        if time is not None:
+            SCENE.counters['contextEvaluations'] += 1
+        return SCENE.value(plug, time)
+
+    @staticmethod
+    def setAttr(plug, value, **kwargs):
+        SCENE.setValue(plug, value)
+
+    @staticmethod
+    def setKeyframe(objs=None, t=None, v=None, insert=False, shape=True, **kwargs):
+        SCENE.counters['keyCalls'] += 1
+        times = t if isinstance(t, (list, tuple)) else [t]
+        for plug in _plugsOf(objs):
+            for time in times:
+                SCENE.key(plug, time, v, insert)
+
+    @staticmethod
+    def keyframe(objs=None, q=False, e=False, name=False, tc=False, vc=None, t=None, r=False, iub=False, **kwargs):
+        if q:
+            SCENE.counters['keyQueries'] += 1
+            curves = _curvesOf(objs)
+            if name:
+                return [curve.name for curve in curves]
+            return [ val for curve in curves for val in (curve.times if tc else curve.values) ]
+
+        SCENE.counters['keyCalls'] += 1
+        start, end = t if t else (None, None)
+        for curve in _curvesOf(objs):
+            for i, time in enumerate(curve.times):
+                if (start is None or start <= time) and (end is None or time <= end):
+                    curve.values[i] += vc
+        return None
+
+    @staticmethod
+    def keyTangent(objs=None, q=False, lock=False, ia=False, oa=False, itt=False, ott=False, **kwargs):
+        SCENE.counters['keyQueries'] += 1
+        curves = _curvesOf(objs)
+        if lock:
+            return [True for curve in curves for i in curve.times]
+        if itt or ott:
+            return [ kind for curve in curves for kind in (curve.outTypes if ott else [TANGENT_GLOBAL] * len(curve.times)) ]
+        return [0.0 for curve in curves for i in curve.times]
+
+    @staticmethod
+    def cutKey(objs=None, t=None, clear=True, **kwargs):
+        SCENE.counters['keyCalls'] += 1
+        start, end = t if t else (None, None)
+        for curve in _curvesOf(objs):
+            for i in reversed(range(len(curve.times))):
+                if (start is None or start <= curve.times[i]) and (end is None or curve.times[i] <= end):
+                    curve.remove(i)
+
+    @staticmethod
+    def listConnections(objs, s=True, d=True, c=False, type=None, **kwargs):
+        result = []
+        for name in _names(objs):
+            if '.' in name:
+                node, attr = SCENE.splitPlug(name)
+                constraint = SCENE.constraints.get(node.name)
+                if constraint and attr in CHANNELS and type in (None, 'constraint', 'parentConstraint'):
+                    result.append(constraint.name)
+                continue
+
+            if type == 'animCurve':
+                for plug in SCENE.keyablePlugs( SCENE.node(name) ):
+                    curve = SCENE.drivers.get(plug)
+                    if curve:
+                        result += [plug, curve] if c else [curve]
+        return result
+
+    @staticmethod
+    def connectionInfo(plug, isDestination=False):
+        node, attr = SCENE.splitPlug(plug)
+        return node.name + '.' + attr in SCENE.drivers
+
+    @staticmethod
+    def parentConstraint(constraint, q=False, targetList=False, weightAliasList=False):
+        node = SCENE.node(constraint)
+        if targetList:
+            return list( node.attrs['targets'] )
+        return [ 'w{}'.format(i) for i in range(len(node.attrs['targets'])) ]
+
+    @staticmethod
+    def ls(objs=None, long=False, type=None, **kwargs):
+        if type is not None:
+            return [ ('|' + node.longName() if long else node.name) for node in SCENE.nodes.values() if node.type == type ]
+        return [ ('|' + SCENE.node(name).longName() if long else name) for name in _names(objs) if Cmds.objExists(name) ]
+
+    @staticmethod
+    def listRelatives(name, ad=False, fullPath=False, **kwargs):
+        root = SCENE.node(name)
+        return [ '|' + node.longName() for node in SCENE.nodes.values() if root in node.ancestry()[:-1] ]
+
+    @staticmethod
+    def listAttr(name, **kwargs):
+        return [ attr for attr in SCENE.node(name).attrs if attr in CHANNELS + SCALES + ['space', 'ikBlend'] ]
+
+    @staticmethod
+    def nodeType(name):
+        return SCENE.node(name).type
+
+    @staticmethod
+    def objExists(name):
+        name = str(name)
+        if name in SCENE.curves:
+            return True
+        try:
+            node, attr = SCENE.splitPlug(name) if '.' in name else (SCENE.node(name), None)
+        except ValueError:
+            return False
+        return True
+
+    @staticmethod
+    def undoInfo(q=False, stateWithoutFlush=None, openChunk=False, closeChunk=False, chunkName=None, **kwargs):
+        if q:
+            return SCENE.undoEnabled
+        if stateWithoutFlush is not None:
+            SCENE.undoEnabled = stateWithoutFlush
+
+    @staticmethod
+    def loadPlugin(*args, **kwargs):
+        pass
+
+    @staticmethod
+    def fossilApiUndo():
+        # `apiUndo.commit` runs its command right away, which only stores the functions
+        from fossilAnimTools import apiUndo
+        apiUndo._pending.pop()
+
+    @staticmethod
+    def delete(objs):
+        for name in _names(objs):
+            curve = SCENE.curves.pop(name, None)
+            if curve:
+                SCENE.drivers.pop(curve.plug, None)
+
+    @staticmethod
+    def warning(msg):
+        pass
+
+
+# pymel ----
+
+class Attribute(object):
+
+    def __init__(self, node, attr):
+        self.node = node
+        self.attr = attr
+
+    def __str__(self):
+        return self.node.name() + '.' + self.attr
+
+    def name(self):
+        return str(self)
+
+    def get(self):
+        return Cmds.getAttr(str(self))
+
+    def set(self, value):
+        Cmds.setAttr(str(self), value)
+
+    def setKey(self):
+        Cmds.setKeyframe(str(self))
+
+    def getEnums(self):
+        return { name: i for i, name in enumerate(SCENE.node(self.node.name()).enums[self.attr]) }
+
+
+class PyNode(object):
+    '''
+    A node, with the fossil controller methods when it's a control.
+    '''
+
+    def __init__(self, name):
+        self._name = str(name).split('|')[-1]
+
+    def __str__(self):
+        return self._name
+
+    def __repr__(self):
+        return "PyNode('{}')".format(self._name)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._name)
+
+    def name(self):
+        return self._name
+
+    def longName(self):
+        return '|' + SCENE.node(self._name).longName()
+
+    def getParent(self):
+        parent = SCENE.node(self._name).parent
+        return PyNode(parent.name) if parent else None
+
+    def attr(self, name):
+        return Attribute(self, name)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return Attribute(self, name)
+
+    # Fossil controller
+
+    def getMotionKeys(self):
+        return SCENE.limbs[self._name]['motion']
+
+    def getOtherMotionType(self):
+        return CONTROLS[ SCENE.limbs[self._name]['other'] ]
+
+    @property
+    def subControl(self):
+        return collections.OrderedDict( (str(i), CONTROLS[name]) for i, name in enumerate(SCENE.limbs[self._name]['subs']) )
+
+    @property
+    def card(self):
+        return types.SimpleNamespace(rigCommand='IkChain')
+
+
+CONTROLS = {}  # { <name>: PyNode } so every lookup gets the same object
+
+
+def selected():
+    return []
+
+
+# pdil / fossil ----
+
+class _Settings(dict):
+
+    def __init__(self, name, defaults):
+        super(_Settings, self).__init__(defaults)
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@contextlib.contextmanager
+def _nothing(*args, **kwargs):
+    yield
+
+
+@contextlib.contextmanager
+def _preserveCurrentTime():
+    time = SCENE.time
+    try:
+        yield
+    finally:
+        SCENE.setTime(time)
+
+
+def _mainOf(ctrl):
+    name = str(ctrl)
+    for main, limb in SCENE.limbs.items():
+        if name == main or name in limb['subs']:
+            return CONTROLS[main]
+    return CONTROLS[name]
+
+
+def _switcherPlug(ctrl):
+    limb = SCENE.limbs.get( str(_mainOf(ctrl)) )
+    return limb['switcher'] if limb else None
+
+
+def _switchToSpace(ctrl, space):
+    node = SCENE.node(ctrl)
+    world = SCENE.worldMatrix(node)
+    SCENE.setValue( node.name + '.space', node.enums['space'].index(space) )
+    SCENE.setWorldMatrix(node, world)
+
+
+def _activateFk(mainCtrl):
+    Cmds.setAttr( _switcherPlug(mainCtrl), 0.0 )
+
+
+def _activateIk(ikMain):
+    Cmds.setAttr( _switcherPlug(ikMain), 1.0 )
+
+
+class _ActivateIkDispatch(object):
+    active_ikChain = staticmethod(_activateIk)
+    activate_dogleg = staticmethod(_activateIk)
+    active_splineChest = staticmethod(_activateIk)
+    active_splineNeck = staticmethod(_activateIk)
+
+
+def _module(moduleName, **attrs):
+    module = types.ModuleType(moduleName)
+    module.__dict__.update(attrs)
+    return module
+
+
+def _uiCommand(*args, **kwargs):
+    return None
+
+
+_UI_COMMANDS = ['button', 'Callback', 'checkBox', 'columnLayout', 'deleteUI', 'formLayout', 'frameLayout', 'intField',
+                'menuItem', 'optionMenu', 'promptDialog', 'radioButtonGrp', 'rowColumnLayout', 'scriptJob', 'scrollLayout',
+                'showWindow', 'tabLayout', 'text', 'textScrollList', 'window']
+
+
+def modules():
+    '''
+    Returns { <module name>: <module> } of the stand-in modules.
+    '''
+    commands = { name: getattr(Cmds, name) for name in dir(Cmds) if not name.startswith('_') }
+    cmds = _module('maya.cmds', **commands)
+
+    openMaya = _module( 'maya.api.OpenMaya',
+                        MFn=MFn, MObjectHandle=MObjectHandle, MSelectionList=MSelectionList,
+                        MFnDependencyNode=MFnDependencyNode, MFnDagNode=MFnDagNode, MItDependencyGraph=MItDependencyGraph,
+                        MTime=MTime, MTimeArray=list, MDoubleArray=list, MAngle=MAngle, MDistance=MDistance, MMatrix=MMatrix,
+                        MEulerRotation=MEulerRotation, MDGModifier=MDGModifier,
+                        MSceneMessage=_Callbacks(), MDGMessage=_Callbacks(), MEventMessage=_Callbacks(), MMessage=MMessage,
+                        MPxCommand=MPxCommand, MFnPlugin=MFnPlugin )  # noqa e128
+    openMayaAnim = _module( 'maya.api.OpenMayaAnim', MFnAnimCurve=MFnAnimCurve, MAnimCurveChange=MAnimCurveChange,
+                            MAnimUtil=MAnimUtil, MAnimMessage=_Callbacks() )  # noqa e128
+    api = _module( 'maya.api', OpenMaya=openMaya, OpenMayaAnim=openMayaAnim )
+    utils = _module( 'maya.utils', executeDeferred=lambda cmd, *args: cmd(*args) )
+    maya = _module( 'maya', cmds=cmds, api=api, utils=utils, OpenMayaUI=_module('maya.OpenMayaUI') )
+
+    core = _module( 'pymel.core', cmds=cmds, PyNode=PyNode, selected=selected, select=_uiCommand,
+                    ls=commands['ls'], **{ name: commands[name] for name in
+                                           ['currentTime', 'getAttr', 'setAttr', 'setKeyframe', 'keyframe', 'playbackOptions', 'warning'] } )  # noqa e128
+    core.__dict__.update( (name, _uiCommand) for name in _UI_COMMANDS )
+    pymel = _module( 'pymel', core=core )
+
+    fossil = _module(
+        'pdil.tool.fossil',
+        find=_module( 'fossil.find', controllers=lambda main=None: [CONTROLS[ctrl] for ctrl in SCENE.controls],
+                      mainGroups=lambda: [PyNode(main.name) for main in SCENE.mains],
+                      mainGroup=lambda: PyNode(SCENE.mains[0].name) ),  # noqa e128
+        rig=_module( 'fossil.rig', getMainController=_mainOf ),
+        node=_module( 'fossil.node', leadController=_mainOf ),
+        controllerShape=_module( 'fossil.controllerShape', getSwitcherPlug=_switcherPlug ),
+        space=_module( 'fossil.space', switchToSpace=_switchToSpace,
+                       getNames=lambda ctrl: list(SCENE.node(ctrl).enums['space']) ),  # noqa e128
+        kinematicSwitch=_module( 'fossil.kinematicSwitch', activateFk=_activateFk, ActivateIkDispatch=_ActivateIkDispatch ),
+    )
+    tool = _module( 'pdil.tool', fossil=fossil )
+
+    qt = _module( 'pdil.vendor.Qt', QtWidgets=_module('QtWidgets', QWidget=object, QDialog=object), QtCompat=None )
+    pdil = _module(
+        'pdil',
+        tool=tool,
+        vendor=_module( 'pdil.vendor', Qt=qt ),
+        math=_module( 'pdil.math', isCloseF=lambda a, b, tolerance=0.0001: abs(a - b) <= tolerance ),
+        time=_module( 'pdil.time', preserveCurrentTime=_preserveCurrentTime, playbackRange=lambda: SCENE.playback,
+                      rangeIsSelected=lambda: False, selectedTime=lambda: SCENE.playback ),  # noqa e128
+        ui=_module( 'pdil.ui', NoUpdate=_nothing, NoAutokey=_nothing, Settings=_Settings ),
+        alt=_module( 'pdil.alt', name=lambda *args: (lambda func: func) ),
+    )
+
+    return {
+        'maya': maya, 'maya.cmds': cmds, 'maya.api': api, 'maya.api.OpenMaya': openMaya,
+        'maya.api.OpenMayaAnim': openMayaAnim, 'maya.utils': utils, 'maya.OpenMayaUI': maya.OpenMayaUI,
+        'pymel': pymel, 'pymel.core': core,
+        'pdil': pdil, 'pdil.tool': tool, 'pdil.tool.fossil': fossil, 'pdil.vendor': pdil.vendor, 'pdil.vendor.Qt': qt,
+    }
+
+
+def install():
+    '''
+    Registers the stand-in modules, refusing if the real Maya is importable so it's never shadowed.
+    '''
+    if 'maya' in sys.modules and not getattr(sys.modules['maya'], '_standIn', False):
+        raise RuntimeError('Maya is already loaded, the stand-in would shadow it')
+
+    for name, module in modules().items():
+        module._standIn = True
+        sys.modules[name] = module
+
+    # Where Maya keeps prefs, the preset tool reads it on import
+    os.environ.setdefault( 'maya_app_dir', tempfile.gettempdir() )
+
+
+# The synthetic character ----
+
+def reset():
+    ''' Empties the scene and the tools' caches. '''
+    SCENE.__init__()
+    CONTROLS.clear()
+
+    from fossilAnimTools import keyIndex, rigTopology, spacePresets
+    keyIndex.stop()
+    rigTopology.stop()
+    spacePresets._applied.clear()
+
+
+def _keyChannels(plug, frames, step, phase, amplitude):
+    curve = SCENE.curveOf(plug, create=True)
+    t = 1.0
+    while t <= frames:
+        curve.setKey( t, amplitude * math.sin(0.1 * t + phase) )
+        t += step
+    if curve.times[-1] != frames:
+        curve.setKey( float(frames), amplitude * math.sin(0.1 * frames + phase) )
+
+
+def buildRig(controls=8, frames=100, keyDensity=0.25, spaces=3, seed=0):
+    '''
+    Resets the scene to a synthetic character, see the module docs.  Returns the control PyNodes.
+
+    Args:
+        controls: Number of controls with spaces, every fourth is also an ik main with an fk counterpart.
+        frames: Keyed from frame 1 to `frames`.
+        keyDensity: Keys per frame on every channel, 1 keys every frame.
+        spaces: Space targets per control.
+    '''
+    reset()
+    SCENE.playback = (1.0, float(frames))
+
+    SCENE.mains.append( SCENE.add('main') )
+    SCENE.spaceNames = ['space{}'.format(i) for i in range(spaces)]
+    for i, name in enumerate(SCENE.spaceNames):
+        SCENE.add( name, parent='main', attrs={'tx': 10.0 * i, 'ty': 5.0 * (i % 2), 'tz': -3.0 * i} )
+
+    step = max(1.0, round(1.0 / keyDensity)) if keyDensity else float(frames)
+
+    def addControl(name, withSpace, phase):
+        group = SCENE.add( name + '_space', parent='main' )
+        ctrl = SCENE.add( name, parent=group.name, attrs={channel: 0.0 for channel in CHANNELS + SCALES} )
+        ctrl.attrs['rotateOrder'] = 0
+        if withSpace:
+            ctrl.attrs['space'] = 0.0
+            ctrl.enums['space'] = list(SCENE.spaceNames)
+            constraint = SCENE.add( name + '_parentConstraint1', 'parentConstraint', parent=group.name )
+            constraint.attrs.update( {'targets': list(SCENE.spaceNames), 'control': name} )
+            SCENE.constraints[group.name] = constraint
+
+        for i, channel in enumerate(CHANNELS):
+            _keyChannels( name + '.' + channel, frames, step, phase + i, 0.5 if channel.startswith('r') else 4.0 )
+        if withSpace:
+            curve = SCENE.curveOf(name + '.space', create=True)
+            curve.setKey(1.0, 0.0, TANGENT_STEP)
+
+        CONTROLS[name] = PyNode(name)
+        return name
+
+    for c in range(controls):
+        name = addControl( 'ctrl{}'.format(c), True, c )
+        SCENE.controls.append(name)
+
+        if c % 4 == 0:
+            # `name` is the ik main of a limb, with sub controls and an fk side.
+            switcher = SCENE.add( name + '_switch', attrs={'ikBlend': 1.0} )
+            switcherPlug = switcher.name + '.ikBlend'
+            curve = SCENE.curveOf(switcherPlug, create=True)
+            curve.setKey(1.0, 1.0)
+
+            ikSubs = [ addControl('{}_ik{}'.format(name, i), False, c + i) for i in range(2) ]
+            fkMain = addControl( name + '_fk', False, c + 3 )
+            fkSubs = [ addControl('{}_fk{}'.format(name, i), False, c + 4 + i) for i in range(2) ]
+            SCENE.controls += ikSubs + [fkMain] + fkSubs
+
+            SCENE.limbs[name] = {'motion': 'ik', 'subs': ikSubs, 'other': fkMain, 'switcher': switcherPlug}
+            SCENE.limbs[fkMain] = {'motion': 'fk', 'subs': fkSubs, 'other': name, 'switcher': switcherPlug}
+
+    # Something for the evaluation scope to turn off
+    SCENE.add( 'body_skinCluster', 'geometryFilter' )
+    SCENE.add( 'bodyShape', 'mesh', parent='main' )
+
+    SCENE.counters.clear()
+    return [ CONTROLS[name] for name in SCENE.controls if name in [ 'ctrl{}'.format(c) for c in range(controls) ] ]
@@ -1,2 +1,8 @@
-from . import offsetCurves  # noqa
-from . import animSwitcherGui  # noqa
\ No newline at end of file
+import sys
+
+# The tools register their commands with `pdil.alt` for the shelf when imported, which needs Maya.  They are only
+# imported if Maya is already running, so command line entry points (`switchWorker`, `batchApply`) choose when
+# Maya starts, and the modules that don't need it, ex `spaceSolver`, can be used anywhere.
+if 'maya.cmds' in sys.modules:
+    from . import offsetCurves  # noqa
+    from . import animSwitcherGui  # noqa
@@ -3,12 +3,15 @@ from __future__ import print_function
 import traceback
 
 from pymel.core import formLayout, window, deleteUI, tabLayout, radioButtonGrp, scrollLayout, columnLayout, frameLayout, \
-    text, rowColumnLayout, button, Callback, cmds, showWindow, currentTime, textScrollList, scriptJob, optionMenu, selected, warning
+    text, rowColumnLayout, button, Callback, checkBox, cmds, showWindow, currentTime, textScrollList, scriptJob, optionMenu, \
+    selected, warning
 
 import pdil
 from pdil.tool import fossil
 
+from . import rigTopology
 from . import spacePresets
+from . import spaceSwitching
 
 import os
 
@@ -20,6 +23,7 @@ class Gui(object):
         {
             'key': True,
             'mode': 'range',
+            'timelineFree': False,
             
             'ikfkCollapsed': False,
             'spaceCollapsed': False,
@@ -75,7 +79,12 @@ class Gui(object):
                         # Fk / Ik Switching
                         with frameLayout(l='Ik/Fk Switching', cll=True) as ikFkFrame:
                             self.settings.frameLayoutSetup(ikFkFrame, 'ikfkCollapsed')
+                            self.limbs = []  # [ (<ik main>, <fk main>), ... ]
                             with rowColumnLayout(nc=3, cw=[(1, 200), (2, 50), (3, 50)] ):
+                                text(l='All Limbs')
+                                button(l='Ik', c=Callback(self.doIkFkSwitchAll, True))
+                                button(l='Fk', c=Callback(self.doIkFkSwitchAll, False))
+                                
                                 for card in fossil.find.blueprintCards():
                                     for side in ['Center', 'Left', 'Right']:
                                         try:
@@ -83,6 +92,7 @@ class Gui(object):
                                             fk = card.getSide(side).fk
                                             
                                             if ik and fk:
+                                                self.limbs.append( (ik, fk) )
                                                 text(l=ik.shortName())
                                                 button(l='Ik', c=Callback(self.doIkFkSwitch, fk, True))
                                                 button( l='Fk', c=Callback(self.doIkFkSwitch, ik, False) )
@@ -98,6 +108,7 @@ class Gui(object):
                                 with rowColumnLayout( nc=2 ):
                                     
                                     button( l='Switch', c=Callback(self.switch) )
+                                    self.settings.checkBoxSetup( checkBox(l='Timeline Free'), 'timelineFree' )
                                 
                                 text(l='Control')
                                 self.targets = textScrollList(h=200)
@@ -200,7 +211,7 @@ class Gui(object):
         mode, start, end = self.processRange()
         #ikFkSwitch(obj, start, end)
         print(mode, start, end)
-        plug = fossil.controllerShape.getSwitcherPlug(obj)
+        plug = rigTopology.get().switcher(obj)
         if isIk and cmds.getAttr(plug) == 1.0:
             print('Already IK, skipping')
             return
@@ -211,6 +222,22 @@ class Gui(object):
         
         fossil.kinematicSwitch.multiSwitch([obj], start, end)
         print('doing switch')
+    
+    def doIkFkSwitchAll(self, isIk, limbs=None):
+        '''
+        Switches all the limbs (or the given [(<ik>, <fk>), ...]) to ik or fk in a single pass of the timeline
+        and prints how long each took.
+        '''
+        mode, start, end = self.processRange()
+        
+        targets = [ik if isIk else fk for ik, fk in (limbs or self.limbs)]
+        if not targets:
+            return
+        
+        with pdil.ui.NoUpdate( [fossil.find.mainGroup()] ):
+            timings = spacePresets.switchLimbs( targets, self.MODES[mode] )
+        
+        print( spacePresets.timingSummary(timings) )
         
     """
     def zeroMain(self):
@@ -324,19 +351,26 @@ class Gui(object):
         if not selection:
             return
         
+        if not self.targets.getSelectItem():
+            return
+        
+        targetSpace = self.targets.getSelectItem()[0]
+        
+        controlSpaces = []
+        for sel in selection:
+            if targetSpace not in fossil.space.getNames( sel ):
+                warning( "{0} does not have space {1}, skipping".format( sel, targetSpace ) )
+                continue
+            
+            controlSpaces.append( (sel, targetSpace) )
+        
         with pdil.ui.NoUpdate( [fossil.find.mainGroup()] ):
-            for sel in selection:
-                if self.targets.getSelectItem():
-                    
-                    targetSpace = self.targets.getSelectItem()[0]
-                    if targetSpace not in fossil.space.getNames( sel ):
-                        warning( "{0} does not have space {1}, skipping".format( sel, targetSpace ) )
-                        continue
-                    
-                    if mode != 0:
-                        fossil.space.switchRange( sel, targetSpace, (start, end) )
-                    else:
-                        fossil.space.switchToSpace( sel, targetSpace )
+            if mode != 0:
+                # All the controls are switched together so the timeline is only walked once.
+                spaceSwitching.switchRanges( controlSpaces, (start, end), timelineFree=self.settings.timelineFree )
+            else:
+                for sel, targetSpace in controlSpaces:
+                    fossil.space.switchToSpace( sel, targetSpace )
         
     def update(self):
         self.targets.removeAll()
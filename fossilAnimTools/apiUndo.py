@@ -0,0 +1,96 @@
+'''
+Puts edits made through the API into Maya's undo queue.
+
+Maya can only undo commands, so `commit` runs a tiny command holding the undo and redo functions of an
+edit that was already made, ex:
+
+    change = OpenMayaAnim.MAnimCurveChange()
+    curveFn.setValue(0, 1.0, change)
+    apiUndo.commit(change.undoIt, change.redoIt)
+
+This file is also the plugin defining that command, loaded on demand.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import contextlib
+import importlib
+import os
+
+from maya import cmds
+from maya.api import OpenMaya
+
+
+COMMAND = 'fossilApiUndo'
+
+# Maya loads this file as a separate module when it's a plugin, so the command looks up the real one.
+_MODULE = 'fossilAnimTools.apiUndo'
+
+_pending = []
+
+
+def maya_useNewAPI():
+    pass
+
+
+class ApiUndoCommand(OpenMaya.MPxCommand):
+
+    def doIt(self, args):
+        self._undo, self._redo = importlib.import_module(_MODULE)._pending.pop()
+
+    def undoIt(self):
+        self._undo()
+
+    def redoIt(self):
+        self._redo()
+
+    def isUndoable(self):
+        return True
+
+    @staticmethod
+    def creator():
+        return ApiUndoCommand()
+
+
+def initializePlugin(plugin):
+    OpenMaya.MFnPlugin(plugin).registerCommand(COMMAND, ApiUndoCommand.creator)
+
+
+def uninitializePlugin(plugin):
+    OpenMaya.MFnPlugin(plugin).deregisterCommand(COMMAND)
+
+
+def commit(undo, redo):
+    '''
+    Registers an already performed edit with the undo queue.
+    '''
+    if not hasattr(cmds, COMMAND):
+        cmds.loadPlugin( os.path.splitext(__file__)[0] + '.py', quiet=True )
+
+    _pending.append( (undo, redo) )
+    getattr(cmds, COMMAND)()
+
+
+@contextlib.contextmanager
+def chunk(name='fossilAnimTools'):
+    '''
+    Groups everything done within into a single undo.
+    '''
+    cmds.undoInfo(openChunk=True, chunkName=name)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+
+@contextlib.contextmanager
+def disabled():
+    '''
+    Keeps everything done within out of the undo queue, without flushing it.
+    '''
+    state = cmds.undoInfo(q=True, stateWithoutFlush=True)
+    cmds.undoInfo(stateWithoutFlush=False)
+    try:
+        yield
+    finally:
+        cmds.undoInfo(stateWithoutFlush=state)
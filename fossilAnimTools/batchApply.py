@@ -0,0 +1,247 @@
+'''
+Applies a space preset profile to many scene files from the command line.
+
+    mayapy -m fossilAnimTools.batchApply presets.json "Hands World" shots/*.ma --output-dir switched \
+        --mode all --processes 4 --report report.jsonl
+
+Every file is opened in one of a pool of processes, the profile is applied to every character in it with
+`spacePresets.applyCharacters`, which switches with the same planner as `spacePresets.apply` does by default,
+and the result is saved to the output dir, at the same path relative to the folder all the scenes are in (or
+over the original with `--in-place`).  Each file gets a json line in the report with its timing and any failure.
+
+This process never imports Maya, and the pool is started with 'spawn' (where available), so each worker starts
+its own Maya instead of inheriting a copy.
+
+The Maya work is done by a backend, `--backend stand-in` copies the files without Maya so the pipeline can
+be tested anywhere, and `--backend package.module:Class` loads any other class with the same methods as
+`MayaBackend`.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import collections
+import glob
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+from timeit import default_timer
+import traceback
+
+
+class MayaBackend(object):
+    '''
+    Opens, switches and saves scenes in a standalone Maya session.
+    '''
+
+    def initialize(self):
+        import maya.standalone
+        maya.standalone.initialize(name='python')
+
+    def applyFile(self, path, output, profile, mode):
+        '''
+        Applies the profile to every character in the scene at path and saves it as output.
+        Returns a dict of details for the report.
+        '''
+        from maya import cmds
+        from pdil.tool import fossil
+
+        from fossilAnimTools import spacePresets
+
+        cmds.file( path, open=True, force=True )
+
+        mains = fossil.find.mainGroups()
+        visits, errors = spacePresets.applyCharacters( profile, mains, mode )
+        if errors and len(errors) == len(mains):
+            raise RuntimeError( 'Every character failed: {}'.format(
+                ', '.join('{} ({})'.format(main, error) for main, error in errors.items())) )
+
+        cmds.file( rename=output )
+        cmds.file( save=True, force=True, type='mayaBinary' if output.lower().endswith('.mb') else 'mayaAscii' )
+
+        return {
+            'characters': len(mains),
+            'frames': visits['frames'],
+            'failedCharacters': { str(main): str(error) for main, error in errors.items() },
+        }
+
+
+class StandInBackend(object):
+    '''
+    Copies the files instead of switching them, so everything but Maya can be tested.
+    '''
+
+    def initialize(self):
+        pass
+
+    def applyFile(self, path, output, profile, mode):
+        if os.path.abspath(path) != os.path.abspath(output):
+            shutil.copyfile(path, output)
+
+        return {'characters': 0, 'frames': 0, 'failedCharacters': {}}
+
+
+BACKENDS = {
+    'maya': MayaBackend,
+    'stand-in': StandInBackend,
+}
+
+
+def loadBackend(name):
+    ''' Returns the backend class of a name in `BACKENDS` or a 'package.module:Class' path. '''
+    if name in BACKENDS:
+        return BACKENDS[name]
+
+    module, cls = name.split(':')
+    return getattr( importlib.import_module(module), cls )
+
+
+if '_backend' not in globals():
+    _backend = None
+
+
+def _initWorker(backendName):
+    global _backend
+    _backend = loadBackend(backendName)()
+    _backend.initialize()
+
+
+def _processFile(job):
+    '''
+    Runs in a pool process, returning the report record of one file.
+    '''
+    path, output, profile, mode = job
+
+    record = collections.OrderedDict( [('file', path), ('output', output)] )
+    startTime = default_timer()
+    try:
+        record.update( _backend.applyFile(path, output, profile, mode) )
+        record['status'] = 'ok'
+    except Exception as e:
+        record['status'] = 'failed'
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+        record['traceback'] = traceback.format_exc()
+
+    record['seconds'] = round(default_timer() - startTime, 3)
+    return record
+
+
+def findScenes(patterns):
+    ''' Returns the sorted unique files matching the paths or glob patterns. '''
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        files.update( matches if matches else [pattern] )  # Missing files are reported as failures
+
+    return sorted(files)
+
+
+def outputPaths(files, outputDir=None):
+    '''
+    Returns the path to save each file to, its path relative to the deepest folder all the files are in,
+    under the output dir, so files with the same name in different folders don't overwrite each other.
+    If no output dir is given, the files are overwritten.
+    '''
+    if not outputDir:
+        return list(files)
+
+    folders = [ os.path.dirname(os.path.abspath(path)) + os.sep for path in files ]
+    root = os.path.dirname( os.path.commonprefix(folders) ) if folders else ''
+
+    return [ os.path.join(outputDir, os.path.relpath(os.path.abspath(path), root)) for path in files ]
+
+
+def _context():
+    '''
+    Returns the multiprocessing context to start the pool with, 'spawn' so the workers don't fork this process.
+    Python 2 can only fork on posix, which is fine as long as nothing here imports Maya.
+    '''
+    getContext = getattr(multiprocessing, 'get_context', None)
+    return getContext('spawn') if getContext else multiprocessing
+
+
+def loadProfile(presetFile, profileName):
+    ''' Returns the { <control name>: <space> } profile from a `SpacePresets` json file. '''
+    with open(presetFile, 'r') as fid:
+        profiles = json.load(fid, object_pairs_hook=collections.OrderedDict)
+
+    if profileName not in profiles:
+        raise KeyError( 'No profile "{}" in {}, choose from: {}'.format(profileName, presetFile, ', '.join(profiles)) )
+
+    return profiles[profileName]
+
+
+def run(profile, files, mode='all', outputDir=None, processes=None, backend='maya', report=None):
+    '''
+    Applies the profile to all the files in a pool of processes, writing a json line per file to the
+    report, if given, as each finishes.  Returns the list of records.
+
+    Args:
+        outputDir: Where to save the switched files, overwriting the originals if None.
+    '''
+    jobs = [ (path, output, profile, mode) for path, output in zip(files, outputPaths(files, outputDir)) ]
+
+    for path, output, profile, mode in jobs:
+        folder = os.path.dirname(output)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+    records = []
+    reportFile = open(report, 'w') if report else None
+    pool = _context().Pool( processes or multiprocessing.cpu_count(), _initWorker, (backend,) )
+    try:
+        for record in pool.imap_unordered(_processFile, jobs):
+            records.append(record)
+            if reportFile:
+                reportFile.write( json.dumps(record) + '\n' )
+                reportFile.flush()
+
+            print( '{status:>6} {seconds:>8.3f}s {file}'.format(**record) )
+    finally:
+        pool.close()
+        pool.join()
+        if reportFile:
+            reportFile.close()
+
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser( prog='fossilAnimTools.batchApply', description=__doc__.strip().splitlines()[0] )
+    parser.add_argument( 'preset', help='SpacePresets json file' )
+    parser.add_argument( 'profile', help='Name of the profile in the preset file' )
+    parser.add_argument( 'scenes', nargs='+', help='Scene files or glob patterns' )
+    parser.add_argument( '--mode', default='all', choices=['all', 'range', 'frame'],
+                         help='all keys, the playback range or the current frame (default: all)' )  # noqa e127
+
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument( '--output-dir', help='Folder to save the switched scenes in' )
+    output.add_argument( '--in-place', action='store_true', help='Overwrite the original scenes' )
+
+    parser.add_argument( '--processes', type=int, default=None, help='Pool size (default: cpu count)' )
+    parser.add_argument( '--report', default=None, help='Json lines file of the per file results' )
+    parser.add_argument( '--backend', default='maya',
+                         help='maya, stand-in or package.module:Class (default: maya)' )  # noqa e127
+
+    args = parser.parse_args(argv)
+
+    try:
+        profile = loadProfile(args.preset, args.profile)
+    except KeyError as e:
+        parser.error( e.args[0] )
+    files = findScenes(args.scenes)
+
+    startTime = default_timer()
+    records = run( profile, files, args.mode, args.output_dir, args.processes, args.backend, args.report )
+
+    failed = [record for record in records if record['status'] != 'ok']
+    print( '{} files, {} failed, {:.1f}s'.format(len(records), len(failed), default_timer() - startTime) )
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit( main() )
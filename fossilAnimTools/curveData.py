@@ -0,0 +1,470 @@
+'''
+Bulk reading and writing of anim curve keys.
+
+Keys are read with a single `keyframe` query per column and written through `MFnAnimCurve` as one
+undoable edit per curve, instead of a command per key.  Values are in ui units, same as `keyframe`.
+
+`CurveTable` reads every curve driving a set of nodes, ex. a whole character, in one pass so key queries
+don't each need their own `keyframe` round trip.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import array
+import bisect
+import collections
+import itertools
+
+from maya.api import OpenMaya, OpenMayaAnim
+
+from pymel.core import cmds
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pdil.tool import fossil
+
+from . import apiUndo
+from . import tracing
+
+
+# Functions called with a list of curve names whenever this module edits curves, ex. to update a cache.
+editListeners = []
+
+_ANGULAR = (OpenMayaAnim.MFnAnimCurve.kAnimCurveTA, OpenMayaAnim.MFnAnimCurve.kAnimCurveUA)
+_LINEAR = (OpenMayaAnim.MFnAnimCurve.kAnimCurveTL, OpenMayaAnim.MFnAnimCurve.kAnimCurveUL)
+
+
+def notifyEdited(curves):
+    ''' Tells the `editListeners` the curves were edited, ex. through the API, which doesn't trigger callbacks. '''
+    for listener in editListeners:
+        listener(curves)
+
+
+def toUiUnits(curveFn):
+    ''' Returns a function converting internal values of the curve's output to ui units, or None if unitless. '''
+    curveType = curveFn.animCurveType
+
+    if curveType in _ANGULAR:
+        unit = OpenMaya.MAngle.uiUnit()
+        return lambda val: OpenMaya.MAngle(val, OpenMaya.MAngle.kRadians).asUnits(unit)
+
+    elif curveType in _LINEAR:
+        unit = OpenMaya.MDistance.uiUnit()
+        return lambda val: OpenMaya.MDistance(val, OpenMaya.MDistance.kCentimeters).asUnits(unit)
+
+    return None
+
+
+def toInternalUnits(curveFn):
+    ''' Returns a function converting ui values to the curve's internal units, or None if unitless. '''
+    curveType = curveFn.animCurveType
+
+    if curveType in _ANGULAR:
+        unit = OpenMaya.MAngle.uiUnit()
+        return lambda val: OpenMaya.MAngle(val, unit).asRadians()
+
+    elif curveType in _LINEAR:
+        unit = OpenMaya.MDistance.uiUnit()
+        return lambda val: OpenMaya.MDistance(val, unit).asCentimeters()
+
+    return None
+
+
+def _selected(name):
+    ''' Returns an MSelectionList of just the named node or plug. '''
+    selList = OpenMaya.MSelectionList()
+    selList.add(name)
+    return selList
+
+
+def curveFn(curve):
+    ''' Returns an MFnAnimCurve for the named curve. '''
+    return OpenMayaAnim.MFnAnimCurve( _selected(curve).getDependNode(0) )
+
+
+def keyArrays(curve):
+    '''
+    Returns (times, values) of every key on the curve, as numpy arrays if available.
+    '''
+    times = cmds.keyframe(curve, q=True, tc=True) or []
+    values = cmds.keyframe(curve, q=True, vc=True) or []
+
+    if numpy:
+        return numpy.array(times, dtype=float), numpy.array(values, dtype=float)
+
+    return times, values
+
+
+def setKeyValues(curve, indices, values):
+    '''
+    Sets the values of the keys at the given indices as a single undoable edit.
+    '''
+    fn = curveFn(curve)
+    convert = toInternalUnits(fn)
+
+    change = OpenMayaAnim.MAnimCurveChange()
+    for index, val in zip(indices, values):
+        fn.setValue( int(index), convert(float(val)) if convert else float(val), change )
+
+    apiUndo.commit(change.undoIt, change.redoIt)
+    notifyEdited([curve])
+
+
+def setKeys(plug, times, values, stepped=False):
+    '''
+    Keys the plug at all the times as a single undoable edit, replacing the values of existing keys.
+
+    New keys use the global tangents, or step out tangents if `stepped`, ex. for enums.
+    '''
+    if not len(times):
+        return
+
+    curves = cmds.keyframe(plug, q=True, name=True)
+    if not curves:
+        cmds.setKeyframe(plug, t=times[0], v=values[0])
+        curves = cmds.keyframe(plug, q=True, name=True)
+
+    fn = curveFn(curves[0])
+    convert = toInternalUnits(fn)
+    tangentOut = fn.kTangentStep if stepped else fn.kTangentGlobal
+    unit = OpenMaya.MTime.uiUnit()
+
+    change = OpenMayaAnim.MAnimCurveChange()
+    for time, val in zip(times, values):
+        mtime = OpenMaya.MTime(float(time), unit)
+        val = convert(float(val)) if convert else float(val)
+
+        index = fn.find(mtime)
+        if index is None:
+            fn.addKey(mtime, val, fn.kTangentGlobal, tangentOut, change)
+        else:
+            fn.setValue(index, val, change)
+
+    apiUndo.commit(change.undoIt, change.redoIt)
+    notifyEdited(curves[:1])
+
+
+# Tangent types as stored in `CurveTable`, by index.
+TANGENT_TYPES = ['global', 'fixed', 'linear', 'flat', 'smooth', 'step', 'slow', 'fast', 'clamped', 'plateau',
+                 'stepnext', 'auto', 'spline']  # noqa e128
+
+_COLUMNS = ['times', 'values', 'inAngles', 'outAngles', 'inTypes', 'outTypes']
+
+
+def _column(values, integer=False):
+    ''' Returns a compact array of the values, a numpy array if available, otherwise an `array.array`. '''
+    if numpy:
+        return numpy.array(values, dtype=numpy.int8 if integer else float)
+    
+    return array.array('b' if integer else 'd', values)
+
+
+def _nodeName(node):
+    return node.name() if hasattr(node, 'name') else str(node)
+
+
+
+class CurveTable(object):
+    '''
+    Every key of the anim curves driving some nodes, read in bulk and stored as columns.
+    
+    Each read stores its curves back to back in one array per column (times, values, in/out tangent angles
+    and tangent types as indices into `TANGENT_TYPES`) so memory is proportional to the key count and there
+    isn't a Python object per key.  A curve is just its (<block>, <first key>, <end key>) slice of those.
+    
+        curves = CurveTable.forCharacter(main)
+        curves.keyTimes( [ctrl], ['space', 'tx'], start=1, end=20 )
+        times, values = curves.keys('ctrl.space')
+    
+    Nodes not read yet are read the first time they are queried.  The table is a snapshot, so call
+    `invalidate` on nodes whose keys were edited to have them read again.  Only curves connected directly
+    to the nodes are read, animation through anim layers isn't.
+    '''
+    
+    def __init__(self, nodes=(), tangents=True):
+        '''
+        Args:
+            nodes: Nodes to read up front.
+            tangents: Also read the tangent columns, otherwise only times and values.
+        '''
+        self.readTangents = tangents
+        self._blocks = []  # [ { <column>: <array> }, ... ]
+        self._curves = {}  # { <curve>: (<block index>, <first key>, <end key>) }
+        self._nodes = {}   # { <node>: { <long or short attr>: <curve> } }
+        self._users = collections.defaultdict(set)  # { <curve>: { <node>, ... } }
+        self._deadKeys = 0  # Keys in the blocks belonging to forgotten curves
+        
+        if nodes:
+            self.read(nodes)
+    
+    @classmethod
+    def forCharacter(cls, main=None, tangents=True):
+        '''
+        Returns a table of all the curves on the character's controllers, or every character if `main` is None.
+        '''
+        controls = fossil.find.controllers(main=main) if main else fossil.find.controllers()
+        return cls(controls, tangents)
+    
+    @tracing.traced('readKeys')
+    def read(self, nodes):
+        '''
+        Reads all the curves driving the nodes that haven't been read yet, in one pass.
+        '''
+        names = [name for name in collections.OrderedDict.fromkeys(_nodeName(node) for node in nodes)
+                 if name not in self._nodes]  # noqa e128
+        if not names:
+            return
+        
+        for name in names:
+            self._nodes[name] = {}
+        
+        connections = cmds.listConnections(names, s=True, d=False, c=True, type='animCurve') or []
+        if not connections:
+            return
+        
+        # Driven keys are anim curves too but aren't keyed in time.
+        timeCurves = { curve: curveFn(curve) for curve in set(connections[1::2]) }
+        timeCurves = { curve: fn for curve, fn in timeCurves.items() if fn.isTimeInput }
+        
+        pairs = [ (plug, curve) for plug, curve in zip(connections[0::2], connections[1::2]) if curve in timeCurves ]
+        if not pairs:
+            return
+        
+        curves = list( collections.OrderedDict.fromkeys(curve for plug, curve in pairs) )
+        
+        # Match the connected plugs back to the names asked for since the names can be formatted differently.
+        requested = { OpenMaya.MObjectHandle(_selected(name).getDependNode(0)).hashCode(): name for name in names }
+        
+        for plugName, curve in pairs:
+            plug = _selected(plugName).getPlug(0)
+            node = requested.get( OpenMaya.MObjectHandle(plug.node()).hashCode() )
+            if node:
+                attrs = self._nodes[node]
+                attrs[ plug.partialName(useLongNames=True) ] = curve
+                attrs[ plug.partialName(useLongNames=False) ] = curve
+                self._users[curve].add(node)
+        
+        self._readCurves( curves, [timeCurves[curve].numKeys for curve in curves] )
+    
+    def _readCurves(self, curves, counts):
+        '''
+        Queries each column of all the curves with a single command and stores them as a new block.
+        '''
+        tracing.count('curvesRead', len(curves))
+        queries = [ ('times', cmds.keyframe, {'tc': True}), ('values', cmds.keyframe, {'vc': True}) ]
+        if self.readTangents:
+            queries += [ ('inAngles', cmds.keyTangent, {'ia': True}), ('outAngles', cmds.keyTangent, {'oa': True}),
+                         ('inTypes', cmds.keyTangent, {'itt': True}), ('outTypes', cmds.keyTangent, {'ott': True}) ]  # noqa e128
+        
+        block = {}
+        for column, command, flag in queries:
+            data = command(curves, q=True, **flag) or []
+            
+            # The results are the curves' keys back to back, but make sure before trusting the counts.
+            if len(data) != sum(counts):
+                data = list( itertools.chain.from_iterable(command(curve, q=True, **flag) or [] for curve in curves) )
+            
+            if column.endswith('Types'):
+                block[column] = _column( [TANGENT_TYPES.index(t) if t in TANGENT_TYPES else 0 for t in data],
+                                         integer=True )  # noqa e127
+            else:
+                block[column] = _column(data)
+        
+        index = len(self._blocks)
+        self._blocks.append(block)
+        
+        first = 0
+        for curve, count in zip(curves, counts):
+            if curve in self._curves:
+                oldBlock, oldFirst, oldEnd = self._curves[curve]
+                self._deadKeys += oldEnd - oldFirst
+            self._curves[curve] = (index, first, first + count)
+            first += count
+    
+    def invalidate(self, nodes):
+        '''
+        Forgets the nodes (or plugs) so they are read again when next queried, ex. after keying them.
+        '''
+        if not isinstance(nodes, (list, tuple, set)):
+            nodes = [nodes]
+        
+        for node in nodes:
+            self._forget( _nodeName(node).split('.')[0] )
+        
+        # Drop the forgotten keys once they take up more room than the live ones.
+        if self._deadKeys > max(self.keyCount(), 10000):
+            self._compact()
+    
+    def invalidateCurves(self, curves):
+        '''
+        Forgets the nodes driven by the curves, ex. when the curves were edited.
+        '''
+        self.invalidate( [node for curve in curves for node in list(self._users.get(curve, ()))] )
+    
+    def clear(self):
+        ''' Forgets everything. '''
+        self._blocks = []
+        self._curves = {}
+        self._nodes = {}
+        self._users.clear()
+        self._deadKeys = 0
+    
+    def _forget(self, node):
+        '''
+        Forgets the node and its curves, along with any other nodes driven by the same curves.
+        '''
+        for curve in set( self._nodes.pop(node, {}).values() ):
+            users = self._users.pop(curve, set())
+            
+            if curve in self._curves:
+                index, first, end = self._curves.pop(curve)
+                self._deadKeys += end - first
+            
+            for other in users - {node}:
+                self._forget(other)
+    
+    def _compact(self):
+        '''
+        Copies the keys of the curves still in use into a single block.
+        '''
+        columns = list(self._blocks[0]) if self._blocks else []
+        
+        block = {}
+        curves = {}
+        for column in columns:
+            integer = column.endswith('Types')
+            if numpy:
+                parts = [ self._blocks[index][column][first:end] for index, first, end in self._curves.values() ]
+                block[column] = numpy.concatenate(parts) if parts else _column([], integer)
+            else:
+                block[column] = _column([], integer)
+                for index, first, end in self._curves.values():
+                    block[column].extend( self._blocks[index][column][first:end] )
+        
+        first = 0
+        for curve, (index, oldFirst, oldEnd) in self._curves.items():
+            curves[curve] = (0, first, first + oldEnd - oldFirst)
+            first += oldEnd - oldFirst
+        
+        self._blocks = [block] if columns else []
+        self._curves = curves
+        self._deadKeys = 0
+    
+    def keyCount(self):
+        return sum( end - first for block, first, end in self._curves.values() )
+    
+    # Queries ----
+    
+    def curveName(self, plug):
+        '''
+        Returns the name of the anim curve driving the plug, ex 'ctrl.tx', or None.
+        '''
+        node, attr = _nodeName(plug).split('.', 1)
+        return self._attrs(node).get(attr)
+    
+    def _attrs(self, node):
+        if node not in self._nodes:
+            self.read([node])
+        return self._nodes[node]
+    
+    def curvesOf(self, nodes, attrs=None):
+        '''
+        Returns the curves driving the nodes, optionally only the given attributes (long or short names).
+        '''
+        nodes = [_nodeName(node) for node in nodes]
+        self.read(nodes)
+        
+        curves = []
+        for node in nodes:
+            connected = self._nodes[node]
+            for curve in (connected.values() if attrs is None else [connected.get(attr) for attr in attrs]):
+                if curve and curve not in curves:
+                    curves.append(curve)
+        
+        return curves
+    
+    def _slice(self, curve, start=None, end=None):
+        '''
+        Returns (<block>, <first>, <end>) of the curve's keys from start to end inclusive.
+        '''
+        index, first, last = self._curves[curve]
+        block = self._blocks[index]
+        times = block['times']
+        
+        if numpy:
+            lo = first if start is None else first + int( numpy.searchsorted(times[first:last], start, 'left') )
+            hi = last if end is None else first + int( numpy.searchsorted(times[first:last], end, 'right') )
+        else:
+            lo = first if start is None else bisect.bisect_left(times, start, first, last)
+            hi = last if end is None else bisect.bisect_right(times, end, first, last)
+        
+        return block, lo, hi
+    
+    def keys(self, plug, start=None, end=None):
+        '''
+        Returns (times, values) arrays of the plug's keys from start to end inclusive, empty if unkeyed.
+        '''
+        return tuple( self.columns(plug, ['times', 'values'], start, end) )
+    
+    def tangents(self, plug, start=None, end=None):
+        '''
+        Returns (inAngles, outAngles, inTypes, outTypes) arrays of the plug's keys, see `TANGENT_TYPES`.
+        '''
+        return tuple( self.columns(plug, ['inAngles', 'outAngles', 'inTypes', 'outTypes'], start, end) )
+    
+    def columns(self, plug, columns, start=None, end=None):
+        '''
+        Returns a list of the given `_COLUMNS` for the plug's keys from start to end inclusive.
+        '''
+        curve = self.curveName(plug)
+        if not curve:
+            return [ _column([], integer=column.endswith('Types')) for column in columns ]
+        
+        return self.curveColumns(curve, columns, start, end)
+    
+    def curveColumns(self, curve, columns, start=None, end=None):
+        '''
+        Same as `columns` but for a curve already read, by name.
+        '''
+        block, lo, hi = self._slice(curve, start, end)
+        return [ block[column][lo:hi] for column in columns ]
+    
+    def hasKeys(self, plug):
+        curve = self.curveName(plug)
+        if not curve:
+            return False
+        
+        block, first, end = self._curves[curve]
+        return end > first
+    
+    def keyTimes(self, nodes, attrs=None, start=None, end=None):
+        '''
+        Returns the sorted unique times any of the nodes' curves (optionally only the given attrs) are keyed,
+        from start to end inclusive.
+        '''
+        slices = []
+        for curve in self.curvesOf(nodes, attrs):
+            block, lo, hi = self._slice(curve, start, end)
+            slices.append( block['times'][lo:hi] )
+        
+        if numpy:
+            return numpy.unique( numpy.concatenate(slices) ).tolist() if slices else []
+        
+        return sorted( set(itertools.chain.from_iterable(slices)) )
+    
+    def keyRange(self, nodes, attrs=None):
+        '''
+        Returns the (first, last) time any of the nodes' curves are keyed, or (None, None) if none are.
+        '''
+        first, last = None, None
+        for curve in self.curvesOf(nodes, attrs):
+            index, lo, hi = self._curves[curve]
+            if hi > lo:
+                times = self._blocks[index]['times']
+                first = times[lo] if first is None else min(first, times[lo])
+                last = times[hi - 1] if last is None else max(last, times[hi - 1])
+        
+        return (None, None) if first is None else (float(first), float(last))
@@ -0,0 +1,271 @@
+'''
+Compact copies of the animation on some nodes, to undo large switches with a single restore.
+
+Switching a long range makes thousands of undoable key edits, which take a lot of memory in the undo queue
+and are slow to undo.  `undoable` instead copies the curves of the nodes being switched into a
+`curveData.CurveTable`, a few numbers per key, runs the switch with undo disabled and registers one undo that
+puts the copy back.
+
+    with curveSnapshot.undoable( nodes ):
+        ... key lots of things
+
+Restoring only goes through the API, an MDGModifier and MFnAnimCurve edits recorded in an MAnimCurveChange,
+like `keyWriter.KeyWriter`, so it's safe from inside an undo and redo just replays it.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import contextlib
+
+from maya.api import OpenMaya, OpenMayaAnim
+
+from pymel.core import cmds
+
+from . import apiUndo
+from . import curveData
+
+
+# `curveData.TANGENT_TYPES` as MFnAnimCurve tangent types.
+_TANGENTS = {
+    'global': 'kTangentGlobal',
+    'fixed': 'kTangentFixed',
+    'linear': 'kTangentLinear',
+    'flat': 'kTangentFlat',
+    'smooth': 'kTangentSmooth',
+    'step': 'kTangentStep',
+    'slow': 'kTangentSlow',
+    'fast': 'kTangentFast',
+    'clamped': 'kTangentClamped',
+    'plateau': 'kTangentPlateau',
+    'stepnext': 'kTangentStepNext',
+    'auto': 'kTangentAuto',
+    'spline': 'kTangentSmooth',
+}
+
+_INTEGERS = ('kByte', 'kChar', 'kShort', 'kInt', 'kLong', 'kInt64', 'kAddr')
+
+
+@contextlib.contextmanager
+def undoable(nodes):
+    '''
+    Runs the block with undo disabled, then registers a single undo restoring the animation of the nodes
+    to how it was before the block, and redo to how it was after.  If the block fails, the nodes are
+    restored immediately since there's no undo for what it did.
+
+    Yields the `CurveSnapshot` taken before.
+    '''
+    before = CurveSnapshot(nodes)
+    try:
+        with apiUndo.disabled():
+            yield before
+    except Exception:
+        before.restore()
+        raise
+
+    commitUndo(before)
+
+
+def commitUndo(snapshot):
+    '''
+    Registers one undo putting the snapshot back, for edits made since it was taken with undo disabled.
+    Nothing changes until it's undone, the first undo restores the snapshot and redo replays its `Restore`.
+    '''
+    edit = _LazyRestore(snapshot)
+    apiUndo.commit(edit.undoIt, edit.redoIt)
+
+
+class _LazyRestore(object):
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.restore = None
+
+    def undoIt(self):
+        if self.restore is None:
+            self.restore = self.snapshot.restore()
+        else:
+            self.restore.redoIt()
+
+    def redoIt(self):
+        self.restore.undoIt()
+
+
+class Restore(object):
+    '''
+    The edits of a `CurveSnapshot.restore`, the MDGModifier that deleted and recreated curves and set the
+    unkeyed values, then the MAnimCurveChange of the keys, to register with `apiUndo.commit`.
+    '''
+
+    def __init__(self):
+        self.modifier = OpenMaya.MDGModifier()
+        self.change = OpenMayaAnim.MAnimCurveChange()
+        self.curves = []  # Names of the curves restored
+
+    def undoIt(self):
+        self.change.undoIt()
+        self.modifier.undoIt()
+        curveData.notifyEdited(self.curves)
+
+    def redoIt(self):
+        self.modifier.doIt()
+        self.change.redoIt()
+        curveData.notifyEdited(self.curves)
+
+
+def _plug(name):
+    return curveData._selected(name).getPlug(0)
+
+
+def _plugValue(plug):
+    '''
+    Returns the value of a numeric or enum MPlug in internal units, a bool or int for those types.
+    '''
+    attr = plug.attribute()
+    if attr.hasFn(OpenMaya.MFn.kEnumAttribute):
+        return plug.asInt()
+
+    if attr.hasFn(OpenMaya.MFn.kNumericAttribute):
+        numericType = OpenMaya.MFnNumericAttribute(attr).numericType()
+        if numericType == OpenMaya.MFnNumericData.kBoolean:
+            return plug.asBool()
+        if numericType in [getattr(OpenMaya.MFnNumericData, name, None) for name in _INTEGERS]:
+            return plug.asInt()
+
+    return plug.asDouble()
+
+
+def _setPlugValue(modifier, plug, value):
+    if isinstance(value, bool):
+        modifier.newPlugValueBool(plug, value)
+    elif isinstance(value, int):
+        modifier.newPlugValueInt(plug, value)
+    else:
+        modifier.newPlugValueDouble(plug, value)
+
+
+class CurveSnapshot(object):
+    '''
+    The keys, with their tangents, of every curve driving the nodes and the values of their unkeyed keyable
+    attributes.  `restore` puts them back, removing any curves keyed since.
+    '''
+
+    def __init__(self, nodes):
+        self.nodes = list( collections.OrderedDict.fromkeys(curveData._nodeName(node) for node in nodes) )
+        self.table = curveData.CurveTable(self.nodes, tangents=True)
+
+        self._plugs = collections.OrderedDict()  # { <curve>: <plug it drives> }
+        for node in self.nodes:
+            for attr, curve in sorted(self.table._nodes.get(node, {}).items()):
+                self._plugs.setdefault(curve, node + '.' + attr)
+
+        # To recreate curves deleted since
+        self._types = { curve: curveData.curveFn(curve).animCurveType for curve in self._plugs }
+
+        curves = list(self._plugs)
+        counts = [ len(self.table.curveColumns(curve, ['times'])[0]) for curve in curves ]
+
+        # Tangent locks and weights aren't part of the table.
+        self._locks = {}  # { <curve>: <array of 0/1> }
+        locks = (cmds.keyTangent(curves, q=True, lock=True) or []) if curves else []
+        if len(locks) != sum(counts):
+            locks = [ lock for curve in curves for lock in (cmds.keyTangent(curve, q=True, lock=True) or []) ]
+
+        first = 0
+        for curve, count in zip(curves, counts):
+            self._locks[curve] = curveData._column( [int(lock) for lock in locks[first:first + count]], integer=True )
+            first += count
+
+        self._weights = {}  # { <curve>: (<in weights>, <out weights>) } of weighted curves
+        for curve in curves:
+            if curveData.curveFn(curve).isWeighted:
+                self._weights[curve] = ( curveData._column(cmds.keyTangent(curve, q=True, iw=True) or []),
+                                         curveData._column(cmds.keyTangent(curve, q=True, ow=True) or []) )  # noqa e127
+
+        self._statics = []  # [ (<plug>, <value in internal units>), ... ]
+        for node in self.nodes:
+            keyed = self.table._nodes.get(node, {})
+            for attr in cmds.listAttr(node, keyable=True, scalar=True, unlocked=True) or []:
+                plug = node + '.' + attr
+                if attr in keyed or cmds.connectionInfo(plug, isDestination=True):
+                    continue
+                try:
+                    self._statics.append( (plug, _plugValue(_plug(plug))) )
+                except (RuntimeError, ValueError):  # Some attributes can't be read out of context
+                    pass
+
+    def keyCount(self):
+        return self.table.keyCount()
+
+    def restore(self):
+        '''
+        Puts the keys and unkeyed values back as they were when the snapshot was taken, only through the API.
+        Returns the `Restore` of the edits, which aren't in the undo queue.
+        '''
+        edits = Restore()
+        modifier = edits.modifier
+
+        # Curves keyed since the snapshot are removed, the attributes go back to their static values below.
+        current = set( cmds.listConnections(self.nodes, s=True, d=False, type='animCurve') or [] )
+        for curve in current:
+            if curve not in self._plugs and curveData.curveFn(curve).isTimeInput:
+                modifier.deleteNode( curveData._selected(curve).getDependNode(0) )
+
+        targets = []  # [ (<stored curve>, <MObject of the curve to restore it on>), ... ]
+        for curve, plug in self._plugs.items():
+            if cmds.objExists(curve):
+                targets.append( (curve, curveData._selected(curve).getDependNode(0)) )
+            else:
+                created = OpenMayaAnim.MFnAnimCurve().create( _plug(plug), self._types[curve], modifier )
+                targets.append( (curve, created) )
+
+        for plug, value in self._statics:
+            _setPlugValue( modifier, _plug(plug), value )
+
+        modifier.doIt()
+
+        for curve, obj in targets:
+            fn = OpenMayaAnim.MFnAnimCurve(obj)
+            self._restoreCurve( curve, fn, edits.change )
+            edits.curves.append( fn.name() )
+
+        curveData.notifyEdited(edits.curves)
+        return edits
+
+    def _restoreCurve(self, curve, fn, change):
+        '''
+        Replaces all the keys of the curve `fn` edits with the stored keys of `curve`, recording the edits.
+        '''
+        times, values, inAngles, outAngles, inTypes, outTypes = self.table.curveColumns(curve, curveData._COLUMNS)
+
+        for index in reversed(range(fn.numKeys)):
+            fn.remove(index, change)
+
+        if not len(times):
+            return
+
+        unit = OpenMaya.MTime.uiUnit()
+        convert = curveData.toInternalUnits(fn)
+
+        mtimes = OpenMaya.MTimeArray()
+        mvalues = OpenMaya.MDoubleArray()
+        for time, val in zip(times, values):
+            mtimes.append( OpenMaya.MTime(float(time), unit) )
+            mvalues.append( convert(float(val)) if convert else float(val) )
+
+        fn.addKeys(mtimes, mvalues, fn.kTangentGlobal, fn.kTangentGlobal, True, change)
+
+        locks = self._locks[curve]
+        weights = self._weights.get(curve)
+        for i in range(len(times)):
+            # Unlocked so setting one tangent doesn't move the other.
+            fn.setTangentsLocked(i, False, change)
+            fn.setAngle( i, OpenMaya.MAngle(float(inAngles[i]), OpenMaya.MAngle.kDegrees), True, change )
+            fn.setAngle( i, OpenMaya.MAngle(float(outAngles[i]), OpenMaya.MAngle.kDegrees), False, change )
+            if weights:
+                fn.setWeight( i, float(weights[0][i]), True, change )
+                fn.setWeight( i, float(weights[1][i]), False, change )
+
+            fn.setInTangentType( i, getattr(fn, _TANGENTS[curveData.TANGENT_TYPES[inTypes[i]]]), change )
+            fn.setOutTangentType( i, getattr(fn, _TANGENTS[curveData.TANGENT_TYPES[outTypes[i]]]), change )
+            fn.setTangentsLocked( i, bool(locks[i]), change )
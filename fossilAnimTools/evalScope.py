@@ -0,0 +1,201 @@
+'''
+Limits what the scene evaluates while the timeline is walked.
+
+Every `currentTime` change evaluates the whole scene, other characters, props, skinning and all.  Only the
+characters being switched and whatever drives their controls (space targets, etc.) matter, so
+`EvaluationScope` turns everything else off for the duration of the walk and restores it afterwards:
+
+* Deformers are set to nodeState "HasNoEffect".
+* Meshes and the rigs of other characters are frozen.
+
+Nodes upstream of the kept controls, and anything in the kept controls' own characters except deformers and
+meshes, are never touched.
+
+    with EvaluationScope(controls) as scope:
+        ... walk the timeline
+    print( scope.report(frameCount) )
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+from timeit import default_timer
+
+from maya import cmds
+from maya.api import OpenMaya
+
+from pdil.tool import fossil
+
+from . import apiUndo
+
+
+NODE_STATE_NO_EFFECT = 1
+
+
+def _longName(obj):
+    if obj.hasFn(OpenMaya.MFn.kDagNode):
+        return OpenMaya.MFnDagNode(obj).fullPathName()
+    return OpenMaya.MFnDependencyNode(obj).name()
+
+
+def upstream(nodes):
+    '''
+    Returns a set of the long names of the nodes, everything upstream of them and, since a transform depends
+    on its parents, all the DAG ancestors of all of those and what's upstream of them.
+
+    Each node is walked past once, the traversal is pruned at anything already found, so the graph shared by
+    a character's controls is only visited once.
+    '''
+    found = set()
+    pending = []
+    for node in nodes:
+        sel = OpenMaya.MSelectionList()
+        sel.add( str(node) )
+        pending.append( sel.getDependNode(0) )
+
+    while pending:
+        root = pending.pop()
+        if _longName(root) in found:
+            continue
+
+        it = OpenMaya.MItDependencyGraph( root, OpenMaya.MFn.kInvalid, OpenMaya.MItDependencyGraph.kUpstream,
+                                          OpenMaya.MItDependencyGraph.kDepthFirst, OpenMaya.MItDependencyGraph.kNodeLevel )  # noqa e127
+        while not it.isDone():
+            obj = it.currentNode()
+            name = _longName(obj)
+            if name in found:
+                it.prune()
+            else:
+                found.add(name)
+                if obj.hasFn(OpenMaya.MFn.kDagNode):
+                    dag = OpenMaya.MFnDagNode(obj)
+                    parents = [ dag.parent(i) for i in range(dag.parentCount()) ]
+                    pending += [ parent for parent in parents
+                                 if not parent.hasFn(OpenMaya.MFn.kWorld) and _longName(parent) not in found ]  # noqa e127
+            it.next()
+
+    return found
+
+
+class EvaluationScope(object):
+    '''
+    Context manager turning off the evaluation of everything that can't affect the given controls.
+
+    Args:
+        controls: The controls being switched, their characters are left evaluating.  If empty, nothing is
+            turned off.
+        deformers: Disable deformers.
+        meshes: Freeze meshes.
+        characters: Freeze the rigs of other characters.
+
+    `excluded` is a Counter of the nodes turned off, by kind, and `seconds` how long the block took.  It can be
+    entered again, ex. once per chunk of a walk, the nodes to turn off are only found the first time.
+    '''
+
+    def __init__(self, controls, deformers=True, meshes=True, characters=True):
+        self.controls = [str(ctrl) for ctrl in controls]
+        self.kinds = {'deformers': deformers, 'meshes': meshes, 'characters': characters}
+
+        self.excluded = collections.Counter()
+        self.seconds = 0.0
+        self._restore = []  # [ (<plug>, <original value>), ... ]
+        self._candidates = None  # Found on the first `exclude`, so entering again is cheap
+
+    def __enter__(self):
+        # The changes are always restored, so they are kept out of the undo queue.
+        with apiUndo.disabled():
+            self.exclude()
+        self._start = default_timer()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.seconds = default_timer() - self._start
+        with apiUndo.disabled():
+            self.restore()
+
+    def _characterNodes(self):
+        '''
+        Returns (<nodes of the controls' characters>, <nodes of the other characters>) as long names.
+        '''
+        controls = set( cmds.ls(self.controls, long=True) )
+
+        own, others = set(), set()
+        for main in fossil.find.mainGroups():
+            nodes = set( cmds.ls(main.name(), long=True) + (cmds.listRelatives(main.name(), ad=True, fullPath=True) or []) )
+            if controls & nodes:
+                own |= nodes
+            else:
+                others |= nodes
+
+        return own, others - own
+
+    def candidates(self):
+        '''
+        Returns { <kind>: [<long names>] } of the nodes that would be turned off.
+        '''
+        if not self.controls:
+            return {}
+
+        keep = upstream(self.controls)
+        own, others = self._characterNodes()
+
+        found = {
+            'deformers': cmds.ls(type='geometryFilter', long=True) if self.kinds['deformers'] else [],
+            'meshes': cmds.ls(type='mesh', noIntermediate=True, long=True) if self.kinds['meshes'] else [],
+            'characters': sorted(others) if self.kinds['characters'] else [],
+        }
+
+        return { kind: [node for node in nodes if node not in keep and (kind != 'characters' or node not in own)]
+                 for kind, nodes in found.items() }  # noqa e128
+
+    def _set(self, plug, value):
+        ''' Sets the plug if it can be and isn't already, remembering the original value. '''
+        if cmds.getAttr(plug, lock=True) or cmds.connectionInfo(plug, isDestination=True):
+            return False
+
+        original = cmds.getAttr(plug)
+        if original == value:
+            return False
+
+        cmds.setAttr(plug, value)
+        self._restore.append( (plug, original) )
+        return True
+
+    def exclude(self):
+        '''
+        Turns off the candidates, returning the `excluded` Counter.
+        '''
+        if self._candidates is None:
+            self._candidates = self.candidates()
+
+        self.excluded = collections.Counter()
+        for kind, nodes in self._candidates.items():
+            for node in nodes:
+                if kind == 'deformers':
+                    changed = self._set( node + '.nodeState', NODE_STATE_NO_EFFECT )
+                else:
+                    changed = self._set( node + '.frozen', True )
+
+                if changed:
+                    self.excluded[kind] += 1
+
+        return self.excluded
+
+    def restore(self):
+        ''' Restores everything turned off, in reverse. '''
+        for plug, value in reversed(self._restore):
+            if cmds.objExists(plug):
+                cmds.setAttr(plug, value)
+        self._restore = []
+
+    def report(self, frames):
+        '''
+        Returns a string of how many nodes were excluded and the frames per second of the walk.
+        '''
+        fps = frames / self.seconds if self.seconds else 0.0
+        return 'Excluded {} nodes ({}), {} frames at {:.1f} fps'.format(
+            sum(self.excluded.values()),
+            ', '.join( '{} {}'.format(self.excluded[kind], kind) for kind in ['deformers', 'meshes', 'characters'] ),
+            frames,
+            fps,
+        )
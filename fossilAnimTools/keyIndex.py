@@ -0,0 +1,136 @@
+'''
+A scene wide cache of key times, kept up to date with callbacks.
+
+Every switch asks for the same key times over and over, ex. `getSpaceTimes` and `getLimbKeyTimes` for every
+control of a preset, every time it's applied.  `KeyTimeIndex` is a `curveData.CurveTable` that stays alive
+between calls, keeps the sorted times of each query and answers ranges by bisection.  Anim curve edits and
+connections forget only the nodes they touch, so unchanged curves are never queried again.
+
+    index = keyIndex.get()
+    index.keyTimes( [ctrl], ['space'], start=1, end=100 )
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+
+from maya.api import OpenMaya, OpenMayaAnim
+
+from . import curveData
+
+
+if '_index' not in globals():
+    _index = None
+
+
+def get():
+    '''
+    Returns the shared `KeyTimeIndex`, starting it if needed.
+    '''
+    global _index
+
+    if not _index:
+        _index = KeyTimeIndex()
+
+    return _index
+
+
+def stop():
+    '''
+    Removes the shared index's callbacks and drops its cache.
+    '''
+    global _index
+
+    if _index:
+        _index.stop()
+        _index = None
+
+
+class KeyTimeIndex(curveData.CurveTable):
+    '''
+    A `curveData.CurveTable` of times and values that caches the sorted key times of each `keyTimes` query
+    (a control, a limb's controls, etc.) and forgets nodes when their curves are edited.
+
+    Undo, redo and scene changes clear everything since they can change any curve.
+    '''
+
+    def __init__(self, nodes=()):
+        self._times = {}    # { (<node names>, <attrs or None>): [<sorted times>] }
+        self._queries = {}  # { <node name>: { <key of _times>, ... } }
+
+        super(KeyTimeIndex, self).__init__(nodes, tangents=False)
+
+        self._callbacks = [
+            OpenMayaAnim.MAnimMessage.addAnimCurveEditedCallback( self._curvesEdited ),
+            OpenMaya.MDGMessage.addConnectionCallback( self._connectionChanged ),
+            OpenMaya.MEventMessage.addEventCallback( 'Undo', self._clear ),
+            OpenMaya.MEventMessage.addEventCallback( 'Redo', self._clear ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kBeforeNew, self._clear ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kBeforeOpen, self._clear ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kAfterLoadReference, self._clear ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kAfterUnloadReference, self._clear ),
+        ]
+
+        curveData.editListeners.append( self.invalidateCurves )
+
+    def stop(self):
+        OpenMaya.MMessage.removeCallbacks(self._callbacks)
+        self._callbacks = []
+
+        if self.invalidateCurves in curveData.editListeners:
+            curveData.editListeners.remove( self.invalidateCurves )
+
+        self.clear()
+
+    def clear(self):
+        super(KeyTimeIndex, self).clear()
+        self._times = {}
+        self._queries = {}
+
+    def keyTimes(self, nodes, attrs=None, start=None, end=None):
+        '''
+        Same as `CurveTable.keyTimes`, the full sorted times are cached so ranges are only a bisection.
+        '''
+        names = tuple( curveData._nodeName(node) for node in nodes )
+        key = (names, None if attrs is None else tuple(attrs))
+
+        times = self._times.get(key)
+        if times is None:
+            times = super(KeyTimeIndex, self).keyTimes(nodes, attrs)
+            self._times[key] = times
+            for name in names:
+                self._queries.setdefault(name, set()).add(key)
+
+        lo = 0 if start is None else bisect.bisect_left(times, start)
+        hi = len(times) if end is None else bisect.bisect_right(times, end)
+
+        return times[lo:hi]
+
+    def keyRange(self, nodes, attrs=None):
+        times = self.keyTimes(nodes, attrs)
+        return (times[0], times[-1]) if times else (None, None)
+
+    def _forget(self, node):
+        super(KeyTimeIndex, self)._forget(node)
+
+        for key in self._queries.pop(node, ()):
+            self._times.pop(key, None)
+
+    # Callbacks ----
+
+    def _clear(self, *args):
+        self.clear()
+
+    def _curvesEdited(self, editedCurves, clientData):
+        self.invalidateCurves( [OpenMaya.MFnDependencyNode(curve).name() for curve in editedCurves] )
+
+    def _connectionChanged(self, srcPlug, destPlug, made, clientData):
+        # Keying an unkeyed attribute connects a new curve, which won't be in the index yet.
+        if srcPlug.node().hasFn(OpenMaya.MFn.kAnimCurve):
+            node = destPlug.node()
+            if node.hasFn(OpenMaya.MFn.kDagNode):
+                name = OpenMaya.MFnDagNode(node).partialPathName()
+            else:
+                name = OpenMaya.MFnDependencyNode(node).name()
+
+            self.invalidate( [name] )
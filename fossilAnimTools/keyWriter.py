@@ -0,0 +1,203 @@
+'''
+Buffers key edits so a whole switch is written with a few API calls per curve.
+
+Switching keys a handful of channels on every frame it touches, and `setKeyframe`/`cutKey` cost a command
+each time.  `KeyWriter` records the sets, inserts and deletes instead, then applies them curve by curve
+through `MFnAnimCurve` as a single undoable edit.
+
+    with KeyWriter() as writer:
+        writer.delete( controls, times=[10, 20] )
+        writer.insert( 'switcher.ikBlend', [1, 5, 10] )
+        writer.set( 'ctrl.tx', [1, 5, 10], [0.0, 1.5, 2.0] )
+    # Everything is written when the block exits
+
+Nothing is written until `flush`, so the scene, and any key queries, still see the original keys.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import contextlib
+
+from maya.api import OpenMaya, OpenMayaAnim
+
+from pymel.core import cmds
+
+from . import apiUndo
+from . import curveData
+from . import keyIndex
+from . import tracing
+
+
+@contextlib.contextmanager
+def using(writer=None, curves=None):
+    '''
+    Yields the given writer, or a new one that is flushed at the end of the block, so functions can take an
+    optional writer to add their edits to.
+    '''
+    if writer is not None:
+        yield writer
+    else:
+        with KeyWriter(curves) as writer:
+            yield writer
+
+
+class KeyWriter(object):
+    '''
+    Edits are applied in the order they were made for each curve.  When used as a context manager, they are
+    flushed when the block exits without an error and discarded otherwise.
+
+    Args:
+        curves: `curveData.CurveTable` used to find the curves of plugs and nodes, defaulting to the `keyIndex`.
+    '''
+
+    def __init__(self, curves=None):
+        self.curves = curves or keyIndex.get()
+        self._edits = collections.OrderedDict()  # { <curve, or plug if unkeyed>: [ (<op>, <args>), ... ] }
+        self._unkeyed = set()  # Plugs in _edits that didn't have a curve
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType:
+            self.clear()
+        else:
+            self.flush()
+
+    def __len__(self):
+        return sum( len(edits) for edits in self._edits.values() )
+
+    def _target(self, plug):
+        plug = plug.name() if hasattr(plug, 'name') else str(plug)
+        curve = self.curves.curveName(plug)
+        if not curve:
+            self._unkeyed.add(plug)
+        return curve or plug
+
+    def set(self, plug, times, values, stepped=False):
+        '''
+        Keys the plug at the times with the values, in ui units, replacing existing keys.
+        New keys use the global tangents, or step out tangents if `stepped`, ex. for enums.
+        '''
+        if len(times):
+            self._edits.setdefault( self._target(plug), [] ).append( ('set', (list(times), list(values), stepped)) )
+
+    def insert(self, plug, times):
+        '''
+        Adds keys at the times without changing the shape of the curve, like `setKeyframe(insert=True)`.
+        '''
+        if len(times):
+            self._edits.setdefault( self._target(plug), [] ).append( ('insert', (list(times),)) )
+
+    def delete(self, nodes, times=None, start=None, end=None, attrs=None):
+        '''
+        Deletes the keys of all the curves of the nodes, optionally only the given attrs, at the times or, if
+        no times are given, from start to end inclusive (either can be None to be unbounded).
+        '''
+        if times is not None and not len(times):
+            return
+
+        for curve in self.curves.curvesOf(nodes, attrs):
+            self._edits.setdefault( curve, [] ).append( ('delete', (times, start, end)) )
+
+    def clear(self):
+        ''' Discards the buffered edits. '''
+        self._edits = collections.OrderedDict()
+        self._unkeyed = set()
+
+    @tracing.traced('writeKeys')
+    def flush(self):
+        '''
+        Writes the buffered edits as one undoable change.  Returns the number of curves edited.
+        '''
+        edits, unkeyed = self._edits, self._unkeyed
+        self.clear()
+        if not edits:
+            return 0
+
+        change = OpenMayaAnim.MAnimCurveChange()
+        unit = OpenMaya.MTime.uiUnit()
+
+        edited = []
+        for target, ops in edits.items():
+            curve = self._curveFor(target, ops) if target in unkeyed else target
+            if not curve:
+                continue
+
+            fn = curveData.curveFn(curve)
+            for op, args in ops:
+                getattr(self, '_' + op)(fn, unit, change, *args)
+
+            edited.append(curve)
+
+        apiUndo.commit(change.undoIt, change.redoIt)
+        self.curves.invalidateCurves(edited)
+        curveData.notifyEdited(edited)
+
+        return len(edited)
+
+    @staticmethod
+    def _curveFor(plug, ops):
+        '''
+        Returns the curve of an unkeyed plug, creating it if there are keys to set, or None.
+        '''
+        curves = cmds.keyframe(plug, q=True, name=True)
+        if curves:  # Keyed since the edits were buffered
+            return curves[0]
+
+        for op, args in ops:
+            if op == 'set':
+                times, values, stepped = args
+                cmds.setKeyframe(plug, t=times[0], v=values[0])
+                return (cmds.keyframe(plug, q=True, name=True) or [None])[0]
+
+        # Nothing can be inserted or deleted on an unkeyed plug
+        return None
+
+    # Edits ----
+
+    @staticmethod
+    def _set(fn, unit, change, times, values, stepped):
+        tracing.count('keysWritten', len(times))
+        convert = curveData.toInternalUnits(fn)
+
+        newTimes = OpenMaya.MTimeArray()
+        newValues = OpenMaya.MDoubleArray()
+        for time, val in zip(times, values):
+            mtime = OpenMaya.MTime(float(time), unit)
+            val = convert(float(val)) if convert else float(val)
+
+            index = fn.find(mtime)
+            if index is None:
+                newTimes.append(mtime)
+                newValues.append(val)
+            else:
+                fn.setValue(index, val, change)
+
+        if len(newTimes):
+            tangentOut = fn.kTangentStep if stepped else fn.kTangentGlobal
+            fn.addKeys(newTimes, newValues, fn.kTangentGlobal, tangentOut, True, change)
+
+    @staticmethod
+    def _insert(fn, unit, change, times):
+        tracing.count('keysWritten', len(times))
+        for time in times:
+            mtime = OpenMaya.MTime(float(time), unit)
+            if fn.find(mtime) is None:
+                fn.insertKey(mtime, change)
+
+    @staticmethod
+    def _delete(fn, unit, change, times, start, end):
+        if times is not None:
+            for time in times:
+                index = fn.find( OpenMaya.MTime(float(time), unit) )
+                if index is not None:
+                    fn.remove(index, change)
+            return
+
+        # Backwards so removing doesn't shift the keys still to check.
+        for index in reversed(range(fn.numKeys)):
+            time = fn.input(index).asUnits(unit)
+            if (start is None or start <= time) and (end is None or time <= end):
+                fn.remove(index, change)
@@ -1,10 +1,25 @@
-from pymel.core import button, Callback, columnLayout, currentTime, intField, keyframe, ls, \
-    radioButtonGrp, rowColumnLayout, selected
+from __future__ import absolute_import, division, print_function
 
+import collections
+
+from maya.api import OpenMaya
+
+from pymel.core import button, Callback, checkBox, cmds, columnLayout, currentTime, intField, keyframe, ls, \
+    menuItem, optionMenu, radioButtonGrp, rowColumnLayout, selected, warning
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import pdil
 from pdil.tool import fossil
 
+from . import apiUndo
+from . import curveData
+from . import keyIndex
+from . import keySampler
+
 
 offsetCurveOptions = pdil.ui.Settings(
     'offsetCurveOptions',
@@ -12,9 +27,26 @@ offsetCurveOptions = pdil.ui.Settings(
         'wholeRange': False,
         'bookend': False,
         'uiMode': 1,
+        'batched': True,
+        'falloff': 'linear',
+        'falloffIn': 10,
+        'falloffOut': 10,
+        'dirtyOnly': False,
     }
 )
 
+
+if '_tracker' not in globals():
+    _tracker = None
+
+
+CHANNELS = [ t + a for t in 'trs' for a in 'xyz' ]
+
+
+OffsetReport = collections.namedtuple( 'OffsetReport', 'channels curves edits' )
+
+FALLOFFS = ['linear', 'smoothstep']
+
         
 class OffsetCurvesGui(object):
     id = 'OffsetCurves'
@@ -41,10 +73,29 @@ class OffsetCurvesGui(object):
                     self.start = intField()
                     self.end = intField()
             
+                with rowColumnLayout(nc=2):
+                    offsetCurveOptions.checkBoxSetup( checkBox(l='Bookend'), 'bookend' )
+                    
+                    self.falloff = optionMenu( l='Falloff', cc=lambda val: setattr(offsetCurveOptions, 'falloff', val) )
+                    for shape in FALLOFFS:
+                        menuItem(l=shape)
+                    self.falloff.setValue( offsetCurveOptions.falloff )
+                    
+                    intField( v=offsetCurveOptions.falloffIn, min=1, ann='Frames to ease in before the range',
+                        cc=lambda val: setattr(offsetCurveOptions, 'falloffIn', val) )  # noqa e128
+                    intField( v=offsetCurveOptions.falloffOut, min=1, ann='Frames to ease out after the range',
+                        cc=lambda val: setattr(offsetCurveOptions, 'falloffOut', val) )  # noqa e128
+                
                 with rowColumnLayout(nc=2):
                     #checkBox(l='Autokey', en=False)
+                    offsetCurveOptions.checkBoxSetup( checkBox(l='Batched'), 'batched' )
+                    checkBox( l='Dirty Channels Only', v=offsetCurveOptions.dirtyOnly, cc=setDirtyTracking,
+                        ann='Only offset channels edited since the last time change' )  # noqa e128
                     button(label='Apply', c=Callback(self.apply))
 
+            if offsetCurveOptions.dirtyOnly:
+                setDirtyTracking(True)
+            
             if offsetCurveOptions.uiMode == 1:
                 self.setPlaybackMode()
             elif offsetCurveOptions.uiMode == 2:
@@ -116,27 +167,321 @@ def offsetCurves(_range=None):
     
     objs = ls(objs, type='transform')
     
-    for obj in objs:
-        if offsetCurveOptions.bookend:
-            pass
-        offsetObj( obj, (start, end) )
+    falloff = None
+    if offsetCurveOptions.bookend:
+        falloff = (offsetCurveOptions.falloffIn, offsetCurveOptions.falloffOut, offsetCurveOptions.falloff)
+        if (start, end) == (None, None):
+            warning( 'Falloff needs a range, offsetting the whole curves instead' )
+            falloff = None
+    
+    channels = None
+    if offsetCurveOptions.dirtyOnly and _tracker:
+        channels = _tracker.dirtyChannels(objs)
+        objs = [obj for obj in objs if channels[obj.name()] != []]
+        if not objs:
+            print( 'No channels were edited, nothing to offset' )
+            return OffsetReport(0, 0, 0)
+    
+    with apiUndo.chunk('offsetCurves'):
+        if offsetCurveOptions.batched:
+            report = offsetObjs( objs, (start, end), falloff, channels )
+            print( 'Offset {0.channels} channels on {0.curves} curves with {0.edits} edits'.format(report) )
+        else:
+            report = None
+            for obj in objs:
+                offsetObj( obj, (start, end), falloff, channels[obj.name()] if channels else None )
+    
+    if _tracker:
+        _tracker.clean(objs)
+    
+    return report
         
         
-def offsetObj(obj, _range=(None, None)):
+def offsetObj(obj, _range=(None, None), falloff=None, channels=None):
     '''
     Given an object, adjusts it's curves to by the amount from the current place.
+    
+    `falloff` is an optional (<frames in>, <frames out>, <shape>) to bookend the range, see `bookendOffset`.
+    `channels` optionally limits which channels are checked, defaulting to all the trs channels.
     '''
     
     now = currentTime(q=True)
     
+    channels = CHANNELS if channels is None else channels
+    
+    keyed = keySampler.KeyedValueSampler( [obj.name() + '.' + attr for attr in channels] ).sample(now)
+    
     adjust = []
-    for attr in [ t + a for t in 'trs' for a in 'xyz' ]:
+    for attr in channels:
+        plug = obj.name() + '.' + attr
+        if plug not in keyed:
+            continue
+        
         cur = obj.attr(attr).get()
-        keyed = obj.attr(attr).get(time=now)
-        if cur != keyed:
-            adjust.append( (attr, cur - keyed ) )
+        if not pdil.math.isCloseF(cur, keyed[plug]):
+            adjust.append( (attr, cur - keyed[plug] ) )
     
     timeArg = {'t': _range} if _range != (None, None) else {}
     
+    if falloff and timeArg and adjust:
+        curves = keyIndex.get()
+    
     for attr, delta in adjust:
-        keyframe(obj.attr(attr), e=True, iub=True, r=True, vc=delta, **timeArg)
\ No newline at end of file
+        if falloff and timeArg:
+            bookendOffset( _curvesOf(obj.name() + '.' + attr, curves), delta, _range, *falloff )
+        else:
+            keyframe(obj.attr(attr), e=True, iub=True, r=True, vc=delta, **timeArg)
+
+
+def offsetObjs(objs, _range=(None, None), falloff=None, channels=None):
+    '''
+    Batched `offsetObj`, sampling the keyed values of every channel of every object directly from their
+    curves, then editing all the curves that share a delta with a single `keyframe` call.
+    
+    Channels animated through something besides a single curve (ex, anim layers) fall back to editing the
+    plug, same as `offsetObj`.
+    
+    `falloff` is an optional (<frames in>, <frames out>, <shape>) to bookend the range, see `bookendOffset`.
+    `channels` optionally limits which channels are checked, { <obj name>: [<channel>, ...] or None for all }
+    
+    Returns an `OffsetReport` of how many channels and curves were adjusted and how many edits it took.
+    '''
+    
+    now = currentTime(q=True)
+    
+    limits = channels or {}
+    objChannels = [ (obj, limits.get(obj.name()) or CHANNELS) for obj in objs ]
+    
+    sampler = keySampler.KeyedValueSampler( [obj.name() + '.' + channel for obj, attrs in objChannels for channel in attrs] )
+    keyed = sampler.sample(now)
+    
+    adjust = collections.OrderedDict()  # { <delta>: [ <curve or plug>, ... ] }
+    channels = 0
+    
+    for obj, attrs in objChannels:
+        name = obj.name()
+        for group in 'trs':
+            plugs = [name + '.' + group + axis for axis in 'xyz' if group + axis in attrs]
+            if not any(plug in keyed for plug in plugs):
+                continue
+            
+            current = dict( zip([name + '.' + group + axis for axis in 'xyz'], cmds.getAttr(name + '.' + group)[0]) )
+            for plug in plugs:
+                cur = current[plug]
+                # Unkeyed channels are always at their keyed value.
+                key = keyed.get(plug, cur)
+                
+                # Tolerance since curves are evaluated in internal units then converted.
+                if not pdil.math.isCloseF(cur, key):
+                    adjust.setdefault( cur - key, [] ).append( sampler.curveNames.get(plug, plug) )
+                    channels += 1
+    
+    timeArg = {'t': _range} if _range != (None, None) else {}
+    
+    direct = set( sampler.curveNames.values() )
+    
+    edits = 0
+    curveCount = 0
+    for delta, targets in adjust.items():
+        if falloff and timeArg:
+            # Targets are already curves unless the plug isn't driven by a single curve.
+            curves = [curve for target in targets
+                      for curve in ([target] if target in direct else cmds.keyframe(target, q=True, name=True) or [])]  # noqa e128
+            edits += bookendOffset( curves, delta, _range, *falloff )
+            curveCount += len(curves)
+        else:
+            cmds.keyframe( targets, e=True, iub=True, r=True, vc=delta, **timeArg )
+            edits += 1
+            curveCount += len(targets)
+    
+    return OffsetReport( channels, curveCount, edits )
+
+
+def _curvesOf(plug, curves):
+    '''
+    Returns the anim curves of the plug, looked up in the `curveData.CurveTable` if it's directly keyed.
+    '''
+    curve = curves.curveName(plug)
+    if curve:
+        return [curve]
+    
+    # Animated through something else, like anim layers, so Maya has to find the curve.
+    return cmds.keyframe(plug, q=True, name=True) or []
+
+
+def falloffWeights(times, start, end, framesIn, framesOut, shape='linear'):
+    '''
+    Returns the weight of each time, 1 from start to end, easing to 0 over `framesIn` before the start and
+    `framesOut` after the end.  A numpy array if available, otherwise a list.
+    '''
+    framesIn = max(framesIn, 1)
+    framesOut = max(framesOut, 1)
+    
+    if numpy:
+        times = numpy.asarray(times, dtype=float)
+        weights = numpy.minimum( (times - (start - framesIn)) / framesIn, ((end + framesOut) - times) / framesOut )
+        weights = numpy.clip(weights, 0.0, 1.0)
+        if shape == 'smoothstep':
+            weights = weights * weights * (3.0 - 2.0 * weights)
+        return weights
+    
+    weights = [ min(max( min((t - (start - framesIn)) / framesIn, ((end + framesOut) - t) / framesOut ), 0.0), 1.0)
+                for t in times ]  # noqa e131
+    if shape == 'smoothstep':
+        weights = [w * w * (3.0 - 2.0 * w) for w in weights]
+    return weights
+
+
+def bookendOffset(curves, delta, _range, framesIn, framesOut, shape='linear'):
+    '''
+    Offsets the curves by `delta` over the range, easing back to the original values over the falloff frames.
+    
+    Keys are inserted at the outer edges of the falloff to bookend the curve so nothing outside changes, and
+    at the start and end so the range reaches the full offset even if it has no keys of its own.
+    All the keys of a curve are read at once and written back as a single edit.  Returns the number of edits.
+    '''
+    if not curves:  # setKeyframe would key the selection
+        return 0
+    
+    start, end = _range
+    framesIn = max(framesIn, 1)
+    framesOut = max(framesOut, 1)
+    
+    cmds.setKeyframe( curves, t=sorted({start - framesIn, start, end, end + framesOut}), insert=True )
+    edits = 1
+    
+    for curve in curves:
+        times, values = curveData.keyArrays(curve)
+        weights = falloffWeights(times, start, end, framesIn, framesOut, shape)
+        
+        if numpy:
+            indices = numpy.nonzero(weights)[0]
+            newValues = values[indices] + delta * weights[indices]
+        else:
+            indices = [i for i, w in enumerate(weights) if w]
+            newValues = [values[i] + delta * weights[i] for i in indices]
+        
+        if len(indices):
+            curveData.setKeyValues(curve, indices, newValues)
+            edits += 1
+    
+    return edits
+
+
+def setDirtyTracking(enabled):
+    '''
+    Starts or stops the `DirtyChannelTracker` used when the 'dirtyOnly' option is on.
+    '''
+    global _tracker
+    
+    offsetCurveOptions.dirtyOnly = enabled
+    
+    if enabled and not _tracker:
+        _tracker = DirtyChannelTracker( fossil.find.controllers )
+    
+    elif not enabled and _tracker:
+        _tracker.stop()
+        _tracker = None
+
+
+class DirtyChannelTracker(object):
+    '''
+    Uses attribute changed callbacks to record which trs channels have been edited since the last time change.
+    
+    Nodes only count as tracked once the time changes after they are watched, since edits made before that
+    were missed, so untracked nodes have all their channels checked.  If more than `maxChannels` are edited
+    between time changes, it gives up tracking until the next one to keep memory bounded.
+    
+    Args:
+        findNodes: Function returning the nodes to watch, rerun whenever a scene is opened.
+    '''
+    
+    def __init__(self, findNodes, maxChannels=5000):
+        self.findNodes = findNodes
+        self.maxChannels = maxChannels
+        
+        self.overflowed = False
+        self._dirty = set()         # { '<node>.<channel>', ... }
+        self._watched = {}          # { <node name>: <callback id> }
+        self._tracked = set()       # Watched nodes that haven't missed any edits
+        
+        self._callbacks = [
+            OpenMaya.MEventMessage.addEventCallback( 'timeChanged', self.reset ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kBeforeNew, self._clearScene ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kBeforeOpen, self._clearScene ),
+            OpenMaya.MSceneMessage.addCallback( OpenMaya.MSceneMessage.kAfterOpen, self._watchScene ),
+        ]
+        
+        self._watchScene()
+    
+    def watch(self, nodes):
+        selList = OpenMaya.MSelectionList()
+        for node in nodes:
+            name = node.name() if hasattr(node, 'name') else node
+            if name in self._watched:
+                continue
+            
+            selList.clear()
+            selList.add(name)
+            self._watched[name] = OpenMaya.MNodeMessage.addAttributeChangedCallback(
+                selList.getDependNode(0), self._attributeChanged )
+    
+    def stop(self):
+        OpenMaya.MMessage.removeCallbacks( self._callbacks + list(self._watched.values()) )
+        self._callbacks = []
+        self._watched = {}
+        self.reset()
+    
+    def reset(self, *args):
+        self._dirty.clear()
+        self._tracked = set(self._watched)
+        self.overflowed = False
+    
+    def clean(self, objs):
+        '''
+        Marks the objects as having no unkeyed edits, ex. after offsetting them.
+        '''
+        names = {obj.name() for obj in objs}
+        self._dirty = {plug for plug in self._dirty if plug.split('.')[0] not in names}
+        self._tracked.update( names.intersection(self._watched) )
+    
+    def dirtyChannels(self, objs):
+        '''
+        Returns { <obj name>: [<dirty channel>, ...] }, or None for objects that aren't tracked.
+        '''
+        dirty = {}
+        for obj in objs:
+            name = obj.name()
+            if self.overflowed or name not in self._tracked:
+                dirty[name] = None
+            else:
+                dirty[name] = [channel for channel in CHANNELS if name + '.' + channel in self._dirty]
+        
+        return dirty
+    
+    def _attributeChanged(self, msg, plug, otherPlug, clientData):
+        if self.overflowed or not msg & OpenMaya.MNodeMessage.kAttributeSet:
+            return
+        
+        attr = plug.partialName(useLongNames=False)
+        if attr in ('t', 'r', 's'):
+            channels = [attr + axis for axis in 'xyz']
+        elif attr in CHANNELS:
+            channels = [attr]
+        else:
+            return
+        
+        node = OpenMaya.MFnDagNode(plug.node()).partialPathName()
+        self._dirty.update( node + '.' + channel for channel in channels )
+        
+        if len(self._dirty) > self.maxChannels:
+            self.overflowed = True
+            self._dirty.clear()
+    
+    def _clearScene(self, *args):
+        OpenMaya.MMessage.removeCallbacks( list(self._watched.values()) )
+        self._watched = {}
+        self.reset()
+    
+    def _watchScene(self, *args):
+        self.watch( self.findNodes() )
@@ -0,0 +1,133 @@
+'''
+Cached lookups of how a fossil rig's controls relate to each other.
+
+Switching asks the same questions for every preset entry on every apply: a control's lead and main
+controller, its ik/fk switcher plug, the main's sub controls and its other motion counterpart, and which
+ik switch function the card needs.  Each one walks connections or attributes in the scene, so
+`RigTopology` remembers the answers until a scene is opened or a reference changes.
+
+    rig = rigTopology.get()
+    mainCtrl = rig.main(ctrl)
+    rig.limbControls(mainCtrl)  # [main, <sub controls>...]
+'''
+
+from __future__ import absolute_import, division, print_function
+
+from maya.api import OpenMaya
+
+from pdil.tool import fossil
+
+
+if '_topology' not in globals():
+    _topology = None
+
+
+# The `fossil.kinematicSwitch.ActivateIkDispatch` function matching ik to each card's rigCommand
+IK_SWITCHES = {
+    'DogHindleg': 'activate_dogleg',
+    'SplineChest': 'active_splineChest',
+    'SplineChestV2': 'active_splineChest',
+    'SplineNeck': 'active_splineNeck',
+}
+
+DEFAULT_IK_SWITCH = 'active_ikChain'
+
+
+def ikSwitchFunction(rigCommand):
+    ''' Returns the function that matches ik to fk for the given card rigCommand. '''
+    return getattr( fossil.kinematicSwitch.ActivateIkDispatch, IK_SWITCHES.get(rigCommand, DEFAULT_IK_SWITCH) )
+
+
+def get():
+    '''
+    Returns the shared `RigTopology`, starting it if needed.
+    '''
+    global _topology
+
+    if not _topology:
+        _topology = RigTopology()
+
+    return _topology
+
+
+def stop():
+    '''
+    Removes the shared topology's callbacks and drops its cache.
+    '''
+    global _topology
+
+    if _topology:
+        _topology.stop()
+        _topology = None
+
+
+class RigTopology(object):
+    '''
+    Each lookup is done the first time it's asked for and remembered, `build` does them all up front for
+    every control of a character.
+    '''
+
+    _REFRESH_MESSAGES = ['kBeforeNew', 'kAfterOpen', 'kAfterCreateReference', 'kAfterRemoveReference',
+                         'kAfterLoadReference', 'kAfterUnloadReference', 'kAfterImportReference']  # noqa e128
+
+    def __init__(self):
+        self._cache = {}  # { (<lookup>, <control>): <result> }
+
+        self._callbacks = [ OpenMaya.MSceneMessage.addCallback(getattr(OpenMaya.MSceneMessage, message), self.clear)
+                            for message in self._REFRESH_MESSAGES ]  # noqa e127
+
+    def stop(self):
+        OpenMaya.MMessage.removeCallbacks(self._callbacks)
+        self._callbacks = []
+        self.clear()
+
+    def clear(self, *args):
+        self._cache = {}
+
+    def build(self, main=None):
+        '''
+        Looks up everything for all the controls of the character, or all characters if `main` is None.
+        '''
+        controls = fossil.find.controllers(main=main) if main else fossil.find.controllers()
+        for ctrl in controls:
+            self.lead(ctrl)
+            mainCtrl = self.main(ctrl)
+            if self.switcher(ctrl):
+                self.limbControls(mainCtrl)
+                self.other(mainCtrl)
+
+    def _lookup(self, name, ctrl, find):
+        key = (name, ctrl)
+        if key not in self._cache:
+            self._cache[key] = find(ctrl)
+        return self._cache[key]
+
+    # Lookups ----
+
+    def lead(self, ctrl):
+        ''' Returns `fossil.node.leadController` of the control. '''
+        return self._lookup( 'lead', ctrl, fossil.node.leadController )
+
+    def main(self, ctrl):
+        ''' Returns `fossil.rig.getMainController` of the control. '''
+        return self._lookup( 'main', ctrl, fossil.rig.getMainController )
+
+    def switcher(self, ctrl):
+        ''' Returns the ik/fk switcher plug of the control's limb, or None. '''
+        return self._lookup( 'switcher', ctrl, fossil.controllerShape.getSwitcherPlug )
+
+    def subControls(self, mainCtrl):
+        ''' Returns the sub controls of the main controller. '''
+        return self._lookup( 'subControls', mainCtrl, lambda ctrl: [sub for name, sub in ctrl.subControl.items()] )
+
+    def limbControls(self, mainCtrl):
+        ''' Returns the main controller followed by its sub controls. '''
+        return [mainCtrl] + self.subControls(mainCtrl)
+
+    def other(self, mainCtrl):
+        ''' Returns the main controller of the limb's other motion type, ex. the fk main for the ik main. '''
+        return self._lookup( 'other', mainCtrl, lambda ctrl: ctrl.getOtherMotionType() )
+
+    def ikSwitch(self, ikMain):
+        ''' Returns the `ActivateIkDispatch` function that matches the ik main controller's limb to fk. '''
+        return self._lookup( 'ikSwitch', ikMain, lambda ctrl: ikSwitchFunction(ctrl.card.rigCommand) )
@@ -0,0 +1,127 @@
+'''
+Frame indexed schedule of the commands to run while walking the timeline.
+
+Commands are added with the times they are due and grouped into phases, which run in order at each frame,
+ex. all the kinematic switches happen before the space switches.
+
+    schedule = Schedule(['kinematic', 'space'])
+    schedule.add('kinematic', ikSwitch, [1, 10, 20])
+    schedule.add('space', spaceSwitch, [10, 15])
+
+    for frame, phases in schedule:
+        currentTime(frame)
+        for phase, commands in phases:
+            for cmd in commands:
+                cmd()
+
+The frame index is built as commands are added so walking costs nothing beyond running the commands.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+import collections
+import functools
+import json
+
+
+def describe(cmd):
+    '''
+    Returns a readable name for a command, using its `description` attribute if it has one.
+    '''
+    if hasattr(cmd, 'description'):
+        return cmd.description
+
+    if isinstance(cmd, functools.partial):
+        args = [str(arg) for arg in cmd.args] + ['{}={}'.format(k, v) for k, v in sorted((cmd.keywords or {}).items())]
+        return '{}({})'.format( describe(cmd.func), ', '.join(args) )
+
+    return getattr(cmd, '__name__', str(cmd))
+
+
+class Schedule(object):
+
+    def __init__(self, phases=('kinematic', 'space')):
+        self.phases = list(phases)
+        self._index = {}  # { <frame>: { <phase>: [<command>, ...] } }
+        self._frames = []  # Sorted keys of _index
+
+    def add(self, phase, cmd, times):
+        '''
+        Schedules `cmd` to run in the given phase at each of the times.  A time is only added once per command.
+        '''
+        if phase not in self.phases:
+            self.phases.append(phase)
+
+        for time in set(times):
+            if time not in self._index:
+                self._index[time] = {}
+                bisect.insort(self._frames, time)
+
+            commands = self._index[time].setdefault(phase, [])
+            if cmd not in commands:
+                commands.append(cmd)
+
+    def merge(self, other):
+        '''
+        Adds all the commands from another schedule to this one, returning self.
+        '''
+        for phase in other.phases:
+            if phase not in self.phases:
+                self.phases.append(phase)
+
+        for frame, phases in other:
+            for phase, commands in phases:
+                for cmd in commands:
+                    self.add(phase, cmd, [frame])
+
+        return self
+
+    def frames(self, start=None, end=None):
+        '''
+        Returns the sorted frames that have commands, optionally limited to start/end inclusive.
+        '''
+        lo = 0 if start is None else bisect.bisect_left(self._frames, start)
+        hi = len(self._frames) if end is None else bisect.bisect_right(self._frames, end)
+        return self._frames[lo:hi]
+
+    def commandsAt(self, frame):
+        '''
+        Returns [ (<phase>, [<command>, ...]), ... ] of the commands due at the frame, in phase order.
+        '''
+        due = self._index.get(frame, {})
+        return [ (phase, due[phase]) for phase in self.phases if due.get(phase) ]
+
+    def commandCount(self):
+        return sum( len(commands) for due in self._index.values() for commands in due.values() )
+
+    def __iter__(self):
+        for frame in self._frames:
+            yield frame, self.commandsAt(frame)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __bool__(self):
+        return bool(self._frames)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        counts = collections.Counter( phase for due in self._index.values() for phase in due )
+        return '<Schedule {} frames {}>'.format( len(self), dict(counts) )
+
+    def toDict(self):
+        '''
+        Returns { <frame>: { <phase>: [<command description>, ...] } } for debugging.
+        '''
+        return collections.OrderedDict(
+            (frame, collections.OrderedDict( (phase, [describe(cmd) for cmd in commands])
+                                             for phase, commands in self.commandsAt(frame) ))  # noqa e127
+            for frame in self._frames
+        )
+
+    def dumps(self, indent=4):
+        ''' Returns the `toDict` as json. '''
+        return json.dumps( collections.OrderedDict((str(frame), due) for frame, due in self.toDict().items()),
+                           indent=indent )  # noqa e127
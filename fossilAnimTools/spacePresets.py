@@ -8,7 +8,6 @@ Tool to switch groups of controls to specific spaces.
     * When a new file is opened, just clear everything (which it should be doing
         but maybe the scriptJob is messed up).
     * Better indication that something is wrong the control exists but the space doesn't
-    * Eventually this will need to support multiple characters.
     
     Low priority
     * If the file is deleted during that session, it doesn't clear from local/public list
@@ -24,17 +23,33 @@ import json
 import logging
 import os
 import re
+from timeit import default_timer
 
 from pdil.vendor.Qt import QtWidgets, QtCompat
 from maya import OpenMayaUI
+from maya.api import OpenMaya
+import maya.utils
 
-from pymel.core import columnLayout, cmds, currentTime, cutKey, deleteUI, \
-    getAttr, keyframe, playbackOptions, promptDialog, PyNode, \
+from pymel.core import columnLayout, cmds, currentTime, deleteUI, \
+    getAttr, playbackOptions, promptDialog, PyNode, \
     select, selected, setAttr, setKeyframe, window
 
 import pdil
 from pdil.tool import fossil
 
+from . import apiUndo
+from . import curveSnapshot
+from . import evalScope
+from . import keyIndex
+from . import keyWriter
+from . import rigTopology
+from . import spaceSwitching
+from . import switchEngine
+from . import tracing
+from . import workerPool
+from .schedule import describe, Schedule
+from .spaceSwitching import getSpaceTimes, performSpaceSwitch, walkTimeline  # noqa
+
 ui_file = os.path.dirname(__file__) + '/spacepresetgui.ui'
 ui_prompt_file = os.path.dirname(__file__) + '/spacePresetPrompt_qtui.ui'
 
@@ -57,8 +72,17 @@ except:
 if '_previouslyLoaded' not in globals():
     _previouslyLoaded = None
 
+if '_applied' not in globals():
+    _applied = {}  # { <control name>: AppliedState }
+
+if '_appliedCallbacks' not in globals():
+    _appliedCallbacks = []
+
 
-ACTIVATE_KEY = '# Activate'
+ACTIVATE_KEY = switchEngine.ACTIVATE_KEY
+
+# Character chooser entry applying the profile to every character, see `applyCharacters`.
+ALL_CHARACTERS = 'All Characters'
 
 
 class SpacePresets(QtWidgets.QWidget):
@@ -123,18 +147,82 @@ class SpacePresets(QtWidgets.QWidget):
         self.ui.applyRange.clicked.connect( partial(self.applySwitch, 'range') )
         self.ui.applySelected.clicked.connect( partial(self.applySwitch, 'selected') )
         self.ui.applyAll.clicked.connect( partial(self.applySwitch, 'all') )
+        self.ui.reapplyDirty.clicked.connect( self.reapplyDirtySwitch )
         
         self.ui.addControls.clicked.connect( self.addSelectedControl )
         
+        self.ui.cancelApply.clicked.connect( self.cancelApply )
+        
         self.profileModifiers = [self.ui.newProfile, self.ui.rename, self.ui.clone, self.ui.deleteProfile]
-        self.applyButtons = [self.ui.applyFrame, self.ui.applyRange, self.ui.applySelected, self.ui.applyAll]
+        self.applyButtons = [self.ui.applyFrame, self.ui.applyRange, self.ui.applySelected, self.ui.applyAll,
+                             self.ui.reapplyDirty]  # noqa e127
+        
+        self.job = None  # The running `ChunkedApply`
     
         self.enableProfileGui(False)
         self.show()
     
     
     def applySwitch(self, mode):
-        apply(self.curProfile, mode)
+        background = mode != 'frame' and self.ui.background.isChecked()
+        snapshot = self.ui.compactUndo.isChecked()
+        
+        if self.ui.characterChooser.currentText() == ALL_CHARACTERS:
+            profile = self.convertNodesToNames()[ self.ui.profileChooser.currentText() ]
+            if background:
+                self.applyInBackground( mode, charactersPreset(profile, self.mainControllers) )
+            else:
+                visits, errors = applyCharacters( profile, self.mainControllers, mode, snapshot=snapshot )
+                for main, error in errors.items():
+                    log.error( '{} was not switched: {}'.format(main, error) )
+        
+        elif background:
+            self.applyInBackground(mode)
+        else:
+            apply(self.curProfile, mode, snapshot=snapshot)
+    
+    
+    def reapplyDirtySwitch(self):
+        '''
+        Switches the current profile's controls again where their keys were edited since they were applied.
+        '''
+        reapplyDirty( presetControls(self.curProfile) )
+    
+    
+    def applyInBackground(self, mode, preset=None):
+        '''
+        Applies the preset, defaulting to the current profile, with a `ChunkedApply`, showing the progress until
+        it finishes or is cancelled.
+        '''
+        if self.job and self.job.running:
+            return
+        
+        for button in self.applyButtons:
+            button.setEnabled(False)
+        self.ui.cancelApply.setEnabled(True)
+        self.ui.progress.setValue(0)
+        
+        # Any errors starting are rolled back and reported to `applyFinished`
+        self.job = ChunkedApply( preset or self.curProfile, mode, progress=self.showProgress, finished=self.applyFinished )
+        self.job.start()
+    
+    
+    def showProgress(self, done, total, secondsLeft):
+        self.ui.progress.setMaximum(total)
+        self.ui.progress.setValue(done)
+        self.ui.progress.setFormat( '%p%  {:.0f}s left'.format(secondsLeft) )
+    
+    
+    def cancelApply(self):
+        if self.job:
+            self.job.cancel()
+    
+    
+    def applyFinished(self, visits):
+        self.ui.progress.setFormat( '%p%' if visits is not None else 'Cancelled' )
+        self.ui.cancelApply.setEnabled(False)
+        for button in self.applyButtons:
+            button.setEnabled(True)
     
     
     def enableProfileGui(self, val):
@@ -148,7 +236,8 @@ class SpacePresets(QtWidgets.QWidget):
     def populateCharacterChooser(self):
         self.mainControllers = fossil.find.mainGroups()
         self.ui.characterChooser.clear()
-        self.ui.characterChooser.addItems( ['-'] + [main.name() for main in self.mainControllers] )
+        self.ui.characterChooser.addItems( ['-'] + [main.name() for main in self.mainControllers]
+                                           + ([ALL_CHARACTERS] if len(self.mainControllers) > 1 else []) )  # noqa e127
     
     
     def populatePresetChooser(self):
@@ -219,7 +308,7 @@ class SpacePresets(QtWidgets.QWidget):
         
         # Get controls from the character chooser, defaulting to all
         index = self.ui.characterChooser.currentIndex() - 1 # First item is blank so offset by 1
-        if index >= 0:
+        if 0 <= index < len(self.mainControllers):
             allControls = fossil.find.controllers(main=self.mainControllers[index])
         else:
             allControls = fossil.find.controllers()
@@ -379,7 +468,7 @@ class SpacePresets(QtWidgets.QWidget):
             
             motionOnly = False
             if not names:
-                if not fossil.controllerShape.getSwitcherPlug(obj):
+                if not rigTopology.get().switcher(obj):
                     continue
                 else:
                     motionOnly = True
@@ -496,41 +585,37 @@ class AddPresetDialog(QtWidgets.QDialog):
         self.accept()
 
 
-def getLimbKeyTimes(control, start, end):
+def getLimbKeyTimes(control, start, end, curves=None):
     '''
     If there are any keys at all, they are returned, including the start/end (if given).  Returns empty list if no keys.
+    
+    `curves` is an optional `curveData.CurveTable` to look the keys up in, defaulting to the `keyIndex`.
     '''
-    #otherObj = control.getOtherMotionType()
+    controls = rigTopology.get().limbControls(control)
     
-    #drivePlug = controllerShape.getSwitcherPlug(control)
+    return switchEngine.limbKeyTimes( curves or keyIndex.get(), controls, start, end )
 
-    controls = [ ctrl for name, ctrl in control.subControl.items() ] + [control]
-    
-    finalRange = pdil.anim.findKeyTimes(controls, start=start, end=end)
+
+def limbOf(mainCtrl, switcher):
+    '''
+    Returns the `switchEngine.Limb` of switching to `mainCtrl`'s motion.
+    '''
+    rig = rigTopology.get()
+    motion = 0 if mainCtrl.getMotionKeys() == 'fk' else 1
     
-    return finalRange
+    return switchEngine.Limb( rig.limbControls(mainCtrl), rig.limbControls(rig.other(mainCtrl)), switcher, motion )
 
 
 def getIkSwitchCommand(ikController):
-    ikControl = fossil.rig.getMainController(ikController)
+    rig = rigTopology.get()
+    ikControl = rig.main(ikController)
     
-    # Determine what type of switching to employ.
-    card = ikControl.card
-    
-    if card.rigCommand == 'DogHindleg':
-        switchCmd = fossil.kinematicSwitch.ActivateIkDispatch.activate_dogleg
-
-    elif card.rigCommand in ['SplineChest', 'SplineChestV2']:
-        switchCmd = fossil.kinematicSwitch.ActivateIkDispatch.active_splineChest
+    # The type of switching to employ is determined by the card, see `rigTopology.IK_SWITCHES`
+    switchCmd = rig.ikSwitch(ikControl)
 
-    elif card.rigCommand == 'SplineNeck':
-        switchCmd = fossil.kinematicSwitch.ActivateIkDispatch.active_splineNeck
-    else:
-        switchCmd = fossil.kinematicSwitch.ActivateIkDispatch.active_ikChain
-
-    ikControls = [ctrl for name, ctrl in ikControl.subControl.items()] + [ikControl]
+    ikControls = rig.limbControls(ikControl)
     
-    switcherPlug = fossil.controllerShape.getSwitcherPlug(ikControl)
+    switcherPlug = rig.switcher(ikControl)
     
     def cmd():
         switchCmd(ikControl)
@@ -539,37 +624,9 @@ def getIkSwitchCommand(ikController):
         #if key:
         setKeyframe(ikControls, shape=False)
     
-    return cmd
-
-
-def getSpaceTimes(control, range=(None, None)):
-    ''' Returns the times a space is keyed on the given control. '''
-    attrs = ['space'] + [t + a for t in 'tr' for a in 'xyz']
-    
-    times = keyframe( control, at=attrs, q=True, tc=True)
-    times = sorted(set(times))
-    if range[0] is not None and range[1] is not None:
-        times = [ t for t in times if range[0] <= t <= range[1] ]
-    elif range[0]:
-        times = [ t for t in times if range[0] <= t ]
-    elif range[1]:
-        times = [ t for t in times if t <= range[1] ]
-    
-    return times
-
-
-def performSpaceSwitch(control, targetSpace, enumVal):
-    
-    # Skip if already in the correct space
-    if control.space.get() == enumVal:
-        return
-    
-    presetLog.debug( 'Switching {} to {}'.format(control, targetSpace) )
-    fossil.space.switchToSpace( control, targetSpace )
+    cmd.description = '{}({})'.format(switchCmd.__name__, ikControl)
     
-    control.space.setKey()
-    control.t.setKey()
-    control.r.setKey()
+    return cmd
 
 
 def toFk(ctrls, switcher):
@@ -592,73 +649,126 @@ def shouldBeIk(mainCtrl, switcher):
     return (mainCtrl.getMotionKeys() == 'ik' and getAttr(switcher) != 1.0)
 
 
-def cleanTargetKeys(mainCtrl, switcher, times, switcherTarget):
+def cleanTargetKeys(mainCtrl, switcher, times, switcherTarget, curves=None, writer=None):
     '''
     Make sure the switcher is keyed at all the given times and the controls are unkeyed.
     
     *Technically* this should leave keys when it's keyed on, but this is already so complicated.
     
+    `curves` is an optional `curveData.CurveTable` to look the keys up in (the `keyIndex` by default).
+    `writer` is an optional `keyWriter.KeyWriter` to add the edits to, otherwise they are written immediately.
     '''
     if times:
         # If we are range switching, we have to key everything.
-            
-        # Put keys at all frames that will be switched if not already there to anchor the values.
-        # Only doing a single key because `insert=True` keying is done later
-        if not keyframe(switcher, q=True):
-            setKeyframe(switcher, t=times[0])
-        
-        allControls = [ctrl for name, ctrl in mainCtrl.subControl.items()] + [mainCtrl]
-        # Remove all the old keys where the other side is active to some extent
-        pairs = keyframe(switcher, q=1, tc=1, vc=1)
-        start = times[0]
-        end = times[-1]
-        killTimes = [t for t, v in pairs if not pdil.math.isCloseF(v, switcherTarget) and (start <= t <= end)]
-        #cutKey( allControls, iub=True, t=(times[0], times[-1]), clear=True, shape=False )
-        cmds.cutKey(allControls, iub=True, clear=True, shape=False, t=[(t, t) for t in killTimes]  )
-            
-        for t in times:
-            setKeyframe( switcher, t=t, insert=True )
+        curves = curves or keyIndex.get()
+        
+        with keyWriter.using(writer, curves) as writer:
+            switchEngine.cleanTargetKeys( curves, spaceSwitching.sampleKeyed, writer, switcher,
+                                          rigTopology.get().limbControls(mainCtrl), times, switcherTarget,
+                                          pdil.math.isCloseF )  # noqa e127
 
 
-def keySwitcher(switcher, times):
-    if not keyframe(switcher, q=True, tc=True):
-        setKeyframe(switcher, t=times[0])
+def keySwitcher(switcher, times, curves=None, writer=None):
+    '''
+    Keys the switcher at all the times without changing it.
+    `curves` is an optional `curveData.CurveTable`, defaulting to the `keyIndex`.
+    `writer` is an optional `keyWriter.KeyWriter` to add the edits to, otherwise they are written immediately.
+    '''
+    curves = curves or keyIndex.get()
+    
+    with keyWriter.using(writer, curves) as writer:
+        switchEngine.keySwitcher( curves, spaceSwitching.sampleKeyed, writer, switcher, times )
 
-    for t in times:
-        setKeyframe(switcher, t=t, insert=True)
+
+def getKeyRange(mode):
+    '''
+    Returns the (start, end) to switch for the range modes [all, range, selected], all being (None, None).
+    '''
+    if mode == 'all':
+        return (None, None)
+    elif mode == 'range':
+        return (playbackOptions(q=True, min=True), playbackOptions(q=True, max=True))
+    elif mode == 'selected':
+        if not pdil.time.rangeIsSelected():
+            return [currentTime()] * 2
+        else:
+            return pdil.time.selectedTime()
 
 
-def apply(preset, mode):
+def switchKinematicNow(mainCtrl, switcher):
     '''
-    &&& Do I optionally bookend the ranged switches?  Probably.
-    Args:
-        preset: Dict of { <pynode control>: '<space name or "# Activate">', ... }
-        mode: str of [frame, all, range, selected]
+    Switches the limb to `mainCtrl`'s motion type on the current frame, if it isn't already.
     '''
-    
+    if shouldBeFk(mainCtrl, switcher):
+        fossil.kinematicSwitch.activateFk( mainCtrl )
+    elif shouldBeIk(mainCtrl, switcher):
+        # &&& This appears to key always, is this ok?
+        getIkSwitchCommand(mainCtrl)()
+        setAttr(switcher, 1) # 7/9/2020 the switch command needs burping so actively set it
+
+
+def planKinematicSwitch(mainCtrl, switcher, keyRange, schedule, kinematicKeyed, curves=None, writer=None):
     '''
-    Tests
-    All the combinations:
-        Fk to Ik, ends are keyed
-            opposite
-        Fk to Ik, ends are not keyed
-            opposite
-        
+    Adds the commands to switch the limb to `mainCtrl`'s motion type over the key range to the schedule.
+    Unkeyed limbs are switched immediately and the old keys are cleaned up before the walk.
+    
+    The plan itself is `switchEngine.planLimb`, this only turns it into commands.
+    
+    Args:
+        mainCtrl: The main controller of the motion being switched to.
+        switcher: The limb's ik/fk switcher plug.
+        keyRange: (start, end)
+        schedule: The `Schedule` to add the 'kinematic' commands to.
+        kinematicKeyed: { <control>: set(<times>) } updated with the times the switch will key each control.
+        curves: Optional `curveData.CurveTable` to look up keys in, updated for the edits made, defaulting to
+            the `keyIndex`.
+        writer: Optional `keyWriter.KeyWriter` to buffer the key edits in, otherwise they are written immediately.
+            It must be flushed before the walk.
     '''
+    curves = curves or keyIndex.get()
+    limb = limbOf(mainCtrl, switcher)
     
-    print(preset)
+    with tracing.span('planLimb', limb=mainCtrl), keyWriter.using(writer, curves) as edits:
+        plan = switchEngine.planLimb( curves, spaceSwitching.sampleKeyed, edits, limb, keyRange,
+                                      currentTime(q=True), kinematicKeyed, pdil.math.isCloseF )  # noqa e127
+    
+    presetLog.debug( '{} {} on {} frames'.format(mainCtrl, plan.action, len(plan.times)) )
+    
+    if plan.action == 'now':
+        switchKinematicNow(mainCtrl, switcher)
+        curves.invalidate( limb.controls )
+    
+    elif plan.action:
+        if limb.motion == 0:
+            cmd = partial(toFk, limb.controls, switcher)
+        else:
+            cmd = getIkSwitchCommand(mainCtrl)
+        
+        schedule.add( 'kinematic', cmd, plan.times )
     
+    return plan
+
+
+def _animStateApply(preset, mode, keyRange=None):
+    '''
+    Applies the preset with `fossil.kinematicSwitch.animStateSwitch`, over the (start, end) keyRange instead
+    of the mode's range if given.
+    '''
+    rig = rigTopology.get()
     leads = set()
     
     spaces = {}
     
     for ctrl, action in preset.items():
-        leads.add( fossil.node.leadController(ctrl) )
+        leads.add( rig.lead(ctrl) )
         if action != ACTIVATE_KEY:
             spaces[ctrl] = action
     
     
-    if mode == 'frame':
+    if keyRange:
+        start, end = keyRange
+    
+    elif mode == 'frame':
         start = int( currentTime(q=True) )
         end = int( currentTime(q=True) )
         
@@ -674,35 +784,72 @@ def apply(preset, mode):
     elif mode == 'all':
         
         #pairs = { obj: obj.getOtherMotionType() for obj in currentLeads }
-        source = [obj.getOtherMotionType() for obj in leads]
+        source = [rig.other(obj) for obj in leads]
         
         #targetLeads = [other for obj, other in pairs.items() if other]
         
         relevantControls = []
-        relevantControls += source
         for leadControl in source:
-            relevantControls += [obj for name, obj in leadControl.subControl.items()]
+            relevantControls += rig.limbControls(leadControl)
         
-        start, end = pdil.anim.findKeyTimes(relevantControls, None, None)
+        start, end = keyIndex.get().keyRange(relevantControls)
     print(start, end, '- - - -  - - ', leads)
     pdil.tool.fossil.kinematicSwitch.animStateSwitch(leads, start, end, spaces)
+
+
+@tracing.traced()
+def apply(preset, mode, legacy=True, timelineFree=False, snapshot=False, workers=None):
+    '''
+    &&& Do I optionally bookend the ranged switches?  Probably.
+    Args:
+        preset: Dict of { <pynode control>: '<space name or "# Activate">', ... }
+        mode: str of [frame, all, range, selected]
+        legacy: The default, use the switching in this module, which plans every switch up front and walks the
+            timeline once.  When range switching, returns a Counter of the frames visited, see `walkTimeline`.
+            If False, use `fossil.kinematicSwitch.animStateSwitch` instead.
+        timelineFree: Legacy range switching only, space switches are done after the kinematic walk with
+            `spaceSwitching.switchTimes` instead of on the timeline, when the space can be resolved.
+        snapshot: Range switching only, copy the curves of the `affectedNodes` first and switch with undo
+            disabled, so undo is a single restore of the copy instead of every key edit.
+        workers: Legacy range switching only, a `workerPool.WorkerPool` to solve the timeline free space
+            switches on in chunks of frames, implies `timelineFree`.
+    '''
+    
+    if snapshot and mode != 'frame':
+        with curveSnapshot.undoable( affectedNodes(preset) ):
+            return apply(preset, mode, legacy, timelineFree, workers=workers)
     
-    return
+    timelineFree = timelineFree or workers is not None
+    
+    '''
+    Tests
+    All the combinations:
+        Fk to Ik, ends are keyed
+            opposite
+        Fk to Ik, ends are not keyed
+            opposite
+        
+    '''
+    
+    print(preset)
+    
+    if not legacy:
+        _animStateApply(preset, mode)
+        if mode != 'frame':
+            recordApplied( preset, getKeyRange(mode), legacy=False )
+        return
+
+    rig = rigTopology.get()
     
     if mode == 'frame':
         # Single frame is easy, just do the work and get out
         for ctrl, targetSpace in preset.items():
-            mainCtrl = fossil.rig.getMainController(ctrl)
-            switcher = fossil.controllerShape.getSwitcherPlug(ctrl)
+            mainCtrl = rig.main(ctrl)
+            switcher = rig.switcher(ctrl)
             
             # Ensure we're in ik or fk prior to switching spaces
             if switcher:
-                if shouldBeFk(mainCtrl, switcher):
-                    fossil.kinematicSwitch.activateFk( mainCtrl )
-                elif shouldBeIk(mainCtrl, switcher):
-                    # &&& This appears to key always, is this ok?
-                    getIkSwitchCommand(mainCtrl)()
-                    setAttr(switcher, 1) # 7/9/2020 the switch command needs burping so actively set it
+                switchKinematicNow(mainCtrl, switcher)
             
             # Finally space switch
             if targetSpace != ACTIVATE_KEY:
@@ -711,15 +858,7 @@ def apply(preset, mode):
         return
         
     else:
-        if mode == 'all':
-            keyRange = (None, None)
-        elif mode == 'range':
-            keyRange = (playbackOptions(q=True, min=True), playbackOptions(q=True, max=True))
-        elif mode == 'selected':
-            if not pdil.time.rangeIsSelected():
-                keyRange = [currentTime()] * 2
-            else:
-                keyRange = pdil.time.selectedTime()
+        keyRange = getKeyRange(mode)
 
         presetLog.debug('Range {} {}'.format(keyRange[0], keyRange[-1]))
         
@@ -729,109 +868,651 @@ def apply(preset, mode):
         profile took 10x longer than a 1 control profile.
         
         Solution: collect all the times all events occur at, walk the timeline ONCE and switch as needed.
-        Technically this is actually done twice, once to do the kinematic switch, and again to for the space.
-        Future improvement will try to do it as one.
+        Each frame runs the kinematic switches first, then the space switches, so the space times are planned
+        up front, including the keys the kinematic switches will add.
         
-        kinematicSwitches[ <switch command> ] = [ <list of times to run at> ]
+        The `Schedule` maps each frame to the commands due then, kinematic then space.
+        kinematicKeyed[ <control> ] = { <times the kinematic switches will key it> }
         '''
         
-        kinematicSwitches = {}
-        allTimes = set()
+        # All the key queries come from the index, which reads any controllers it doesn't have in one pass.
+        curves = keyIndex.get()
+        curves.read( fossil.find.controllers() )
         
-        for ctrl, targetSpace in preset.items():
-            if isinstance(ctrl, basestring):
+        # The space switch keys are buffered during the walk and written after it.
+        with keyWriter.KeyWriter(curves) as writer:
+            schedule, contextSwitches = planApply(preset, keyRange, writer, timelineFree, curves)
+            
+            presetLog.debug( 'Schedule {}'.format(schedule) )
+            
+            visits = walkTimeline( schedule, presetControls(preset) )
+        
+        # Done after the walk so the keys from the kinematic switches are in place.
+        switchInContext(contextSwitches, curves, workers)
+        
+        recordApplied(preset, keyRange, curves)
+        
+        return visits
+
+
+def presetControls(preset):
+    '''
+    Returns the controls of the preset that exist, skipping the missing ones stored by name.
+    '''
+    return [ctrl for ctrl in preset if not isinstance(ctrl, basestring)]
+
+
+def affectedNodes(preset):
+    '''
+    Returns the nodes applying the preset can key, the controls, all the controls of both motions of their
+    limbs and the nodes with the ik/fk switchers.
+    '''
+    rig = rigTopology.get()
+    
+    nodes = []
+    for ctrl in presetControls(preset):
+        nodes.append(ctrl)
+        
+        switcher = rig.switcher(ctrl)
+        if switcher:
+            mainCtrl = rig.main(ctrl)
+            nodes += rig.limbControls(mainCtrl) + rig.limbControls(rig.other(mainCtrl))
+            nodes.append( str(switcher).split('.')[0] )
+    
+    return list( collections.OrderedDict.fromkeys(nodes) )
+
+
+@tracing.traced()
+def planApply(preset, keyRange, writer, timelineFree=False, curves=None):
+    '''
+    Plans a legacy range `apply`, returning (<Schedule>, <context switches>).
+    
+    The kinematic key cleanup is written immediately, the space switch commands add their keys to `writer`
+    when the schedule is walked.  The context switches are [ (<ctrl>, <space>, <times>, <target parent>), ... ]
+    for `switchInContext` to do after the walk.
+    '''
+    rig = rigTopology.get()
+    curves = curves or keyIndex.get()
+    
+    schedule = Schedule(['kinematic', 'space'])
+    kinematicKeyed = collections.defaultdict(set)
+    
+    # The key cleanup of the planning is buffered and written before the space times are gathered.
+    planned = set()
+    with keyWriter.KeyWriter(curves) as cleanup:
+        for ctrl in presetControls(preset):
+            mainCtrl = rig.main(ctrl)
+            switcher = rig.switcher(ctrl)
+            presetLog.debug( '{} {}'.format(mainCtrl, switcher) )
+            # Implicit to ensure we're in the mode that the space is in, once per limb.
+            if switcher and mainCtrl not in planned:
+                planned.add(mainCtrl)
+                planKinematicSwitch(mainCtrl, switcher, keyRange, schedule, kinematicKeyed, curves, cleanup)
+    
+    # Just like with kinematics, gather all the frames a space switch is needed.
+    contextSwitches = []
+    
+    for ctrl, targetSpace in preset.items():
+        if not isinstance(ctrl, basestring) and targetSpace != ACTIVATE_KEY:
+            
+            # If the space is unkeyed, just switch it, other wise store it
+            times = switchEngine.switchSpaceTimes( curves, ctrl, keyRange, kinematicKeyed )
+            if not times:
+                fossil.space.switchToSpace( ctrl, targetSpace )
                 continue
+            
+            targetParent = spaceSwitching.resolveTargetParent(ctrl, targetSpace) if timelineFree else None
+            if targetParent:
+                contextSwitches.append( (ctrl, targetSpace, times, targetParent) )
+            else:
+                enumVal = ctrl.space.getEnums()[targetSpace]
                 
-            mainCtrl = fossil.rig.getMainController(ctrl)
-            switcher = fossil.controllerShape.getSwitcherPlug(ctrl)
-            print(mainCtrl, switcher)
-            # Implicit to ensure we're in the mode that the space is in.
-            if switcher:
-                otherMotionTimes = getLimbKeyTimes( mainCtrl.getOtherMotionType(), keyRange[0], keyRange[1] )
-                targetTimes = getLimbKeyTimes( mainCtrl, keyRange[0], keyRange[1] )
-                presetLog.debug('other times count: {}   target times count: {}'.format( len(otherMotionTimes), len(targetTimes) ))
-                # Neither is keyed, perform basic switch
-                if not otherMotionTimes and not targetTimes:
-                    presetLog.debug('No keys on either, just switch')
-                    if shouldBeFk(mainCtrl, switcher):
-                        fossil.kinematicSwitch.activateFk( mainCtrl )
-
-                    elif shouldBeIk(mainCtrl, switcher):
-                        getIkSwitchCommand(mainCtrl)()
+                # Frames already in the space are left out of the walk entirely.
+                times = spaceSwitching.timesToSwitch(ctrl, times, enumVal)
+                presetLog.debug('Switch Ctrl {} on {} frames'.format(ctrl, len(times)) )
+                if times:
+                    schedule.add( 'space', partial(performSpaceSwitch, ctrl, targetSpace, enumVal, writer,
+                                                   spaceSwitching.unlockedChannels(ctrl)), times )  # noqa e127
+    
+    return schedule, contextSwitches
 
-                    continue
 
-                # Bizarre case, no keys on the source space but some on dest space
-                # Just switch at the ends and clean out the middle
-                if not otherMotionTimes and targetTimes:
-                    presetLog.debug('Only target')
-                    #otherMain = mainCtrl.getOtherMotionType()
-                    controls = [mainCtrl] + [ ctrl for name, ctrl in mainCtrl.subControl.items() ]
-                    if shouldBeFk(mainCtrl, switcher):
-                        cutKey(controls, iub=True, t=keyRange, cl=True)
-                        #fossil.kinematicSwitch.activateFk( mainCtrl )
-                        kinematicSwitches[ partial(toFk, controls, switcher) ] = keyRange
-
-                    elif shouldBeIk(mainCtrl, switcher):
-                        cutKey(controls, iub=True, t=keyRange, cl=True)
-                        kinematicSwitches[ getIkSwitchCommand(mainCtrl) ] = keyRange
-                        #getIkSwitchCommand(mainCtrl)()
-                    
-                    allTimes.update( keyRange )
-                    # Does cleanTargetKeys() need to happen here?  I don't think so,
+@tracing.traced()
+def switchInContext(contextSwitches, curves=None, workers=None):
+    '''
+    Does the context switches from `planApply` with `spaceSwitching.switchTimes`, or in parallel on the
+    `workerPool.WorkerPool` if given, writing the keys together.
+    '''
+    with keyWriter.KeyWriter(curves) as writer:
+        if workers is not None:
+            workerPool.switchInParallel(contextSwitches, workers, writer)
+            return
+        
+        for ctrl, targetSpace, times, targetParent in contextSwitches:
+            presetLog.debug('Switch Ctrl {} in context'.format(ctrl) )
+            spaceSwitching.switchTimes(ctrl, targetSpace, times, targetParent, writer)
+
+
+class ChunkedApply(object):
+    '''
+    Runs a legacy range `apply` a chunk of frames at a time from Maya's idle queue, so the ui stays responsive
+    and it can be cancelled.  The number of frames per chunk adapts to take about `chunkSeconds`.
+    
+    The ui is live between chunks, so nothing is left open across them: each chunk runs with undo disabled,
+    inside its own `evalScope.EvaluationScope`, and puts the current time back.  A `curveSnapshot.CurveSnapshot`
+    of the `affectedNodes` is taken first, cancelling (or an error) restores it so none of the partial keys
+    are left, and finishing registers a single undo restoring it.  Edits made to the affected nodes while it
+    runs are lost if it's cancelled.
+    
+    Args:
+        preset: Dict of { <pynode control>: '<space name or "# Activate">', ... }
+        mode: str of [all, range, selected]
+        progress: Optional function called after each chunk with (<frames done>, <total frames>,
+            <estimated seconds left>).
+        finished: Optional function called at the end with the visit Counter, or None if cancelled or failed.
+    '''
+    
+    MIN_CHUNK = 1
+    MAX_CHUNK = 500
+    
+    def __init__(self, preset, mode, timelineFree=False, progress=None, finished=None, chunkSeconds=0.1):
+        self.preset = preset
+        self.mode = mode
+        self.timelineFree = timelineFree
+        self.progress = progress
+        self.finished = finished
+        self.chunkSeconds = chunkSeconds
+        
+        self.chunkSize = self.MIN_CHUNK
+        self.visits = collections.Counter()
+        self.running = False
+        
+        self._frames = []
+        self._done = 0
+        self._seconds = 0.0
+    
+    def start(self):
+        '''
+        Plans the switch and queues the first chunk.
+        '''
+        self.running = True
+        self.before = None
+        try:
+            self.before = curveSnapshot.CurveSnapshot( affectedNodes(self.preset) )
+            
+            self.curves = keyIndex.get()
+            self.curves.read( fossil.find.controllers() )
+            
+            self.keyRange = getKeyRange(self.mode)
+            self.writer = keyWriter.KeyWriter(self.curves)
+            with apiUndo.disabled():
+                self.schedule, self.contextSwitches = planApply( self.preset, self.keyRange, self.writer,
+                                                                 self.timelineFree, self.curves )  # noqa e127
+            self._frames = self.schedule.frames()
+            
+            self.scope = evalScope.EvaluationScope( presetControls(self.preset) )
+        except Exception:
+            self._end(rollback=True)
+            raise
+        
+        maya.utils.executeDeferred(self._step)
+    
+    def cancel(self):
+        '''
+        Stops and undoes everything done so far.
+        '''
+        if self.running:
+            self._end(rollback=True)
+    
+    def _step(self):
+        if not self.running:  # Cancelled while this chunk was queued
+            return
+        
+        chunk = self._frames[self._done:self._done + self.chunkSize]
+        try:
+            startTime = default_timer()
+            with apiUndo.disabled(), pdil.time.preserveCurrentTime(), pdil.ui.NoUpdate(), self.scope:
+                spaceSwitching.runFrames(self.schedule, chunk, self.visits)
+                self.writer.flush()
+            elapsed = default_timer() - startTime
+        except Exception:
+            self._end(rollback=True)
+            raise
+        
+        self._done += len(chunk)
+        self._seconds += elapsed
+        
+        perFrame = self._seconds / self._done if self._done else 0.0
+        if perFrame:
+            self.chunkSize = max( self.MIN_CHUNK, min(self.MAX_CHUNK, int(self.chunkSeconds / perFrame)) )
+        
+        if self.progress:
+            self.progress( self._done, len(self._frames), perFrame * (len(self._frames) - self._done) )
+        
+        if self._done < len(self._frames):
+            maya.utils.executeDeferred(self._step)
+            return
+        
+        try:
+            with apiUndo.disabled():
+                switchInContext(self.contextSwitches, self.curves)
+            recordApplied(self.preset, self.keyRange, self.curves)
+        except Exception:
+            self._end(rollback=True)
+            raise
+        
+        self._end()
+    
+    def _end(self, rollback=False):
+        self.running = False
+        
+        if hasattr(self, 'writer'):
+            self.writer.clear()
+        if hasattr(self, 'scope') and self._done:
+            self.scope.seconds = self._seconds  # Only the time spent walking, not waiting between chunks
+            presetLog.info( self.scope.report(self.visits['frames']) )
+        
+        # Nothing was put in the undo queue, so it's only restored, or registered as one undo when done.
+        if self.before:
+            if rollback:
+                self.before.restore()
+            else:
+                curveSnapshot.commitUndo(self.before)
+        
+        if self.finished:
+            self.finished( None if rollback else self.visits )
+
+
+AppliedState = collections.namedtuple( 'AppliedState', 'space keyRange keys legacy' )
+
+
+def _clearApplied(*args):
+    _applied.clear()
+
+
+def _watchScene():
+    '''
+    Forgets everything applied when a scene is opened or references change, since the curves it remembers
+    belong to the old scene, like the `keyIndex` and `rigTopology` do.
+    '''
+    if _appliedCallbacks:
+        return
+    
+    for message in ['kBeforeNew', 'kBeforeOpen', 'kAfterCreateReference', 'kAfterRemoveReference',
+                    'kAfterLoadReference', 'kAfterUnloadReference', 'kAfterImportReference']:  # noqa e127
+        _appliedCallbacks.append( OpenMaya.MSceneMessage.addCallback(getattr(OpenMaya.MSceneMessage, message), _clearApplied) )
+
+
+def _curveState(nodes, curves):
+    '''
+    Returns { <curve>: (<times>, <values>) } copies of the keys of all the nodes' curves.
+    '''
+    return { curve: tuple( copy.copy(column) for column in curves.curveColumns(curve, ['times', 'values']) )
+             for curve in curves.curvesOf(nodes) }  # noqa e128
+
+
+def recordApplied(preset, keyRange, curves=None, legacy=True):
+    '''
+    Remembers the space each control of the preset was switched to over the key range, along with the keys
+    of its `affectedNodes` afterwards and whether it was switched with the `legacy` planner, for `reapplyDirty`.
+    '''
+    _watchScene()
+    curves = curves or keyIndex.get()
+    
+    for ctrl, space in preset.items():
+        if not isinstance(ctrl, basestring):
+            keys = _curveState(affectedNodes({ctrl: space}), curves)
+            _applied[ctrl.name()] = AppliedState( space, keyRange, keys, legacy )
+
+
+def dirtyRanges(ctrl, state, curves=None):
+    '''
+    Returns a sorted list of the (start, end) ranges that need switching again because keys of the control's
+    `affectedNodes` were added, removed or changed since `state`.  Each edited key dirties the range from the
+    key before it to the key after it, since that's how far its change reaches, within the applied key range.
+    '''
+    curves = curves or keyIndex.get()
+    current = _curveState( affectedNodes({ctrl: state.space}), curves )
+    
+    dirty = set()
+    allTimes = set()
+    for curve in set(state.keys).union(current):
+        old = { float(t): float(v) for t, v in zip(*state.keys.get(curve, ([], []))) }
+        new = { float(t): float(v) for t, v in zip(*current.get(curve, ([], []))) }
+        allTimes.update(old)
+        allTimes.update(new)
+        
+        dirty.update( t for t in set(old).union(new)
+                      if t not in old or t not in new or not pdil.math.isCloseF(old[t], new[t]) )  # noqa e131
+    
+    if not dirty:
+        return []
+    
+    allTimes = sorted(allTimes)
+    indices = { time: i for i, time in enumerate(allTimes) }
+    start, end = state.keyRange
+    
+    ranges = []
+    for time in sorted(dirty):
+        i = indices[time]
+        before = allTimes[max(i - 1, 0)]
+        after = allTimes[min(i + 1, len(allTimes) - 1)]
+        lo = before if start is None else max(before, start)
+        hi = after if end is None else min(after, end)
+        if lo > hi:  # Outside the applied range
+            continue
+        
+        if ranges and lo <= ranges[-1][1]:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], hi))
+        else:
+            ranges.append( (lo, hi) )
+    
+    return ranges
+
+
+@tracing.traced()
+def reapplyDirty(controls=None, timelineFree=False):
+    '''
+    Switches the controls again, to the space of their last `apply`, but only over the `dirtyRanges`, with
+    the same algorithm as that apply.  The controls applied with the legacy planner are all done in a single
+    walk of the timeline, the others with `fossil.kinematicSwitch.animStateSwitch` one range at a time.
+    
+    Args:
+        controls: The controls to reapply, defaulting to every control applied so far.
+    
+    Every applied control remembering keys of the limbs switched again is recorded again afterwards.
+    
+    Returns the visit Counter from `walkTimeline`.
+    '''
+    names = [ctrl.name() for ctrl in controls] if controls is not None else list(_applied)
+    names = [name for name in names if name in _applied and cmds.objExists(name)]
+    
+    curves = keyIndex.get()
+    curves.read( fossil.find.controllers() )
+    
+    # Found before planning anything since the planning edits keys the other controls compare.
+    work = [ (PyNode(name), _applied[name]) for name in names ]
+    work = [ (ctrl, state, dirtyRanges(ctrl, state, curves)) for ctrl, state in work ]
+    
+    schedule = Schedule(['kinematic', 'space'])
+    contextSwitches = []
+    
+    with apiUndo.chunk('reapplyDirty'):
+        with keyWriter.KeyWriter(curves) as writer:
+            for ctrl, state, ranges in work:
+                if not state.legacy:
                     continue
-                
+                presetLog.debug( 'Reapply {} on {}'.format(ctrl, ranges) )
+                for keyRange in ranges:
+                    planned, context = planApply( {ctrl: state.space}, keyRange, writer, timelineFree, curves )
+                    schedule.merge(planned)
+                    contextSwitches += context
+            
+            visits = walkTimeline( schedule, [ctrl for ctrl, state, ranges in work if ranges and state.legacy] )
+        
+        switchInContext(contextSwitches, curves)
+        
+        for ctrl, state, ranges in work:
+            if not state.legacy:
+                presetLog.debug( 'Reapply {} on {} with animStateSwitch'.format(ctrl, ranges) )
+                for keyRange in ranges:
+                    _animStateApply( {ctrl: state.space}, None, keyRange )
+    
+    # Switching a control rekeys its whole limb, so every control remembering any of those curves is recorded
+    # again, otherwise the next reapply finds the keys this one made dirty on the untouched controls.
+    reapplied = { ctrl: state.space for ctrl, state, ranges in work if ranges }
+    touched = set( curves.curvesOf(affectedNodes(reapplied)) ) if reapplied else set()
+    
+    for name, state in list(_applied.items()):
+        if touched.intersection(state.keys) and cmds.objExists(name):
+            recordApplied( {PyNode(name): state.space}, state.keyRange, curves, state.legacy )
+    
+    return visits
 
-                if shouldBeFk(mainCtrl, switcher):
-                    targetMotion = 0
-                    presetLog.debug( 'Switch to FK {}: {} - {}'.format(mainCtrl, otherMotionTimes[0], otherMotionTimes[-1]) )
-                    fkCtrls = [mainCtrl] + [ctrl for name, ctrl in mainCtrl.subControl.items()]
-                    
-                    kinematicSwitches[ partial(toFk, fkCtrls, switcher) ] = otherMotionTimes
-                    allTimes.update( otherMotionTimes )
-                
-                elif shouldBeIk(mainCtrl, switcher):
-                    targetMotion = 1
-                    presetLog.debug( 'Switch to IK {} {} - {}'.format(mainCtrl, otherMotionTimes[0], otherMotionTimes[-1]) )
-                    kinematicSwitches[ getIkSwitchCommand(mainCtrl) ] = otherMotionTimes
-                    allTimes.update( otherMotionTimes )
-                
-                if otherMotionTimes:
-                    keySwitcher(switcher, otherMotionTimes)
-                    cleanTargetKeys(mainCtrl, switcher, otherMotionTimes, targetMotion)
-        
-        with pdil.time.preserveCurrentTime():
-            # First timeline runthrough - ensure the kinematic state is correct.
-            with pdil.ui.NoUpdate():
-                presetLog.debug('KINEMATIC TIMES {}'.format(sorted(allTimes)))
-                for i in sorted(allTimes):
-                    currentTime(i)
-                    for cmd, vals in kinematicSwitches.items():
-                        if i in vals:
-                            cmd()
+
+def resolveProfile(profile, main):
+    '''
+    Returns the profile, { <control name>: <space>, ... }, as a preset of the controls of the character with
+    the given main group.  Names not found on the character are left as names, like `SpacePresets.setProfile`.
+    '''
+    nameMap = { pdil.simpleName(ctrl): ctrl for ctrl in fossil.find.controllers(main=main) }
+    
+    return collections.OrderedDict(
+        (nameMap.get(pdil.simpleName(name), name), space) for name, space in profile.items()
+    )
+
+
+def _isolated(cmd, errors, key):
+    '''
+    Returns a command that runs `cmd` unless errors[key] is set, storing its exception there if it fails.
+    '''
+    def isolatedCmd():
+        if key in errors:
+            return
+        try:
+            cmd()
+        except Exception as e:
+            presetLog.exception( 'Switching {} failed'.format(key) )
+            errors[key] = e
+    
+    isolatedCmd.description = describe(cmd)
+    return isolatedCmd
+
+
+def charactersPreset(profile, mains):
+    '''
+    Returns a single preset of the profile resolved on each character, see `resolveProfile`, ex. to apply
+    every character with a `ChunkedApply`.  Names not found on any character are dropped.
+    '''
+    preset = collections.OrderedDict()
+    for main in mains:
+        preset.update( (ctrl, space) for ctrl, space in resolveProfile(profile, main).items()
+                       if not isinstance(ctrl, basestring) )  # noqa e127
+    return preset
+
+
+def _rollback(snapshot):
+    '''
+    Puts a character that failed partway back to its `curveSnapshot.CurveSnapshot`, registering the restore
+    with undo so undoing the whole apply still steps back through the edits made before it failed.
+    '''
+    if snapshot is None:
+        return
+    
+    restore = snapshot.restore()
+    apiUndo.commit(restore.undoIt, restore.redoIt)
+
+
+@tracing.traced()
+def applyCharacters(profile, mains, mode, timelineFree=False, snapshot=False):
+    '''
+    Applies the same profile to several characters, with the default planner of `apply`.  In the range modes,
+    every character is planned first, then they are all switched in a single walk of the timeline.
+    
+    Each character is isolated, if one fails (ex. the rig is missing a space), the rest of its commands are
+    skipped, its buffered space keys are discarded and its `affectedNodes` are restored to a snapshot taken
+    before it was planned, undoing the cleanup, immediate switches and kinematic keys it had already made.
+    The other characters carry on.
+    
+    Args:
+        profile: Dict of { <control name>: '<space name or "# Activate">', ... }, see `resolveProfile`.
+        mains: The main groups of the characters.
+        mode: str of [frame, all, range, selected]
+        snapshot: Range switching only, switch with undo disabled and undo with a single restore, like `apply`.
+    
+    Returns (<visit Counter>, { <main>: <exception> }) of the characters that failed.
+    '''
+    if snapshot and mode != 'frame':
+        nodes = []
+        for main in mains:
+            try:
+                nodes += affectedNodes( resolveProfile(profile, main) )
+            except Exception:  # Fails again, and is reported, when applied
+                pass
+        
+        with curveSnapshot.undoable(nodes):
+            return applyCharacters(profile, mains, mode, timelineFree)
+    
+    errors = collections.OrderedDict()
+    visits = collections.Counter()
+    snapshots = {}  # { <main>: <CurveSnapshot before it was switched> }
+    
+    with apiUndo.chunk('applyCharacters'):
+        if mode == 'frame':
+            for main in mains:
+                try:
+                    preset = resolveProfile(profile, main)
+                    snapshots[main] = curveSnapshot.CurveSnapshot( affectedNodes(preset) )
+                    apply( preset, mode )
+                except Exception as e:
+                    presetLog.exception( 'Switching {} failed'.format(main) )
+                    errors[main] = e
+                    _rollback( snapshots.get(main) )
             
-            # Just like with kinematics, gather all the frames a space switch is needed.
-            spaceSwitches = {}
+            return visits, errors
+        
+        keyRange = getKeyRange(mode)
+        
+        curves = keyIndex.get()
+        curves.read( fossil.find.controllers() )
+        
+        schedule = Schedule(['kinematic', 'space'])
+        planned = collections.OrderedDict()  # { <main>: (<preset>, <writer>, <context switches>) }
+        
+        for main in mains:
+            # Each character buffers its walk keys separately so a failure only loses its own.
+            writer = keyWriter.KeyWriter(curves)
+            try:
+                preset = resolveProfile(profile, main)
+                snapshots[main] = curveSnapshot.CurveSnapshot( affectedNodes(preset) )
+                characterSchedule, contextSwitches = planApply(preset, keyRange, writer, timelineFree, curves)
+            except Exception as e:
+                presetLog.exception( 'Planning {} failed'.format(main) )
+                errors[main] = e
+                _rollback( snapshots.get(main) )
+                continue
             
-            allSpaceTimes = set()
-            for ctrl, targetSpace in preset.items():
-                if not isinstance(ctrl, basestring) and targetSpace != ACTIVATE_KEY:
-                    
-                    # If the space is unkeyed, just switch it, other wise store it
-                    times = getSpaceTimes(ctrl, keyRange)
-                    if not times:
-                        fossil.space.switchToSpace( ctrl, targetSpace )
-                    else:
-                        allSpaceTimes.update(times)
-                    
-                        presetLog.debug('Switch Ctrl {}'.format(ctrl) )
-                        enumVal = ctrl.space.getEnums()[targetSpace]
-                        spaceSwitches[ partial(performSpaceSwitch, ctrl, targetSpace, enumVal) ] = times
+            for frame, phases in characterSchedule:
+                for phase, commands in phases:
+                    for cmd in commands:
+                        schedule.add( phase, _isolated(cmd, errors, main), [frame] )
             
-            # Finally, walk the timeline a second time switching spaces as needed.
-            with pdil.ui.NoUpdate():
-                for i in sorted(allSpaceTimes):
-                    currentTime(i)
-                    for cmd, vals in spaceSwitches.items():
-                        if i in vals:
-                            cmd()
\ No newline at end of file
+            planned[main] = (preset, writer, contextSwitches)
+        
+        presetLog.debug( 'Schedule {}'.format(schedule) )
+        
+        controls = [ctrl for preset, writer, context in planned.values() for ctrl in presetControls(preset)]
+        visits = walkTimeline(schedule, controls)
+        
+        for main, (preset, writer, contextSwitches) in planned.items():
+            if main in errors:
+                writer.clear()
+                _rollback( snapshots[main] )
+                continue
+            
+            try:
+                writer.flush()
+                switchInContext(contextSwitches, curves)
+                recordApplied(preset, keyRange, curves)
+            except Exception as e:
+                presetLog.exception( 'Switching {} failed'.format(main) )
+                errors[main] = e
+                _rollback( snapshots[main] )
+    
+    return visits, errors
+
+
+LimbTiming = collections.namedtuple( 'LimbTiming', 'plan switch frames' )
+
+
+def _timed(cmd, timings, key):
+    '''
+    Returns a command that runs `cmd`, adding the seconds it took to timings[key].
+    '''
+    def timedCmd():
+        startTime = default_timer()
+        cmd()
+        timings[key] += default_timer() - startTime
+    
+    timedCmd.description = describe(cmd)
+    return timedCmd
+
+
+@tracing.traced()
+def switchLimbs(mainCtrls, mode):
+    '''
+    Switches several limbs to ik or fk together.  Every limb's key times are planned first, then all the
+    matches are done in a single walk of the timeline, instead of once per limb like `multiSwitch`.
+    
+    Args:
+        mainCtrls: The main controller of the motion to switch to for each limb, ex. all the ik main controls.
+        mode: str of [frame, all, range, selected]
+    
+    Returns an OrderedDict of { <main control>: LimbTiming(plan=<seconds>, switch=<seconds>, frames=<count>) }
+    '''
+    rig = rigTopology.get()
+    planTimes = collections.OrderedDict()
+    switchSeconds = collections.Counter()
+    frameCounts = collections.Counter()
+    
+    with apiUndo.chunk('switchLimbs'):
+        if mode == 'frame':
+            for mainCtrl in mainCtrls:
+                startTime = default_timer()
+                switchKinematicNow(mainCtrl, rig.switcher(mainCtrl))
+                planTimes[mainCtrl] = 0.0
+                switchSeconds[mainCtrl] += default_timer() - startTime
+                frameCounts[mainCtrl] = 1
+        
+        else:
+            keyRange = getKeyRange(mode)
+            
+            schedule = Schedule(['kinematic'])
+            kinematicKeyed = collections.defaultdict(set)
+            curves = keyIndex.get()
+            curves.read( fossil.find.controllers() )
+            
+            for mainCtrl in mainCtrls:
+                startTime = default_timer()
+                
+                # Planned separately so each limb's commands can be timed in the shared walk.
+                limbSchedule = Schedule(['kinematic'])
+                with keyWriter.KeyWriter(curves) as writer:
+                    planKinematicSwitch( mainCtrl, rig.switcher(mainCtrl), keyRange,
+                                         limbSchedule, kinematicKeyed, curves, writer )  # noqa e127
+                
+                timedCommands = {}
+                for frame, phases in limbSchedule:
+                    for phase, commands in phases:
+                        for cmd in commands:
+                            if cmd not in timedCommands:
+                                timedCommands[cmd] = _timed(cmd, switchSeconds, mainCtrl)
+                            schedule.add( phase, timedCommands[cmd], [frame] )
+                
+                frameCounts[mainCtrl] = len(limbSchedule)
+                planTimes[mainCtrl] = default_timer() - startTime
+            
+            presetLog.debug( 'Schedule {}'.format(schedule) )
+            walkTimeline(schedule, mainCtrls)
+    
+    return collections.OrderedDict(
+        (mainCtrl, LimbTiming(planTimes[mainCtrl], switchSeconds[mainCtrl], frameCounts[mainCtrl]))
+        for mainCtrl in planTimes
+    )
+
+
+def timingSummary(timings):
+    '''
+    Returns a printable table of the `switchLimbs` timings.
+    '''
+    width = max( [len('Limb')] + [len(pdil.simpleName(ctrl)) for ctrl in timings] )
+    
+    lines = [ '{:<{width}}  {:>8}  {:>8}  {:>6}'.format('Limb', 'Plan', 'Switch', 'Frames', width=width) ]
+    for ctrl, timing in timings.items():
+        lines.append( '{:<{width}}  {:>7.3f}s  {:>7.3f}s  {:>6}'.format(
+            pdil.simpleName(ctrl), timing.plan, timing.switch, timing.frames, width=width) )
+    
+    lines.append( '{:<{width}}  {:>7.3f}s  {:>7.3f}s'.format(
+        'Total', sum(t.plan for t in timings.values()), sum(t.switch for t in timings.values()), width=width) )
+    
+    return '\n'.join(lines)
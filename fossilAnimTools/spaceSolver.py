@@ -0,0 +1,193 @@
+'''
+Vectorized space switch math over whole frame ranges, independent of Maya.
+
+Switching a control's space has the same shape every frame: the local transform is the world matrix times
+the inverse of the new parent's world matrix.  Given (N, 4, 4) arrays of sampled matrices, `solveLocal`
+does every frame at once and returns Euler continuous rotations in the control's rotate order.
+
+Matrices follow Maya's row vector convention, translation in the last row, so local = world * parent^-1.
+
+    translate, rotate = solveLocal(worlds, parents, rotateOrder='zxy')
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import numpy
+
+from . import tracing
+
+
+# Same order as Maya's rotateOrder enum
+ROTATE_ORDERS = ['xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx']
+
+
+def _axes(rotateOrder):
+    ''' Returns the (first, second, third) axis indices and the parity sign of the rotate order. '''
+    if not isinstance(rotateOrder, str):
+        rotateOrder = ROTATE_ORDERS[rotateOrder]
+
+    i, j, k = ['xyz'.index(axis) for axis in rotateOrder]
+    sign = 1.0 if (j - i) % 3 == 1 else -1.0
+
+    return i, j, k, sign
+
+
+def asMatrices(values):
+    '''
+    Returns an (N, 4, 4) array from anything shaped like N matrices, ex a list of 16 float lists.
+    '''
+    return numpy.asarray(values, dtype=float).reshape(-1, 4, 4)
+
+
+def localMatrices(worlds, parents):
+    '''
+    Returns the (N, 4, 4) local matrices of the worlds relative to the parents.
+    Either can be a single (4, 4) matrix which is used for every frame.
+    '''
+    return numpy.matmul( numpy.asarray(worlds, dtype=float), numpy.linalg.inv(numpy.asarray(parents, dtype=float)) )
+
+
+def offsetMatrices(offset, drivers):
+    '''
+    Returns the (N, 4, 4) matrices of a constant (4, 4) offset from the (N, 4, 4) driver matrices,
+    ex. a space's parent matrix from the world matrix of the object driving it.
+    '''
+    return numpy.matmul( numpy.asarray(offset, dtype=float).reshape(4, 4), asMatrices(drivers) )
+
+
+def eulerToMatrix(rotations, rotateOrder='xyz'):
+    '''
+    Returns (N, 3, 3) row vector rotation matrices for the (N, 3) radian rotations.
+    '''
+    rotations = numpy.atleast_2d( numpy.asarray(rotations, dtype=float) )
+    count = len(rotations)
+
+    axisMatrices = []
+    for axis in range(3):
+        c = numpy.cos(rotations[:, axis])
+        s = numpy.sin(rotations[:, axis])
+        m = numpy.zeros( (count, 3, 3) )
+        m[:, axis, axis] = 1.0
+        a, b = [index for index in range(3) if index != axis]
+        m[:, a, a] = c
+        m[:, b, b] = c
+        # Row vector form, ex rotating about x maps y to (0, c, s)
+        if axis == 1:
+            m[:, a, b] = -s
+            m[:, b, a] = s
+        else:
+            m[:, a, b] = s
+            m[:, b, a] = -s
+        axisMatrices.append(m)
+
+    i, j, k, sign = _axes(rotateOrder)
+    return numpy.matmul( numpy.matmul(axisMatrices[i], axisMatrices[j]), axisMatrices[k] )
+
+
+def matrixToEuler(rotationMatrices, rotateOrder='xyz'):
+    '''
+    Returns (N, 3) radian rotations from (N, 3, 3) row vector rotation matrices (which must not be scaled).
+    The middle axis is within +/- pi/2.
+    '''
+    i, j, k, sign = _axes(rotateOrder)
+
+    # Transposing gives column vector form, R_k * R_j * R_i, for the standard extraction.
+    m = numpy.swapaxes( numpy.asarray(rotationMatrices, dtype=float), -1, -2 )
+
+    cosMiddle = numpy.sqrt( m[:, i, i] ** 2 + m[:, j, i] ** 2 )
+    gimbal = cosMiddle < 1e-8
+
+    first = numpy.arctan2( sign * m[:, k, j], m[:, k, k] )
+    middle = numpy.arctan2( -sign * m[:, k, i], cosMiddle )
+    last = numpy.arctan2( sign * m[:, j, i], m[:, i, i] )
+
+    # At gimbal lock, put all the rotation into the first axis
+    first = numpy.where( gimbal, numpy.arctan2(-sign * m[:, j, k], m[:, j, j]), first )
+    last = numpy.where( gimbal, 0.0, last )
+
+    rotations = numpy.zeros( (len(m), 3) )
+    rotations[:, i] = first
+    rotations[:, j] = middle
+    rotations[:, k] = last
+    return rotations
+
+
+def _wrapped(angles):
+    ''' Returns the angles wrapped to +/- pi. '''
+    return (angles + numpy.pi) % (2 * numpy.pi) - numpy.pi
+
+
+@tracing.traced()
+def eulerFilter(rotations, rotateOrder='xyz', reference=None):
+    '''
+    Returns the (N, 3) radian rotations made continuous frame to frame.
+
+    Each frame has two equivalent solutions (the first and last axes flipped by pi, the middle mirrored).
+    Whether consecutive frames are closer on the same or opposite solution doesn't depend on history, so
+    the choice is a running parity and the whole range is solved at once, then unwrapped.
+
+    Args:
+        reference: Optional (3,) radian rotation the first frame should be closest to, ex the previous key.
+    '''
+    rotations = numpy.atleast_2d( numpy.asarray(rotations, dtype=float) )
+    i, j, k, sign = _axes(rotateOrder)
+
+    flipped = rotations.copy()
+    flipped[:, i] += numpy.pi
+    flipped[:, j] = numpy.pi - flipped[:, j]
+    flipped[:, k] += numpy.pi
+
+    if reference is not None:
+        reference = numpy.asarray(reference, dtype=float).reshape(1, 3)
+        rotations = numpy.concatenate( [reference, rotations] )
+        flipped = numpy.concatenate( [reference, flipped] )
+
+    same = numpy.abs( _wrapped(rotations[1:] - rotations[:-1]) ).sum(axis=1)
+    switched = numpy.abs( _wrapped(flipped[1:] - rotations[:-1]) ).sum(axis=1)
+
+    useFlipped = numpy.concatenate( [[False], numpy.cumsum(switched < same) % 2 == 1] )
+    continuous = numpy.unwrap( numpy.where(useFlipped[:, None], flipped, rotations), axis=0 )
+
+    if reference is not None:
+        continuous = continuous[1:]
+
+    return continuous
+
+
+def decompose(matrices, rotateOrder='xyz', reference=None):
+    '''
+    Returns (translate, rotate) (N, 3) arrays of the (N, 4, 4) matrices, rotate as continuous radians.
+    Scale is removed before extracting rotation.
+    '''
+    matrices = asMatrices(matrices)
+
+    translate = matrices[:, 3, :3].copy()
+
+    rotation = matrices[:, :3, :3]
+    rotation = rotation / numpy.linalg.norm(rotation, axis=2)[:, :, None]
+
+    rotate = eulerFilter( matrixToEuler(rotation, rotateOrder), rotateOrder, reference )
+
+    return translate, rotate
+
+
+def solveLocal(worlds, parents, rotateOrder='xyz', reference=None, degrees=True):
+    '''
+    Returns the (translate, rotate) (N, 3) arrays of the local transforms for all N frames.
+
+    Args:
+        worlds: (N, 4, 4) world matrices of the control.
+        parents: (N, 4, 4) world matrices of the parent in the new space.
+        rotateOrder: Index or name of the control's rotate order.
+        reference: Optional (3,) rotation the first frame should be closest to, in the same units as output.
+        degrees: Rotation output (and reference) are in degrees instead of radians.
+    '''
+    if reference is not None and degrees:
+        reference = numpy.radians(reference)
+
+    translate, rotate = decompose( localMatrices(asMatrices(worlds), asMatrices(parents)), rotateOrder, reference )
+
+    if degrees:
+        rotate = numpy.degrees(rotate)
+
+    return translate, rotate
@@ -0,0 +1,413 @@
+'''
+Space switching over a range without moving the timeline.
+
+Switching by changing `currentTime` makes the whole scene evaluate at every frame.  Instead, the world
+matrices are sampled with context evaluation (`getAttr(time=)`), the new local transforms are computed
+against the target space and keyed directly, so the cost only depends on the controls being switched.
+
+The target space's parent matrix at any time is its driving constraint target's world matrix times a
+constant offset, which is read from the constraint target once.  Spaces that aren't a single
+parentConstraint target, and controls with pivots, a rotate axis or a joint orient, can't be solved this
+way and fall back to walking the timeline.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+from functools import partial
+import logging
+
+from maya.api import OpenMaya
+
+from pymel.core import cmds, currentTime
+
+import pdil
+from pdil.tool import fossil
+
+try:
+    from . import spaceSolver
+except ImportError:  # numpy isn't available
+    spaceSolver = None
+
+from . import evalScope
+from . import keyIndex
+from . import keySampler
+from . import keyWriter
+from . import switchEngine
+from . import tracing
+from .schedule import Schedule
+
+
+presetLog = logging.getLogger('presetSwitching')
+
+# Walks shorter than this aren't worth turning off the rest of the scene for.
+MIN_SCOPED_FRAMES = 10
+
+# Parts of a transform's local matrix the timeline free solve doesn't account for.
+PIVOT_ATTRS = ['rotatePivot', 'rotatePivotTranslate', 'scalePivot', 'scalePivotTranslate', 'rotateAxis']
+
+
+def getSpaceTimes(control, range=(None, None), curves=None):
+    '''
+    Returns the times a space is keyed on the given control.
+
+    Args:
+        curves: Optional `curveData.CurveTable` to look the keys up in, defaulting to the `keyIndex`.
+    '''
+    return switchEngine.spaceTimes( curves or keyIndex.get(), control, range[0], range[1] )
+
+
+def sampleKeyed(plug, times):
+    '''
+    Returns the keyed values of the plug at each of the times, or its current value at all of them if it's
+    unkeyed, the `sample` of `switchEngine`.
+    '''
+    plug = str(plug)
+    values = keySampler.KeyedValueSampler( [plug] ).sampleTimes(times).get(plug)
+    if values is None:  # Unkeyed, so the value is the same everywhere
+        return [cmds.getAttr(plug)] * len(times)
+
+    return values
+
+
+def unlockedChannels(control):
+    ''' Returns the translate and rotate channels of the control that aren't locked. '''
+    name = control.name()
+    return [ t + a for t in 'tr' for a in 'xyz' if not cmds.getAttr(name + '.' + t + a, lock=True) ]
+
+
+def timesToSwitch(control, times, enumVal):
+    '''
+    Returns the times the control isn't already in the space, ex. `enumVal`, reading the space curve once.
+    '''
+    return switchEngine.timesToSwitch( sampleKeyed(control.name() + '.space', times), times, enumVal )
+
+
+def performSpaceSwitch(control, targetSpace, enumVal, writer=None, channels=None):
+    '''
+    Switches the control to the target space on the current frame and keys the space, translate and rotate.
+
+    Args:
+        writer: Optional `keyWriter.KeyWriter` to buffer the keys in, instead of keying each attribute now.
+            The frames must already be limited to the ones not in the space, see `timesToSwitch`.
+        channels: The channels the writer keys, defaulting to `unlockedChannels`.
+    '''
+
+    if writer is None:
+        # Skip if already in the correct space
+        if control.space.get() == enumVal:
+            return
+
+        presetLog.debug( 'Switching {} to {}'.format(control, targetSpace) )
+        fossil.space.switchToSpace( control, targetSpace )
+
+        control.space.setKey()
+        control.t.setKey()
+        control.r.setKey()
+        return
+
+    name = control.name()
+    time = [currentTime(q=True)]
+
+    # The space key is only buffered, so an unkeyed space would stay switched on the next frames and they would
+    # be matched from the wrong space.  It's put back once the translate and rotate are read.
+    previous = cmds.getAttr(name + '.space')
+
+    presetLog.debug( 'Switching {} to {}'.format(control, targetSpace) )
+    fossil.space.switchToSpace( control, targetSpace )
+
+    writer.set( name + '.space', time, [enumVal], stepped=True )
+
+    values = dict( zip(['tx', 'ty', 'tz', 'rx', 'ry', 'rz'], cmds.getAttr(name + '.t')[0] + cmds.getAttr(name + '.r')[0]) )
+    cmds.setAttr( name + '.space', previous )
+    for channel in (unlockedChannels(control) if channels is None else channels):
+        writer.set( name + '.' + channel, time, [values[channel]] )
+
+
+@tracing.traced()
+def walkTimeline(schedule, keep=None):
+    '''
+    Walks the timeline once, visiting every frame in the `Schedule` and running the commands due there,
+    phase by phase.
+
+    Args:
+        keep: Optional list of the controls being switched.  If given, everything that can't affect them
+            is turned off during the walk with `evalScope.EvaluationScope`, unless the walk is shorter than
+            `MIN_SCOPED_FRAMES`.
+
+    Returns a Counter with the total 'frames' visited and how many frames each phase ran on, so the sum of
+    the phases minus 'frames' is how many timeline changes were saved by walking once.
+    '''
+    visits = collections.Counter()
+    if not schedule:
+        return visits
+
+    if len(schedule) < MIN_SCOPED_FRAMES:
+        keep = None
+    scope = evalScope.EvaluationScope(keep or [])
+
+    with pdil.time.preserveCurrentTime():
+        with pdil.ui.NoUpdate():
+            with scope:
+                runFrames(schedule, schedule.frames(), visits)
+
+    if keep:
+        presetLog.info( scope.report(visits['frames']) )
+
+    presetLog.debug( 'Visited {} frames: {}'.format(visits['frames'], ', '.join(
+        '{} {}'.format(phase, visits[phase]) for phase in schedule.phases)) )  # noqa e128
+
+    return visits
+
+
+def runFrames(schedule, frames, visits):
+    '''
+    Visits each of the frames, running the schedule's commands due there and counting them in the `visits`
+    Counter, see `walkTimeline`.
+    '''
+    for frame in frames:
+        currentTime(frame)
+        visits['frames'] += 1
+        tracing.count('framesVisited')
+
+        for phase, commands in schedule.commandsAt(frame):
+            visits[phase] += 1
+            for cmd in commands:
+                cmd()
+
+
+@tracing.traced()
+def sampleMatrices(plug, times):
+    '''
+    Returns a list of MMatrix of the plug, ex 'ctrl.worldMatrix[0]', evaluated at each time.
+    '''
+    tracing.count('dgEvaluations', len(times))
+    return [ OpenMaya.MMatrix(cmds.getAttr(plug, time=t)) for t in times ]
+
+
+def _spaceConstraint(ctrl):
+    '''
+    Returns (<space group>, <parentConstraint>), the space group being the first ancestor constrained on any
+    channel, or None if the group isn't entirely driven by that one parentConstraint.  A translate or rotate
+    only space (skipTranslate/skipRotate, an orientConstraint on the rotates, etc.) isn't a constant offset
+    from a single driver, so it can't be solved by `resolveTargetParent`.
+    '''
+    node = ctrl.getParent()
+    while node:
+        plugs = [ node.name() + '.' + channel for channel in switchEngine.CHANNELS ]
+        constraints = set( constraint for plug in plugs
+                           for constraint in cmds.listConnections(plug, s=True, d=False, type='constraint') or [] )  # noqa e131
+        if constraints:
+            drivers = [ cmds.listConnections(plug, s=True, d=False) or [] for plug in plugs ]
+            if len(constraints) == 1 and all( driver == list(constraints) for driver in drivers ):
+                constraint = constraints.pop()
+                if cmds.nodeType(constraint) == 'parentConstraint':
+                    return node.name(), constraint
+            return None
+        node = node.getParent()
+
+    return None
+
+
+def _hasPivots(name):
+    '''
+    True if the node's local matrix isn't just its scale, rotate and translate, ie it has pivots, a rotate axis
+    or a joint orient, which `solveTimes` doesn't account for.
+    '''
+    attrs = PIVOT_ATTRS + (['jointOrient'] if cmds.nodeType(name) == 'joint' else [])
+    return any( abs(val) > 0.00001 for attr in attrs for val in cmds.getAttr(name + '.' + attr)[0] )
+
+
+def _targetOffset(target):
+    '''
+    Returns the MMatrix of the constraint target's offset, ex 'parentConstraint1.target[0]', from its driver.
+    '''
+    angle = OpenMaya.MAngle.uiUnit()
+    distance = OpenMaya.MDistance.uiUnit()
+
+    rotate = [ OpenMaya.MAngle(val, angle).asRadians() for val in cmds.getAttr(target + '.targetOffsetRotate')[0] ]
+    translate = [ OpenMaya.MDistance(val, distance).asCentimeters()
+                  for val in cmds.getAttr(target + '.targetOffsetTranslate')[0] ]  # noqa e131
+
+    values = list( OpenMaya.MEulerRotation(*rotate).asMatrix() )
+    values[12:15] = translate
+    return OpenMaya.MMatrix(values)
+
+
+def resolveTargetParent(ctrl, targetSpace):
+    '''
+    Returns (<driver node>, <offset MMatrix>) such that the control's parent matrix in the target space is
+    offset * driver world matrix, or None if the space can't be resolved that way.
+
+    Nothing is changed, the space's enum value is the index of its target on the constraint, since
+    `fossil.space` adds them together, and the offset is read from that target.  Anything between the space
+    group and the control is assumed to stay put.
+    '''
+    if _hasPivots(ctrl.name()):
+        return None
+
+    found = _spaceConstraint(ctrl)
+    if not found:
+        return None
+    group, constraint = found
+
+    targets = cmds.parentConstraint(constraint, q=True, targetList=True) or []
+    index = ctrl.space.getEnums()[targetSpace]
+    if index >= len(targets) or _hasPivots(targets[index]):
+        return None
+
+    offset = _targetOffset( '{}.target[{}]'.format(constraint, index) )
+
+    if group == ctrl.getParent().name():  # Usually nothing is in between
+        return targets[index], offset
+
+    parent = OpenMaya.MMatrix( cmds.getAttr(ctrl.name() + '.parentMatrix[0]') )
+    groupInverse = OpenMaya.MMatrix( cmds.getAttr(group + '.worldInverseMatrix[0]') )
+
+    return targets[index], parent * groupInverse * offset
+
+
+@tracing.traced()
+def switchTimes(ctrl, targetSpace, times, targetParent=None, writer=None):
+    '''
+    Switches the control to the target space at each of the times without changing the current time,
+    keying the space, translate and rotate.  Frames already in the target space are skipped.
+
+    Args:
+        targetParent: The result of `resolveTargetParent`, if already known.
+        writer: Optional `keyWriter.KeyWriter` to add the keys to, otherwise they are written immediately.
+
+    Returns True if switched, False if the space couldn't be resolved.
+    '''
+    targetParent = targetParent or resolveTargetParent(ctrl, targetSpace)
+    if not targetParent:
+        return False
+
+    driver, offset = targetParent
+
+    name = ctrl.name()
+    enumVal = ctrl.space.getEnums()[targetSpace]
+
+    times = timesToSwitch(ctrl, times, enumVal)
+    if not times:
+        return True
+
+    channels = solveTimes(name, driver, offset, times)
+
+    with keyWriter.using(writer) as writer:
+        writer.set( name + '.space', times, [enumVal] * len(times), stepped=True )
+        for channel in unlockedChannels(ctrl):
+            writer.set( name + '.' + channel, times, channels[channel] )
+
+    return True
+
+
+@tracing.traced()
+def solveTimes(name, driver, offset, times):
+    '''
+    Returns { <channel>: [<values>] } of the named control's translate and rotate, in ui units, at each of the
+    times if its parent matrix were offset * the driver's world matrix, see `resolveTargetParent`.
+    Nothing is changed, so separate ranges of times can be solved independently.
+    '''
+    worlds = sampleMatrices( name + '.worldMatrix[0]', times )
+    drivers = sampleMatrices( driver + '.worldMatrix[0]', times )
+
+    order = cmds.getAttr( name + '.rotateOrder' )
+
+    if spaceSolver:
+        return _solveVectorized(worlds, drivers, offset, order)
+    else:
+        return _solvePerFrame(worlds, drivers, offset, order)
+
+
+def _toUiUnits(channels):
+    ''' Converts { <channel>: [<internal values>] } of translate and rotate channels to ui units in place. '''
+    linearUnit = OpenMaya.MDistance.uiUnit()
+    angularUnit = OpenMaya.MAngle.uiUnit()
+
+    for channel, values in channels.items():
+        if channel.startswith('t'):
+            channels[channel] = [ OpenMaya.MDistance(val).asUnits(linearUnit) for val in values ]
+        else:
+            channels[channel] = [ OpenMaya.MAngle(val).asUnits(angularUnit) for val in values ]
+
+    return channels
+
+
+def _solveVectorized(worlds, drivers, offset, order):
+    '''
+    Returns { <channel>: [<values>] } of the local transforms with `spaceSolver`.
+    '''
+    parents = spaceSolver.offsetMatrices( list(offset), [list(m) for m in drivers] )
+    return _toUiUnits( switchEngine.solveSpace([list(m) for m in worlds], parents, order, degrees=False) )
+
+
+def _solvePerFrame(worlds, drivers, offset, order):
+    '''
+    Returns { <channel>: [<values>] } of the local transforms one frame at a time with MTransformationMatrix.
+    '''
+    channels = {channel: [] for channel in ['tx', 'ty', 'tz', 'rx', 'ry', 'rz']}
+    previous = None
+    for world, driverWorld in zip(worlds, drivers):
+        local = OpenMaya.MTransformationMatrix( world * (offset * driverWorld).inverse() )
+
+        rotation = local.rotation().reorder(order)
+        if previous is not None:
+            rotation = rotation.closestSolution(previous)
+        previous = rotation
+
+        trans = local.translation(OpenMaya.MSpace.kTransform)
+        for axis, val in zip('xyz', (trans.x, trans.y, trans.z)):
+            channels['t' + axis].append(val)
+        for axis, val in zip('xyz', (rotation.x, rotation.y, rotation.z)):
+            channels['r' + axis].append(val)
+
+    return _toUiUnits(channels)
+
+
+def switchRange(ctrl, targetSpace, range):
+    '''
+    Timeline free replacement for `fossil.space.switchRange`, falling back to the timeline if the space
+    can't be sampled in context.
+    '''
+    return switchRanges( [(ctrl, targetSpace)], range, timelineFree=True )
+
+
+@tracing.traced()
+def switchRanges(controlSpaces, range, timelineFree=False):
+    '''
+    Switches several controls over the range together, walking the timeline at most once for the union of
+    the frames they need, instead of once per control.
+
+    Args:
+        controlSpaces: List of [ (<control>, <target space name>), ... ]
+        range: (start, end), either can be None to be unbounded.
+        timelineFree: Switch with `switchTimes` where possible, only walking for spaces that can't be resolved.
+
+    Returns the visit Counter from `walkTimeline`.
+    '''
+    schedule = Schedule(['space'])
+    curves = keyIndex.get()
+    curves.read( [ctrl for ctrl, targetSpace in controlSpaces] )
+
+    # Every key is buffered and written once the walk is done.
+    with keyWriter.KeyWriter(curves) as writer:
+        for ctrl, targetSpace in controlSpaces:
+            times = getSpaceTimes(ctrl, range, curves)
+            if not times:
+                fossil.space.switchToSpace(ctrl, targetSpace)
+                continue
+
+            if timelineFree and switchTimes(ctrl, targetSpace, times, writer=writer):
+                continue
+
+            # Frames already in the space are left out of the walk entirely.
+            enumVal = ctrl.space.getEnums()[targetSpace]
+            times = timesToSwitch(ctrl, times, enumVal)
+            if times:
+                schedule.add( 'space', partial(performSpaceSwitch, ctrl, targetSpace, enumVal, writer,
+                                               unlockedChannels(ctrl)), times )  # noqa e127
+
+        visits = walkTimeline( schedule, [ctrl for ctrl, targetSpace in controlSpaces] )
+
+    return visits
@@ -76,7 +76,27 @@ class Ui_Form(object):
         self.applyAll = QtWidgets.QPushButton(self.frame)
         self.applyAll.setObjectName("applyAll")
         self.horizontalLayout_4.addWidget(self.applyAll)
+        self.reapplyDirty = QtWidgets.QPushButton(self.frame)
+        self.reapplyDirty.setObjectName("reapplyDirty")
+        self.horizontalLayout_4.addWidget(self.reapplyDirty)
         self.verticalLayout.addLayout(self.horizontalLayout_4)
+        self.horizontalLayout_5 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_5.setObjectName("horizontalLayout_5")
+        self.background = QtWidgets.QCheckBox(self.frame)
+        self.background.setObjectName("background")
+        self.horizontalLayout_5.addWidget(self.background)
+        self.compactUndo = QtWidgets.QCheckBox(self.frame)
+        self.compactUndo.setObjectName("compactUndo")
+        self.horizontalLayout_5.addWidget(self.compactUndo)
+        self.progress = QtWidgets.QProgressBar(self.frame)
+        self.progress.setProperty("value", 0)
+        self.progress.setObjectName("progress")
+        self.horizontalLayout_5.addWidget(self.progress)
+        self.cancelApply = QtWidgets.QPushButton(self.frame)
+        self.cancelApply.setEnabled(False)
+        self.cancelApply.setObjectName("cancelApply")
+        self.horizontalLayout_5.addWidget(self.cancelApply)
+        self.verticalLayout.addLayout(self.horizontalLayout_5)
         self.verticalLayout_2.addWidget(self.frame)
         self.addControls = QtWidgets.QPushButton(Form)
         self.addControls.setObjectName("addControls")
@@ -116,6 +136,13 @@ class Ui_Form(object):
         self.applyRange.setText(QtWidgets.QApplication.translate("Form", "Range", None, -1))
         self.applySelected.setText(QtWidgets.QApplication.translate("Form", "Selected", None, -1))
         self.applyAll.setText(QtWidgets.QApplication.translate("Form", "All", None, -1))
+        self.reapplyDirty.setToolTip(QtWidgets.QApplication.translate("Form", "Switch again only where keys were edited since the last apply", None, -1))
+        self.reapplyDirty.setText(QtWidgets.QApplication.translate("Form", "Reapply Dirty", None, -1))
+        self.background.setToolTip(QtWidgets.QApplication.translate("Form", "Apply ranges a chunk of frames at a time while Maya is idle, so it can be cancelled.  Uses the same switching as the Apply buttons", None, -1))
+        self.background.setText(QtWidgets.QApplication.translate("Form", "Background", None, -1))
+        self.compactUndo.setToolTip(QtWidgets.QApplication.translate("Form", "Switch ranges with undo disabled, undoing restores a copy of the curves made before", None, -1))
+        self.compactUndo.setText(QtWidgets.QApplication.translate("Form", "Compact Undo", None, -1))
+        self.cancelApply.setText(QtWidgets.QApplication.translate("Form", "Cancel", None, -1))
         self.addControls.setText(QtWidgets.QApplication.translate("Form", "Add Selected Controls", None, -1))
         self.profileTable.horizontalHeaderItem(0).setText(QtWidgets.QApplication.translate("Form", "New Column", None, -1))
         self.profileTable.horizontalHeaderItem(1).setText(QtWidgets.QApplication.translate("Form", "New Column", None, -1))
@@ -0,0 +1,486 @@
+'''
+The switching logic of `spacePresets` and `spaceSwitching` on plain key arrays, independent of Maya.
+
+Planning a switch only needs the key times of the controls, the values of the ik/fk switcher and space enum
+curves and, for space switches, the world matrices of the control and of the parent in each space.  Every
+function here takes those through a few small interfaces, so the same code runs on the live scene and on
+animation exported to an `AnimModel`:
+
+    curves: The key queries of a `curveData.CurveTable`, `keyTimes`, `keyRange`, `hasKeys`, `keys` and `curvesOf`.
+    sample: sample(plug, times) returning the keyed values of the plug at the times, its value if unkeyed.
+    writer: The `set`, `insert` and `delete` edits of a `keyWriter.KeyWriter`.
+
+`spacePresets` and `spaceSwitching` pass the key index, `spaceSwitching.sampleKeyed` and a `KeyWriter`.
+`switch` applies a whole preset to a model and returns the edits, which are what the Maya path writes,
+except the values of the kinematic matches, which need the rig, so their times are returned instead.
+
+    model = AnimModel.fromDict( json.load(fid) )
+    result = switch( model, {'Wrist_ctrl': 'world'}, (1, 100) )
+    result.edits    # { <plug>: [ ('set', (<times>, <values>, <stepped>)), ('delete', ...), ... ] }
+    result.matches  # { <main control>: <times the limb is matched to the other motion> }
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+import collections
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from . import spaceSolver
+except ImportError:  # numpy isn't available
+    spaceSolver = None
+
+
+ACTIVATE_KEY = '# Activate'
+
+SPACE_ATTRS = ['space'] + [t + a for t in 'tr' for a in 'xyz']
+
+CHANNELS = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz']
+
+
+def isClose(a, b, tolerance=0.0001):
+    return abs(a - b) <= tolerance
+
+
+def spaceTimes(curves, control, start=None, end=None):
+    '''
+    Returns the times the space, translate or rotate of the control are keyed from start to end.
+    '''
+    return curves.keyTimes( [control], SPACE_ATTRS, start, end )
+
+
+def limbKeyTimes(curves, controls, start, end):
+    '''
+    Returns the times any of the controls are keyed from start to end, plus the start and end (if given),
+    or an empty list if they have no keys at all.
+    '''
+    if curves.keyRange(controls) == (None, None):
+        return []
+
+    times = set( curves.keyTimes(controls, start=start, end=end) )
+    times.update( t for t in (start, end) if t is not None )
+
+    return sorted(times)
+
+
+def timesToSwitch(values, times, enumVal):
+    '''
+    Returns the times whose sampled space value isn't already `enumVal`.
+    '''
+    return [ t for t, val in zip(times, values) if int(round(val)) != enumVal ]
+
+
+def keySwitcher(curves, sample, writer, switcher, times):
+    '''
+    Keys the switcher at all the times without changing it.
+    '''
+    if not curves.hasKeys(switcher):
+        writer.set( switcher, times[:1], sample(switcher, times[:1]) )
+
+    writer.insert( switcher, times )
+
+
+def killTimes(curves, sample, switcher, times, target, isClose=isClose):
+    '''
+    Returns the times from the first to last of `times`, keys of the switcher included, where the switcher
+    isn't at the target, ie the other motion is active to some extent.
+    '''
+    keyTimes = curves.keys(switcher, times[0], times[-1])[0]
+    checkTimes = sorted( set(float(t) for t in keyTimes).union(times) )
+
+    return [ t for t, val in zip(checkTimes, sample(switcher, checkTimes)) if not isClose(val, target) ]
+
+
+def cleanTargetKeys(curves, sample, writer, switcher, controls, times, target, isClose=isClose):
+    '''
+    Makes sure the switcher is keyed at all the given times and the controls are unkeyed wherever the
+    other motion is active, since the match will key them.
+    '''
+    if not times:
+        return
+
+    # A single key anchors the value, the rest are inserted
+    if not curves.hasKeys(switcher):
+        writer.set( switcher, times[:1], sample(switcher, times[:1]) )
+
+    # The edits are buffered, so the switcher is still evaluated as it was before the inserts.
+    writer.delete( controls, times=killTimes(curves, sample, switcher, times, target, isClose) )
+
+    writer.insert( switcher, times )
+
+
+KinematicPlan = collections.namedtuple( 'KinematicPlan', 'action times' )
+KinematicPlan.__doc__ = '''
+The switch of a limb to a motion, action is one of
+    None: Already in the motion, nothing to do.
+    'now': Neither motion is keyed, switch on the current frame.
+    'range': Only the target motion is keyed, its keys in the range are deleted and it's matched at the ends.
+    'keys': Matched at every key of the other motion, the switcher keyed and the target's keys cleaned.
+'''
+
+
+def planKinematic(otherTimes, targetTimes, keyRange, needsSwitch):
+    '''
+    Returns the `KinematicPlan` from the `limbKeyTimes` of both motions.
+
+    Args:
+        keyRange: (start, end), unbounded ends of the 'range' action are the target's first and last keys.
+        needsSwitch: The switcher isn't at the target motion on the current frame.
+    '''
+    if not needsSwitch:
+        return KinematicPlan(None, [])
+
+    if not otherTimes and not targetTimes:
+        return KinematicPlan('now', [])
+
+    if not otherTimes:
+        start = targetTimes[0] if keyRange[0] is None else keyRange[0]
+        end = targetTimes[-1] if keyRange[1] is None else keyRange[1]
+        return KinematicPlan('range', sorted({start, end}))
+
+    return KinematicPlan('keys', otherTimes)
+
+
+def planLimb(curves, sample, writer, limb, keyRange, currentTime, kinematicKeyed=None, isClose=isClose):
+    '''
+    Plans switching the limb to its motion, adding the key cleanup to the writer.  Returns the `KinematicPlan`.
+
+    Args:
+        limb: The `Limb` being switched to.
+        keyRange: (start, end), either can be None to be unbounded.
+        currentTime: The frame the switcher is checked on.
+        kinematicKeyed: Optional { <control>: set(<times>) } updated with the times the match keys each control.
+    '''
+    otherTimes = limbKeyTimes( curves, limb.otherControls, keyRange[0], keyRange[1] )
+    targetTimes = limbKeyTimes( curves, limb.controls, keyRange[0], keyRange[1] )
+
+    needsSwitch = sample(limb.switcher, [currentTime])[0] != limb.motion
+    plan = planKinematic( otherTimes, targetTimes, keyRange, needsSwitch )
+
+    if plan.action == 'range':
+        writer.delete( limb.controls, start=keyRange[0], end=keyRange[1] )
+
+    elif plan.action == 'keys':
+        # Keys the switcher at the times as well
+        cleanTargetKeys( curves, sample, writer, limb.switcher, limb.controls, plan.times, limb.motion, isClose )
+
+    if kinematicKeyed is not None:
+        for control in limb.controls:
+            kinematicKeyed[control].update( plan.times )
+
+    return plan
+
+
+def switchSpaceTimes(curves, control, keyRange, kinematicKeyed=None):
+    '''
+    Returns the times the control needs switching, its space keys and the times the kinematic matches key it.
+    '''
+    times = set( spaceTimes(curves, control, keyRange[0], keyRange[1]) )
+    times.update( (kinematicKeyed or {}).get(control, ()) )
+    return sorted(times)
+
+
+def solveSpace(worlds, parents, rotateOrder=0, degrees=True):
+    '''
+    Returns { <channel>: [<values>] } of the control's local translate and rotate at each frame when its
+    parent matrix is `parents`, see `spaceSolver.solveLocal`.
+    '''
+    translate, rotate = spaceSolver.solveLocal( worlds, parents, rotateOrder, degrees=degrees )
+
+    channels = {}
+    for i, axis in enumerate('xyz'):
+        channels['t' + axis] = translate[:, i].tolist()
+        channels['r' + axis] = rotate[:, i].tolist()
+
+    return channels
+
+
+class Curve(object):
+    '''
+    The keys of one anim curve, evaluated linearly between keys, or holding each key's value if `stepped`,
+    and flat beyond the ends.  The Maya path samples the real curves instead, so curves with spline tangents
+    only give the same values at their keys.
+    '''
+
+    def __init__(self, times=(), values=(), stepped=False):
+        self.times = [float(t) for t in times]
+        self.values = [float(v) for v in values]
+        self.stepped = stepped
+
+    def __len__(self):
+        return len(self.times)
+
+    def slice(self, start=None, end=None):
+        ''' Returns the (lo, hi) indices of the keys from start to end inclusive. '''
+        lo = 0 if start is None else bisect.bisect_left(self.times, start)
+        hi = len(self.times) if end is None else bisect.bisect_right(self.times, end)
+        return lo, hi
+
+    def sample(self, times):
+        ''' Returns the values at the times. '''
+        if not self.times:
+            return [0.0] * len(times)
+
+        if numpy and not self.stepped:
+            return numpy.interp( numpy.asarray(times, dtype=float), self.times, self.values ).tolist()
+
+        values = []
+        for t in times:
+            i = bisect.bisect_right(self.times, t)
+            if i == 0:
+                values.append( self.values[0] )
+            elif i == len(self.times) or self.stepped:
+                values.append( self.values[i - 1] )
+            else:
+                t0, t1 = self.times[i - 1], self.times[i]
+                v0, v1 = self.values[i - 1], self.values[i]
+                values.append( v0 + (v1 - v0) * (t - t0) / (t1 - t0) )
+
+        return values
+
+    def set(self, times, values):
+        ''' Keys the times with the values, replacing existing keys. '''
+        keys = dict( zip(self.times, self.values) )
+        keys.update( zip((float(t) for t in times), (float(v) for v in values)) )
+        self.times = sorted(keys)
+        self.values = [keys[t] for t in self.times]
+
+    def insert(self, times):
+        ''' Adds keys at the times without changing the values. '''
+        existing = set(self.times)
+        times = [float(t) for t in times if float(t) not in existing]
+        if times:
+            self.set( times, self.sample(times) )
+
+    def delete(self, times=None, start=None, end=None):
+        ''' Removes the keys at the times or, if not given, from start to end inclusive. '''
+        if times is not None:
+            remove = set(float(t) for t in times)
+            keep = [i for i, t in enumerate(self.times) if t not in remove]
+        else:
+            lo, hi = self.slice(start, end)
+            keep = list( range(lo) ) + list( range(hi, len(self.times)) )
+
+        self.times = [self.times[i] for i in keep]
+        self.values = [self.values[i] for i in keep]
+
+
+Limb = collections.namedtuple( 'Limb', 'controls otherControls switcher motion' )
+Limb.__doc__ = '''
+One motion of a limb, controls starting with the main control, the other motion's controls, the ik/fk
+switcher plug and the switcher value when this motion is active, 0 for fk and 1 for ik.
+'''
+
+Space = collections.namedtuple( 'Space', 'enums rotateOrder worlds parents channels' )
+Space.__doc__ = '''
+The space switching of a control, { <space name>: <enum value> }, its rotate order, its world matrices
+{ <time>: <16 floats> }, the parent matrices of each space { <space name>: { <time>: <16 floats> } } and the
+channels that can be keyed.
+'''
+
+
+class AnimModel(object):
+    '''
+    Exported animation, the curves of the keyed plugs and the values of unkeyed ones, with the limbs and
+    spaces of the controls.  It has the query methods of a `curveData.CurveTable`, with plugs as the curve
+    names, and `sample`, so it can be passed as both.
+
+    Args:
+        curves: { <plug>: `Curve` }
+        values: { <plug>: <value> } of the unkeyed plugs, unlisted ones are 0.
+        limbs: { <control>: `Limb` } of every control of a limb that can be switched.
+        spaces: { <control>: `Space` }
+        currentTime: The frame the model is at.
+    '''
+
+    def __init__(self, curves=None, values=None, limbs=None, spaces=None, currentTime=0.0):
+        self.curves = curves or {}
+        self.values = values or {}
+        self.limbs = limbs or {}
+        self.spaces = spaces or {}
+        self.currentTime = currentTime
+
+    @classmethod
+    def fromDict(cls, data):
+        '''
+        Returns a model from json style data, the `Curve`, `Limb` and `Space` fields as dicts, the curves'
+        times and values as lists and times as strings in the matrix dicts.
+        '''
+        def matrices(byTime):
+            return { float(t): matrix for t, matrix in byTime.items() }
+
+        return cls(
+            curves={ plug: Curve(**curve) for plug, curve in data.get('curves', {}).items() },
+            values=data.get('values'),
+            limbs={ ctrl: Limb(**limb) for ctrl, limb in data.get('limbs', {}).items() },
+            spaces={ ctrl: Space(space['enums'], space.get('rotateOrder', 0), matrices(space['worlds']),
+                                 { name: matrices(byTime) for name, byTime in space['parents'].items() },
+                                 space.get('channels', CHANNELS))  # noqa e128
+                     for ctrl, space in data.get('spaces', {}).items() },  # noqa e131
+            currentTime=data.get('currentTime', 0.0),
+        )
+
+    def _plugs(self, node):
+        return [ plug for plug in self.curves if plug.split('.')[0] == node ]
+
+    def curveName(self, plug):
+        return plug if plug in self.curves else None
+
+    def curvesOf(self, nodes, attrs=None):
+        plugs = []
+        for node in nodes:
+            node = str(node)
+            if attrs is None:
+                plugs += self._plugs(node)
+            else:
+                plugs += [ node + '.' + attr for attr in attrs if node + '.' + attr in self.curves ]
+        return plugs
+
+    def hasKeys(self, plug):
+        return len( self.curves.get(str(plug), ()) ) > 0
+
+    def keys(self, plug, start=None, end=None):
+        curve = self.curves.get(str(plug))
+        if not curve:
+            return [], []
+        lo, hi = curve.slice(start, end)
+        return curve.times[lo:hi], curve.values[lo:hi]
+
+    def keyTimes(self, nodes, attrs=None, start=None, end=None):
+        return sorted( set(itertools.chain.from_iterable(
+            self.keys(plug, start, end)[0] for plug in self.curvesOf(nodes, attrs))) )
+
+    def keyRange(self, nodes, attrs=None):
+        times = self.keyTimes(nodes, attrs)
+        return (times[0], times[-1]) if times else (None, None)
+
+    def sample(self, plug, times):
+        plug = str(plug)
+        if plug in self.curves and len(self.curves[plug]):
+            return self.curves[plug].sample(times)
+        return [ self.values.get(plug, 0.0) ] * len(times)
+
+
+class ModelWriter(object):
+    '''
+    Buffers edits to an `AnimModel` like a `keyWriter.KeyWriter`, applying them on `flush`.  Every edit
+    flushed is kept in `edits` { <plug>: [ (<op>, <args>), ... ] }, the same records a `KeyWriter` buffers.
+    '''
+
+    def __init__(self, model):
+        self.model = model
+        self.edits = collections.OrderedDict()
+        self._pending = []  # [ (<plug>, <op>, <args>), ... ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if excType:
+            self._pending = []
+        else:
+            self.flush()
+
+    def set(self, plug, times, values, stepped=False):
+        if len(times):
+            self._pending.append( (str(plug), 'set', (list(times), list(values), stepped)) )
+
+    def insert(self, plug, times):
+        if len(times):
+            self._pending.append( (str(plug), 'insert', (list(times),)) )
+
+    def delete(self, nodes, times=None, start=None, end=None, attrs=None):
+        if times is not None and not len(times):
+            return
+        for plug in self.model.curvesOf(nodes, attrs):
+            self._pending.append( (plug, 'delete', (times, start, end)) )
+
+    def flush(self):
+        ''' Applies the buffered edits to the model.  Returns the number of curves edited. '''
+        edited = set()
+        for plug, op, args in self._pending:
+            curve = self.model.curves.get(plug)
+            if curve is None:
+                curve = self.model.curves[plug] = Curve()
+                if op == 'insert':  # Unkeyed, so keyed with its current value
+                    op, args = 'set', (args[0], [self.model.values.get(plug, 0.0)] * len(args[0]), False)
+
+            if op == 'set':
+                if args[2]:
+                    curve.stepped = True
+                curve.set( args[0], args[1] )
+            elif op == 'insert':
+                curve.insert( args[0] )
+            else:
+                curve.delete( *args )
+
+            self.edits.setdefault( plug, [] ).append( (op, args) )
+            edited.add(plug)
+
+        self._pending = []
+        return len(edited)
+
+
+Result = collections.namedtuple( 'Result', 'edits matches immediate' )
+Result.__doc__ = '''
+What `switch` did, the key `edits` of the `ModelWriter`, the { <main control>: [<times>] } kinematic
+`matches` and the `immediate` list of (<control>, <motion or space>) switched on the current frame only.
+'''
+
+
+def switch(model, preset, keyRange):
+    '''
+    Applies the preset to the model over the key range like a legacy range `spacePresets.apply`, returning
+    the `Result`.  The model's curves are edited, except for the matches.
+
+    Args:
+        preset: { <control>: <space name or ACTIVATE_KEY> }
+        keyRange: (start, end), either can be None to be unbounded.
+    '''
+    matches = collections.OrderedDict()
+    immediate = []
+    kinematicKeyed = collections.defaultdict(set)
+
+    writer = ModelWriter(model)
+    with writer:
+        for ctrl in preset:
+            limb = model.limbs.get(ctrl)
+            if not limb or limb.controls[0] in matches:
+                continue
+
+            plan = planLimb( model, model.sample, writer, limb, keyRange, model.currentTime, kinematicKeyed )
+            if plan.action == 'now':
+                immediate.append( (limb.controls[0], limb.motion) )
+            elif plan.action:
+                matches[limb.controls[0]] = plan.times
+
+    for ctrl, targetSpace in preset.items():
+        space = model.spaces.get(ctrl)
+        if targetSpace == ACTIVATE_KEY or not space:
+            continue
+
+        enumVal = space.enums[targetSpace]
+        times = switchSpaceTimes( model, ctrl, keyRange, kinematicKeyed )
+        if not times:
+            immediate.append( (ctrl, targetSpace) )
+            continue
+
+        times = timesToSwitch( model.sample(ctrl + '.space', times), times, enumVal )
+        if not times:
+            continue
+
+        channels = solveSpace( [space.worlds[t] for t in times], [space.parents[targetSpace][t] for t in times],
+                               space.rotateOrder )  # noqa e128
+
+        with writer:
+            writer.set( ctrl + '.space', times, [enumVal] * len(times), stepped=True )
+            for channel in space.channels:
+                writer.set( ctrl + '.' + channel, times, channels[channel] )
+
+    return Result( writer.edits, matches, immediate )
@@ -0,0 +1,94 @@
+'''
+Worker process for `workerPool`, solving timeline free space switches of a saved scene.
+
+Reads one json job per line from stdin and answers each with one json line on stdout, either
+{"channels": { <channel>: [<values>] }} or {"error": "<message>"}.  A job is
+
+    {"scene": <path>, "control": <name>, "driver": <name>, "offset": [<16 floats>], "times": [...]}
+
+and is solved with `spaceSwitching.solveTimes`, opening the scene only when it changes.
+
+    mayapy -m fossilAnimTools.switchWorker
+    python -m fossilAnimTools.switchWorker --stand-in
+
+The stand-in doesn't need Maya, it answers every channel with the times themselves so the pool and the
+merging of chunks can be tested anywhere.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import sys
+
+
+CHANNELS = ['tx', 'ty', 'tz', 'rx', 'ry', 'rz']
+
+
+def standIn(job):
+    ''' Solves a job without Maya, every channel's values are the times. '''
+    return { channel: [float(t) for t in job['times']] for channel in CHANNELS }
+
+
+class MayaSolver(object):
+    ''' Solves jobs in the scene they name, opening it when it's different from the last job's. '''
+
+    def __init__(self):
+        self.scene = None
+
+    def __call__(self, job):
+        from maya import cmds
+        from maya.api import OpenMaya
+
+        from fossilAnimTools import spaceSwitching
+
+        if job['scene'] != self.scene:
+            cmds.file( job['scene'], open=True, force=True )
+            self.scene = job['scene']
+
+        channels = spaceSwitching.solveTimes( job['control'], job['driver'], OpenMaya.MMatrix(job['offset']), job['times'] )
+        return { channel: list(values) for channel, values in channels.items() }
+
+
+def serve(solve, stdin, stdout):
+    '''
+    Answers the jobs on stdin until it's closed.
+    '''
+    for line in stdin:
+        if not line.strip():
+            continue
+
+        try:
+            result = {'channels': solve(json.loads(line))}
+        except Exception as e:
+            result = {'error': '{}: {}'.format(type(e).__name__, e)}
+
+        stdout.write( json.dumps(result) + '\n' )
+        stdout.flush()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if '--stand-in' in argv:
+        serve( standIn, sys.stdin, sys.stdout )
+        return
+
+    # Maya prints to stdout, so the answers get their own copy of it and everything else goes to stderr.  That has
+    # to happen before Maya starts, which importing the package doesn't do, see `fossilAnimTools/__init__.py`.
+    if 'maya.cmds' in sys.modules:
+        raise RuntimeError( 'Maya was started before the worker could redirect its output' )
+
+    protocol = os.fdopen( os.dup(sys.stdout.fileno()), 'w' )
+    os.dup2( sys.stderr.fileno(), sys.stdout.fileno() )
+
+    import maya.standalone
+    maya.standalone.initialize(name='python')
+    try:
+        serve( MayaSolver(), sys.stdin, protocol )
+    finally:
+        maya.standalone.uninitialize()
+
+
+if __name__ == '__main__':
+    main()
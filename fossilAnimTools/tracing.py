@@ -0,0 +1,223 @@
+'''
+Records where switching spends its time, as spans and counters that export to the Chrome trace format.
+
+    tracing.enable()
+    spacePresets.apply( preset, 'range' )
+    print( tracing.summary() )
+    tracing.exportChromeTrace( 'apply.json' )  # Open in chrome://tracing or https://ui.perfetto.dev
+    tracing.disable()
+
+The tools time their phases with `span` and `traced` (planning, key reads, timeline walks, key writes,
+Euler filtering) and add to counters with `count` (frames visited, keys written, DG evaluations).  Each span
+records how much every counter grew while it was open.
+
+When tracing is disabled, `span` returns a shared context that does nothing and `count` returns immediately,
+so the instrumented code only pays for a function call.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import functools
+import json
+import os
+import threading
+from timeit import default_timer
+
+
+if '_collector' not in globals():
+    _collector = None
+
+if '_last' not in globals():
+    _last = None  # The collector of the last `disable`
+
+
+class Collector(object):
+    '''
+    Holds the finished spans and the counter totals in memory.
+
+    `spans` is a list of `Span` in the order they finished, `counters` a Counter of the totals and `samples`
+    [ (<seconds>, { <counter>: <total> }), ... ] of the totals each time a span finished with them changed.
+    '''
+
+    def __init__(self):
+        self.start = default_timer()
+        self.spans = []
+        self.counters = collections.Counter()
+        self.samples = []
+
+    def summary(self):
+        '''
+        Returns a printable table of the total seconds and count of each span name, then the counters.
+        '''
+        totals = collections.OrderedDict()
+        for span in sorted(self.spans, key=lambda span: span.start):
+            seconds, calls = totals.get(span.name, (0.0, 0))
+            totals[span.name] = (seconds + span.seconds, calls + 1)
+
+        width = max( [len('Span')] + [len(name) for name in totals] + [len(name) for name in self.counters] )
+
+        lines = [ '{:<{width}}  {:>9}  {:>6}'.format('Span', 'Seconds', 'Calls', width=width) ]
+        for name, (seconds, calls) in totals.items():
+            lines.append( '{:<{width}}  {:>8.3f}s  {:>6}'.format(name, seconds, calls, width=width) )
+
+        for name, total in sorted(self.counters.items()):
+            lines.append( '{:<{width}}  {:>9}'.format(name, total, width=width) )
+
+        return '\n'.join(lines)
+
+    def toChromeTrace(self):
+        '''
+        Returns the spans as complete ("X") events and the counters as counter ("C") events of the Chrome
+        trace event format, in microseconds from when the collector was made.
+        '''
+        pid = os.getpid()
+        toMicroseconds = lambda seconds: round( (seconds - self.start) * 1e6, 3 )  # noqa e731
+
+        events = []
+        for span in self.spans:
+            events.append( {'name': span.name, 'cat': span.category, 'ph': 'X', 'pid': pid, 'tid': span.thread,
+                            'ts': toMicroseconds(span.start), 'dur': round(span.seconds * 1e6, 3),
+                            'args': span.args} )  # noqa e127
+
+        for seconds, totals in self.samples:
+            for name, total in totals.items():
+                events.append( {'name': name, 'ph': 'C', 'pid': pid, 'tid': 0, 'ts': toMicroseconds(seconds),
+                                'args': {name: total}} )  # noqa e127
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def exportChromeTrace(self, path):
+        ''' Writes the `toChromeTrace` json to the path. '''
+        with open(path, 'w') as fid:
+            json.dump(self.toChromeTrace(), fid)
+
+
+class Span(object):
+    '''
+    Context manager timing a block into a `Collector`, see `span`.
+
+    Once finished, `seconds` is how long it was open and `args` has the arguments given to `span`, as
+    strings, and how much each counter grew.
+    '''
+
+    def __init__(self, collector, name, category, args):
+        self.collector = collector
+        self.name = name
+        self.category = category
+        self.args = args
+        self.thread = threading.current_thread().ident
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self._counters = self.collector.counters.copy()
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        end = default_timer()
+        self.seconds = end - self.start
+
+        counters = self.collector.counters
+        self.args = { key: str(value) for key, value in self.args.items() }
+        self.args.update( (name, total - self._counters[name]) for name, total in counters.items()
+                          if total != self._counters[name] )  # noqa e127
+        if excType:
+            self.args['error'] = excType.__name__
+
+        if not self.collector.samples or self.collector.samples[-1][1] != counters:
+            self.collector.samples.append( (end, dict(counters)) )
+        self.collector.spans.append(self)
+
+
+class _NoSpan(object):
+    ''' The span given when tracing is disabled. '''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        pass
+
+
+_noSpan = _NoSpan()
+
+
+def span(name, category='switch', **args):
+    '''
+    Returns a context manager recording the block as a span with the name, if tracing is enabled.
+
+    Args:
+        category: Groups the span in the trace viewer.
+        args: Shown with the span, only converted to strings if tracing is enabled, so nodes can be passed.
+    '''
+    if _collector is None:
+        return _noSpan
+
+    return Span(_collector, name, category, args)
+
+
+def traced(name=None, category='switch'):
+    '''
+    Decorator recording every call of the function as a span, named after the function by default.
+    '''
+    def decorate(func):
+        spanName = name or func.__name__
+
+        @functools.wraps(func)
+        def tracedFunc(*args, **kwargs):
+            if _collector is None:
+                return func(*args, **kwargs)
+
+            with Span(_collector, spanName, category, {}):
+                return func(*args, **kwargs)
+
+        return tracedFunc
+
+    return decorate
+
+
+def count(name, amount=1):
+    ''' Adds the amount to the named counter, if tracing is enabled. '''
+    if _collector is not None:
+        _collector.counters[name] += amount
+
+
+def enabled():
+    return _collector is not None
+
+
+def enable():
+    '''
+    Starts recording to a new `Collector`, which is returned, replacing the current one.
+    '''
+    global _collector
+    _collector = Collector()
+    return _collector
+
+
+def disable():
+    '''
+    Stops recording, returning the `Collector` with everything recorded, or None if it wasn't enabled.
+    '''
+    global _collector, _last
+
+    collector, _collector = _collector, None
+    if collector is not None:
+        _last = collector
+    return collector
+
+
+def collector():
+    ''' Returns the current `Collector`, or the last one if tracing has been disabled since. '''
+    return _collector or _last
+
+
+def summary():
+    ''' Returns the `Collector.summary` of the current or last collector. '''
+    return collector().summary() if collector() else ''
+
+
+def exportChromeTrace(path):
+    ''' Writes the current or last collector's Chrome trace json to the path, an empty one if there isn't one. '''
+    (collector() or Collector()).exportChromeTrace(path)
@@ -0,0 +1,260 @@
+'''
+Solves timeline free space switches in parallel on a pool of headless mayapy workers.
+
+Once a space can be resolved to a driver and offset (`spaceSwitching.resolveTargetParent`), every frame is
+solved from sampled world matrices alone, so a range can be split into chunks and solved anywhere.  A copy
+of the scene is exported, each chunk is sent to a `switchWorker` process as json and the returned channels
+are merged, made Euler continuous across the chunks and keyed in the live scene.
+
+    with WorkerPool() as pool:
+        spacePresets.apply( preset, 'all', workers=pool )
+
+The pool only talks to the worker command over stdin/stdout, so `WorkerPool(command=workerCommand(standIn=True))`
+runs without Maya.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import json
+import math
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+try:
+    from maya.api import OpenMaya
+    from pymel.core import cmds
+
+    from . import spaceSwitching
+except ImportError:
+    # Outside of Maya only the pool itself can be used, ex. with a stand-in worker.
+    OpenMaya = cmds = spaceSwitching = None
+
+try:
+    from . import spaceSolver
+except ImportError:  # numpy isn't available
+    spaceSolver = None
+
+from . import tracing
+
+
+# Chunks smaller than this cost more in overhead than they save.
+MIN_CHUNK = 25
+
+
+class WorkerError(Exception):
+    pass
+
+
+def mayapy():
+    ''' Returns the path to mayapy, from MAYA_LOCATION if it's set. '''
+    exe = 'mayapy.exe' if sys.platform == 'win32' else 'mayapy'
+    location = os.environ.get('MAYA_LOCATION')
+    return os.path.join(location, 'bin', exe) if location else exe
+
+
+def workerCommand(standIn=False):
+    ''' Returns the command line of a `switchWorker`, or of its stand-in that doesn't need Maya. '''
+    if standIn:
+        return [sys.executable, '-m', 'fossilAnimTools.switchWorker', '--stand-in']
+
+    return [mayapy(), '-m', 'fossilAnimTools.switchWorker']
+
+
+class _Worker(object):
+
+    def __init__(self, command):
+        # The workers import this package from wherever it was loaded.
+        root = os.path.dirname( os.path.dirname(os.path.abspath(__file__)) )
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join( [root] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []) )
+
+        self.process = subprocess.Popen( command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+                                         universal_newlines=True )  # noqa e127
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def request(self, job):
+        self.process.stdin.write( json.dumps(job) + '\n' )
+        self.process.stdin.flush()
+
+        line = self.process.stdout.readline()
+        if not line:
+            # Its output closes before it has exited, so wait for the exit code, which also makes it not `alive`.
+            raise WorkerError( 'Worker exited with {}'.format(self.process.wait()) )
+
+        result = json.loads(line)
+        if 'error' in result:
+            raise WorkerError( result['error'] )
+
+        return result['channels']
+
+    def close(self):
+        if self.alive():
+            self.process.stdin.close()
+        self.process.wait()
+
+
+class WorkerPool(object):
+    '''
+    Runs jobs on up to `processes` worker processes, started when first needed and kept until `close` so
+    each only opens a scene once.
+
+    Args:
+        processes: How many workers, defaulting to the cpu count.
+        command: The worker command line, defaulting to `workerCommand()`, ex. a stand-in for testing.
+    '''
+
+    def __init__(self, processes=None, command=None):
+        self.processes = processes or multiprocessing.cpu_count()
+        self.command = command or workerCommand()
+
+        self._workers = []
+        self._idle = Queue()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle.empty() and len(self._workers) < self.processes:
+                worker = _Worker(self.command)
+                self._workers.append(worker)
+                return worker
+
+        return self._idle.get()
+
+    def _run(self, job):
+        worker = self._acquire()
+        try:
+            return worker.request(job)
+        finally:
+            if worker.alive():
+                self._idle.put(worker)
+            else:
+                with self._lock:
+                    self._workers.remove(worker)
+
+    def map(self, jobs):
+        '''
+        Returns the channels solved for each of the jobs, in order, solving them in parallel.
+        '''
+        if not jobs:
+            return []
+
+        threads = ThreadPool( min(self.processes, len(jobs)) )
+        try:
+            return threads.map(self._run, jobs, chunksize=1)
+        finally:
+            threads.close()
+            threads.join()
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+        self._idle = Queue()
+
+
+def chunks(times, count, minimum=MIN_CHUNK):
+    '''
+    Returns the times split into about `count` consecutive chunks of at least `minimum` times.
+    '''
+    size = max( minimum, int(math.ceil(len(times) / count)) ) if count else len(times)
+    return [ times[i:i + size] for i in range(0, len(times), max(size, 1)) ]
+
+
+def exportScene():
+    '''
+    Exports the scene as it is now, unsaved changes included, to a temp file for the workers.  Returns the path.
+    '''
+    handle, path = tempfile.mkstemp( prefix='fossilSwitch_', suffix='.mb' )
+    os.close(handle)
+
+    cmds.file( path, exportAll=True, preserveReferences=True, type='mayaBinary', force=True )
+    return path
+
+
+@tracing.traced('continuousChunks')
+def _continuous(channels, order):
+    '''
+    Makes the rx, ry, rz values, in ui units, Euler continuous in place, since each chunk was only made
+    continuous on its own.
+    '''
+    toRadians = OpenMaya.MAngle(1.0, OpenMaya.MAngle.uiUnit()).asRadians()
+    rotations = [ [val * toRadians for val in values] for values in (channels['rx'], channels['ry'], channels['rz']) ]
+
+    if spaceSolver:
+        filtered = spaceSolver.eulerFilter( list(zip(*rotations)), order ).tolist()
+    else:
+        filtered = []
+        previous = None
+        for x, y, z in zip(*rotations):
+            rotation = OpenMaya.MEulerRotation(x, y, z, order)
+            if previous is not None:
+                rotation = rotation.closestSolution(previous)
+            previous = rotation
+            filtered.append( (rotation.x, rotation.y, rotation.z) )
+
+    for i, axis in enumerate('xyz'):
+        channels['r' + axis] = [ rotation[i] / toRadians for rotation in filtered ]
+
+    return channels
+
+
+def switchInParallel(contextSwitches, pool, writer):
+    '''
+    Solves the context switches of `spacePresets.planApply` on the pool, adding the keys to the writer.
+
+    Args:
+        contextSwitches: [ (<ctrl>, <space>, <times>, <target parent>), ... ]
+        pool: The `WorkerPool`.
+        writer: The `keyWriter.KeyWriter` to add the keys to.
+    '''
+    jobs = []
+    owners = []  # The (<ctrl>, <space enum value>) of each job
+    scene = exportScene()
+    try:
+        for ctrl, targetSpace, times, (driver, offset) in contextSwitches:
+            enumVal = ctrl.space.getEnums()[targetSpace]
+            times = spaceSwitching.timesToSwitch(ctrl, times, enumVal)
+
+            for chunk in chunks(times, pool.processes):
+                jobs.append( {'scene': scene, 'control': ctrl.longName(), 'driver': driver, 'offset': list(offset),
+                              'times': chunk} )  # noqa e127
+                owners.append( (ctrl, enumVal) )
+
+        results = pool.map(jobs)
+    finally:
+        os.remove(scene)
+
+    merged = collections.OrderedDict()  # { <ctrl>: (<enum value>, <times>, { <channel>: [<values>] }) }
+    for job, (ctrl, enumVal), channels in zip(jobs, owners, results):
+        if ctrl not in merged:
+            merged[ctrl] = ( enumVal, [], collections.defaultdict(list) )
+        merged[ctrl][1].extend( job['times'] )
+        for channel, values in channels.items():
+            merged[ctrl][2][channel].extend(values)
+
+    for ctrl, (enumVal, times, channels) in merged.items():
+        name = ctrl.name()
+        channels = _continuous( channels, cmds.getAttr(name + '.rotateOrder') )
+
+        writer.set( name + '.space', times, [enumVal] * len(times), stepped=True )
+        for channel in spaceSwitching.unlockedChannels(ctrl):
+            writer.set( name + '.' + channel, times, channels[channel] )
@@ -0,0 +1,72 @@
+'''
+Runs `batchApply` with the stand-in backend, which copies the scenes instead of switching them, on a temp tree
+of scenes, checking where they are saved and what is reported, without Maya.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+
+from fossilAnimTools import batchApply
+
+
+def makeScenes(root, *paths):
+    ''' Writes a scene file of its own path at each path under root, returning their full paths. '''
+    scenes = []
+    for path in paths:
+        scene = root.join(*path.split('/'))
+        scene.write(path, ensure=True)
+        scenes.append( str(scene) )
+    return scenes
+
+
+def test_sameNameInDifferentFoldersIsKeptApart(tmpdir):
+    scenes = makeScenes(tmpdir, 'shots/a/x.ma', 'shots/b/x.ma', 'shots/b/y.ma')
+    output = str( tmpdir.join('switched') )
+
+    assert batchApply.outputPaths(scenes, output) == [
+        os.path.join(output, 'a', 'x.ma'),
+        os.path.join(output, 'b', 'x.ma'),
+        os.path.join(output, 'b', 'y.ma'),
+    ]
+
+
+def test_singleFolderIsSavedAtTheTopOfTheOutput(tmpdir):
+    scenes = makeScenes(tmpdir, 'shots/a/x.ma', 'shots/a/y.ma')
+    output = str( tmpdir.join('switched') )
+
+    assert batchApply.outputPaths(scenes, output) == [os.path.join(output, 'x.ma'), os.path.join(output, 'y.ma')]
+
+
+def test_noOutputDirOverwritesTheScenes(tmpdir):
+    scenes = makeScenes(tmpdir, 'shots/a/x.ma', 'shots/b/x.ma')
+
+    assert batchApply.outputPaths(scenes) == scenes
+
+
+def test_standInRunSavesEveryScene(tmpdir):
+    scenes = makeScenes(tmpdir, 'shots/a/x.ma', 'shots/b/x.ma')
+    preset = tmpdir.join('presets.json')
+    preset.write( json.dumps({'Hands World': {'Hand_ctrl': 'world'}}) )
+    report = tmpdir.join('report.jsonl')
+    missing = str( tmpdir.join('shots', 'c', 'missing.ma') )
+
+    status = batchApply.main( [str(preset), 'Hands World', str(tmpdir.join('shots', '*', '*.ma')), missing,
+                               '--output-dir', str(tmpdir.join('switched')), '--backend', 'stand-in',
+                               '--processes', '2', '--report', str(report)] )  # noqa e128
+
+    assert status == 1  # The missing scene failed
+
+    for path in ['a/x.ma', 'b/x.ma']:
+        assert tmpdir.join('switched', *path.split('/')).read() == 'shots/' + path
+
+    records = { os.path.basename(os.path.dirname(record['file'])): record
+                for record in map(json.loads, report.read().splitlines()) }  # noqa e128
+
+    assert sorted(records) == ['a', 'b', 'c']
+    assert records['a']['status'] == records['b']['status'] == 'ok'
+    assert records['a']['output'] != records['b']['output']
+    assert records['c']['status'] == 'failed'
+    assert records['c']['error'].startswith('IOError') or records['c']['error'].startswith('FileNotFoundError')
+    assert all( 'seconds' in record for record in records.values() )
@@ -0,0 +1,127 @@
+'''
+Checks `spaceSolver` against rotations built one axis at a time, for every rotate order, without Maya.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import numpy
+import pytest
+
+from fossilAnimTools import spaceSolver
+
+
+AXES = numpy.eye(3)
+
+
+def rotateAbout(vector, axis, angle):
+    ''' Rotates the vector about the unit axis by the radian angle, right handed (Rodrigues' formula). '''
+    return ( vector * numpy.cos(angle) + numpy.cross(axis, vector) * numpy.sin(angle)
+             + axis * numpy.dot(axis, vector) * (1 - numpy.cos(angle)) )  # noqa e128
+
+
+def referenceMatrix(rotation, rotateOrder):
+    '''
+    Returns the row vector matrix rotating about each axis in turn, in the rotate order, like Maya does.
+    '''
+    rows = []
+    for basis in AXES:
+        vector = basis
+        for axisName in rotateOrder:
+            axis = 'xyz'.index(axisName)
+            vector = rotateAbout(vector, AXES[axis], rotation[axis])
+        rows.append(vector)
+    return numpy.array(rows)
+
+
+def randomRotations(count, seed=0):
+    return numpy.random.RandomState(seed).uniform(-numpy.pi, numpy.pi, (count, 3))
+
+
+@pytest.mark.parametrize('rotateOrder', spaceSolver.ROTATE_ORDERS)
+def test_eulerToMatrixMatchesAxisRotations(rotateOrder):
+    rotations = randomRotations(50)
+
+    matrices = spaceSolver.eulerToMatrix(rotations, rotateOrder)
+
+    for rotation, matrix in zip(rotations, matrices):
+        numpy.testing.assert_allclose( matrix, referenceMatrix(rotation, rotateOrder), atol=1e-12 )
+
+
+@pytest.mark.parametrize('rotateOrder', spaceSolver.ROTATE_ORDERS)
+def test_matrixToEulerRoundTrips(rotateOrder):
+    rotations = randomRotations(50, seed=1)
+    matrices = spaceSolver.eulerToMatrix(rotations, rotateOrder)
+
+    solved = spaceSolver.matrixToEuler(matrices, rotateOrder)
+
+    numpy.testing.assert_allclose( spaceSolver.eulerToMatrix(solved, rotateOrder), matrices, atol=1e-12 )
+
+    middle = 'xyz'.index(rotateOrder[1])
+    assert numpy.all( numpy.abs(solved[:, middle]) <= numpy.pi / 2 + 1e-12 )
+
+
+@pytest.mark.parametrize('rotateOrder', spaceSolver.ROTATE_ORDERS)
+def test_matrixToEulerAtGimbalLock(rotateOrder):
+    rotation = numpy.zeros(3)
+    rotation['xyz'.index(rotateOrder[0])] = 0.3
+    rotation['xyz'.index(rotateOrder[1])] = numpy.pi / 2
+    rotation['xyz'.index(rotateOrder[2])] = -0.4
+    matrix = spaceSolver.eulerToMatrix([rotation], rotateOrder)
+
+    solved = spaceSolver.matrixToEuler(matrix, rotateOrder)
+
+    numpy.testing.assert_allclose( spaceSolver.eulerToMatrix(solved, rotateOrder), matrix, atol=1e-7 )
+    assert solved[0, 'xyz'.index(rotateOrder[2])] == 0.0
+
+
+@pytest.mark.parametrize('rotateOrder', spaceSolver.ROTATE_ORDERS)
+def test_eulerFilterRecoversSmoothRotations(rotateOrder):
+    # Sweeps well past +/- pi on every axis, so the raw solutions wrap and flip.
+    frames = numpy.linspace(0, 1, 200)[:, None]
+    smooth = numpy.array([0.3, -0.2, 0.5]) + frames * numpy.array([7.0, 2.5, -9.0])
+
+    raw = spaceSolver.matrixToEuler( spaceSolver.eulerToMatrix(smooth, rotateOrder), rotateOrder )
+    assert numpy.abs( numpy.diff(raw, axis=0) ).max() > 1.0
+
+    filtered = spaceSolver.eulerFilter(raw, rotateOrder, reference=smooth[0])
+
+    numpy.testing.assert_allclose( filtered, smooth, atol=1e-9 )
+
+
+@pytest.mark.parametrize('rotateOrder', spaceSolver.ROTATE_ORDERS)
+def test_eulerFilterKeepsEquivalentRotations(rotateOrder):
+    raw = randomRotations(100, seed=2)
+
+    filtered = spaceSolver.eulerFilter(raw, rotateOrder)
+
+    numpy.testing.assert_allclose( spaceSolver.eulerToMatrix(filtered, rotateOrder),
+                                   spaceSolver.eulerToMatrix(raw, rotateOrder), atol=1e-9 )  # noqa e127
+
+
+def test_eulerFilterStartsClosestToReference():
+    raw = numpy.array( [[0.1, 0.0, 0.0], [0.2, 0.0, 0.0]] )
+
+    filtered = spaceSolver.eulerFilter(raw, 'xyz', reference=[2 * numpy.pi, 0.0, 0.0])
+
+    numpy.testing.assert_allclose( filtered, raw + [2 * numpy.pi, 0.0, 0.0], atol=1e-12 )
+
+
+@pytest.mark.parametrize('rotateOrder', spaceSolver.ROTATE_ORDERS)
+def test_solveLocalUndoesTheParent(rotateOrder):
+    count = 20
+    rotations = randomRotations(count, seed=3) * 0.1 + numpy.linspace(0, 3, count)[:, None]
+    translates = numpy.random.RandomState(4).uniform(-10, 10, (count, 3))
+
+    locals_ = numpy.tile( numpy.eye(4), (count, 1, 1) )
+    locals_[:, :3, :3] = spaceSolver.eulerToMatrix(rotations, rotateOrder)
+    locals_[:, 3, :3] = translates
+
+    parents = numpy.tile( numpy.eye(4), (count, 1, 1) )
+    parents[:, :3, :3] = spaceSolver.eulerToMatrix(randomRotations(count, seed=5), 'xyz') * 2.0  # Scaled
+    parents[:, 3, :3] = numpy.random.RandomState(6).uniform(-10, 10, (count, 3))
+
+    translate, rotate = spaceSolver.solveLocal( numpy.matmul(locals_, parents), parents, rotateOrder,
+                                                reference=rotations[0], degrees=False )  # noqa e127
+
+    numpy.testing.assert_allclose( translate, translates, atol=1e-9 )
+    numpy.testing.assert_allclose( rotate, rotations, atol=1e-9 )
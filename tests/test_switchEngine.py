@@ -0,0 +1,113 @@
+'''
+Runs `switchEngine.switch` on small exported scenes, checking the plans and key edits without Maya.
+
+The arm has fk controls FK_ctrl and FKElbow_ctrl, ik controls IK_ctrl and Pole_ctrl and its switcher is
+Arm_ctrl.ikfk, 0 for fk and 1 for ik.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import pytest
+
+from fossilAnimTools import switchEngine
+from fossilAnimTools.switchEngine import ACTIVATE_KEY
+
+
+SWITCHER = 'Arm_ctrl.ikfk'
+FK = ['FK_ctrl', 'FKElbow_ctrl']
+IK = ['IK_ctrl', 'Pole_ctrl']
+
+
+def translation(x, y=0.0, z=0.0):
+    return [1.0, 0.0, 0.0, 0.0,
+            0.0, 1.0, 0.0, 0.0,
+            0.0, 0.0, 1.0, 0.0,
+            x, y, z, 1.0]  # noqa e127
+
+
+def armModel(curves=None, values=None, spaces=None, currentTime=0.0):
+    '''
+    Returns an `AnimModel` of the arm, every ik control switching it to ik and every fk control to fk.
+    '''
+    toIk = {'controls': IK, 'otherControls': FK, 'switcher': SWITCHER, 'motion': 1}
+    toFk = {'controls': FK, 'otherControls': IK, 'switcher': SWITCHER, 'motion': 0}
+
+    return switchEngine.AnimModel.fromDict( {
+        'curves': curves or {},
+        'values': values or {},
+        'limbs': dict( [(ctrl, toIk) for ctrl in IK] + [(ctrl, toFk) for ctrl in FK] ),
+        'spaces': spaces or {},
+        'currentTime': currentTime,
+    } )
+
+
+def ops(result, plug):
+    return [ op for op, args in result.edits.get(plug, []) ]
+
+
+def test_eachLimbIsPlannedOnce():
+    model = armModel( curves={'FK_ctrl.rx': {'times': [0, 10, 20], 'values': [0, 45, 90]},
+                              'FKElbow_ctrl.rx': {'times': [10, 30], 'values': [0, 20]}} )  # noqa e127
+
+    result = switchEngine.switch( model, {'IK_ctrl': ACTIVATE_KEY, 'Pole_ctrl': ACTIVATE_KEY}, (None, None) )
+
+    assert result.matches == {'IK_ctrl': [0.0, 10.0, 20.0, 30.0]}
+    assert result.immediate == []
+    assert ops(result, SWITCHER) == ['set', 'insert']
+    assert model.keys(SWITCHER)[0] == [0.0, 10.0, 20.0, 30.0]
+
+
+def test_limbAlreadyInMotionIsNotSwitched():
+    model = armModel( curves={'FK_ctrl.rx': {'times': [0, 10], 'values': [0, 45]}},
+                      values={SWITCHER: 1.0},
+                      spaces={'IK_ctrl': {'enums': {'local': 0, 'world': 1},
+                                          'worlds': {}, 'parents': {'local': {}, 'world': {}}}} )  # noqa e127
+
+    result = switchEngine.switch( model, {'IK_ctrl': 'world', 'Pole_ctrl': ACTIVATE_KEY}, (None, None) )
+
+    # The limb adds no match times, so the unkeyed space is switched on the current frame.
+    assert result.matches == {}
+    assert result.immediate == [('IK_ctrl', 'world')]
+    assert result.edits == {}
+
+
+def test_spaceIsSwitchedAtTheMatchTimes():
+    worlds = {str(t): translation(5.0) for t in (0.0, 10.0)}
+    model = armModel( curves={'FK_ctrl.rx': {'times': [0, 10], 'values': [0, 45]}},
+                      spaces={'IK_ctrl': {'enums': {'local': 0, 'world': 1}, 'worlds': worlds,
+                                          'parents': {'local': worlds,
+                                                      'world': {t: translation(0.0) for t in worlds}}}} )  # noqa e127
+
+    result = switchEngine.switch( model, {'IK_ctrl': 'world'}, (None, None) )
+
+    assert result.matches == {'IK_ctrl': [0.0, 10.0]}
+    assert model.keys('IK_ctrl.space') == ([0.0, 10.0], [1.0, 1.0])
+    assert model.curves['IK_ctrl.space'].stepped
+    assert model.keys('IK_ctrl.tx') == ([0.0, 10.0], [5.0, 5.0])
+
+
+@pytest.mark.parametrize('keyRange, expected, remaining', [
+    ((None, None), [5.0, 25.0], []),
+    ((10, None), [10.0, 25.0], [5.0]),
+    ((None, 20), [5.0, 20.0], [25.0]),
+    ((10, 20), [10.0, 20.0], [5.0, 25.0]),
+])
+def test_targetOnlyRangeIsBoundedByTheTargetKeys(keyRange, expected, remaining):
+    model = armModel( curves={'IK_ctrl.tx': {'times': [5, 15, 25], 'values': [0, 1, 2]}} )
+
+    result = switchEngine.switch( model, {'IK_ctrl': ACTIVATE_KEY}, keyRange )
+
+    assert result.matches == {'IK_ctrl': expected}
+    assert ops(result, 'IK_ctrl.tx') == ['delete']
+    assert SWITCHER not in result.edits
+    assert model.keys('IK_ctrl.tx')[0] == remaining
+
+
+def test_unkeyedLimbSwitchesNow():
+    model = armModel()
+
+    result = switchEngine.switch( model, {'FK_ctrl': ACTIVATE_KEY, 'IK_ctrl': ACTIVATE_KEY}, (None, None) )
+
+    assert result.matches == {}
+    assert result.immediate == [('IK_ctrl', 1)]
+    assert result.edits == {}
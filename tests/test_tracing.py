@@ -0,0 +1,42 @@
+'''
+Checks the `tracing` exports, with tracing never enabled and after recording a span and a counter.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import json
+
+import pytest
+
+from fossilAnimTools import tracing
+
+
+@pytest.fixture
+def untraced(monkeypatch):
+    ''' Forgets any collector, as if tracing had never been enabled. '''
+    monkeypatch.setattr( tracing, '_collector', None )
+    monkeypatch.setattr( tracing, '_last', None )
+
+
+def test_neverEnabledExportsAnEmptyTrace(untraced, tmpdir):
+    path = tmpdir.join('trace.json')
+
+    assert tracing.summary() == ''
+    tracing.exportChromeTrace( str(path) )
+
+    assert json.loads( path.read() ) == {'traceEvents': [], 'displayTimeUnit': 'ms'}
+
+
+def test_lastCollectorIsExported(untraced, tmpdir):
+    path = tmpdir.join('trace.json')
+
+    tracing.enable()
+    with tracing.span('plan'):
+        tracing.count('frames', 3)
+    tracing.disable()
+
+    tracing.exportChromeTrace( str(path) )
+    events = json.loads( path.read() )['traceEvents']
+
+    assert [(event['name'], event['ph']) for event in events] == [('plan', 'X'), ('frames', 'C')]
+    assert 'frames' in tracing.summary()
@@ -0,0 +1,172 @@
+'''
+Runs `workerPool` with stand-in workers, which answer every channel with the times, checking the chunks are
+merged in order, made Euler continuous across chunks and that failing workers are reported, without Maya.
+
+`switchInParallel` only needs a few things from Maya around the pool, which are replaced by `fakeMaya`.
+'''
+
+from __future__ import absolute_import, division, print_function
+
+import math
+import os
+import sys
+import textwrap
+
+import pytest
+
+from fossilAnimTools import workerPool
+from fossilAnimTools.switchWorker import CHANNELS
+from fossilAnimTools.workerPool import WorkerError, WorkerPool, workerCommand
+
+
+# A stand-in whose chunks are each continuous, but every chunk after the first is a full turn off in rx.
+TURNED_CHUNKS = textwrap.dedent( '''
+    import sys
+    from fossilAnimTools import switchWorker
+
+    def solve(job):
+        channels = switchWorker.standIn(job)
+        if job['times'][0] > 0:
+            channels['rx'] = [val - 360.0 for val in channels['rx']]
+        return channels
+
+    switchWorker.serve(solve, sys.stdin, sys.stdout)
+''' )
+
+
+class Angle(object):
+    ''' The `OpenMaya.MAngle` of an angle in degrees, the ui unit. '''
+
+    def __init__(self, value, unit=None):
+        self.value = value
+
+    @staticmethod
+    def uiUnit():
+        return 'degrees'
+
+    def asRadians(self):
+        return math.radians(self.value)
+
+
+class Enums(object):
+
+    def getEnums(self):
+        return {'local': 0, 'world': 1}
+
+
+class Control(object):
+
+    space = Enums()
+
+    def name(self):
+        return 'Hand_ctrl'
+
+    def longName(self):
+        return '|Hand_ctrl'
+
+
+class SpaceSwitching(object):
+
+    @staticmethod
+    def timesToSwitch(control, times, enumVal):
+        return times
+
+    @staticmethod
+    def unlockedChannels(control):
+        return CHANNELS
+
+
+class Cmds(object):
+
+    @staticmethod
+    def getAttr(plug):
+        assert plug == 'Hand_ctrl.rotateOrder'
+        return 0
+
+
+class Writer(object):
+
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, plug, times, values, stepped=False):
+        self.keys[plug] = (list(times), list(values), stepped)
+
+
+@pytest.fixture
+def fakeMaya(monkeypatch, tmpdir):
+    '''
+    Replaces the Maya the module uses around the pool, returning the path the scene is "exported" to.
+    '''
+    scene = tmpdir.join('scene.mb')
+
+    def exportScene():
+        scene.write('')
+        return str(scene)
+
+    monkeypatch.setattr( workerPool, 'OpenMaya', type('OpenMaya', (object,), {'MAngle': Angle}) )
+    monkeypatch.setattr( workerPool, 'cmds', Cmds )
+    monkeypatch.setattr( workerPool, 'spaceSwitching', SpaceSwitching )
+    monkeypatch.setattr( workerPool, 'exportScene', exportScene )
+
+    return scene
+
+
+def switch(command, times):
+    writer = Writer()
+    with WorkerPool(processes=2, command=command) as pool:
+        workerPool.switchInParallel( [(Control(), 'world', times, ('World_grp', [0.0] * 16))], pool, writer )
+    return writer.keys
+
+
+def test_jobsAreAnsweredInOrder():
+    jobs = [ {'times': [t, t + 1]} for t in range(0, 20, 2) ]
+
+    with WorkerPool(processes=3, command=workerCommand(standIn=True)) as pool:
+        results = pool.map(jobs)
+        assert len(pool._workers) <= 3
+
+    assert [result['tx'] for result in results] == [job['times'] for job in jobs]
+
+
+def test_chunksAreMerged(fakeMaya):
+    times = [float(t) for t in range(60)]
+
+    assert workerPool.chunks(times, 2) == [times[:30], times[30:]]
+
+    keys = switch( workerCommand(standIn=True), times )
+
+    assert keys['Hand_ctrl.space'] == (times, [1] * 60, True)
+    for channel in CHANNELS:
+        assert keys['Hand_ctrl.' + channel][0] == times
+        assert keys['Hand_ctrl.' + channel][1] == pytest.approx(times)  # Rotations go through radians
+    assert not fakeMaya.exists()  # The exported scene is removed
+
+
+def test_rotationIsContinuousAcrossChunks(fakeMaya):
+    times = [float(t) for t in range(60)]
+
+    keys = switch( [sys.executable, '-c', TURNED_CHUNKS], times )
+
+    assert keys['Hand_ctrl.rx'][1] == pytest.approx(times)
+
+
+def test_errorAnswerRaises():
+    with WorkerPool(processes=1, command=workerCommand(standIn=True)) as pool:
+        with pytest.raises(WorkerError, match='KeyError'):
+            pool.map( [{'scene': 'missing times'}] )
+
+        assert pool.map( [{'times': [1.0]}] )[0]['tx'] == [1.0]  # The worker is still used
+
+
+def test_exitedWorkerRaises(fakeMaya):
+    command = [sys.executable, '-c', 'import sys; sys.stdin.readline(); sys.exit(3)']
+
+    with WorkerPool(processes=1, command=command) as pool:
+        with pytest.raises(WorkerError, match='exited with 3'):
+            pool.map( [{'times': [1.0]}] )
+        assert pool._workers == []  # Dead workers are dropped, the next job starts a new one
+
+    with pytest.raises(WorkerError):
+        switch( command, [float(t) for t in range(10)] )
+    assert not os.path.exists( str(fakeMaya) )